@@ -0,0 +1,69 @@
+"""
+Benchmark for Mash distance ingestion.
+Writes a synthetic all-vs-all `mash dist` table and loads it with the streaming parser
+(stream_mash_lookup) and with the in-memory path (parse_mash + build_mash_lookup),
+reporting lines/sec and peak RSS. Each loader runs in a fresh process so peak RSS is not
+inherited from the previous run.
+
+Usage: python -m benchmarks.bench_mash_stream [--contigs N] [--max-distance D]
+"""
+
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.filter_haplotypes.parsers.mash_parser import parse_mash, build_mash_lookup, stream_mash_lookup
+
+def write_all_vs_all(path: Path, num_contigs: int, seed: int = 0):
+    """
+    Write a synthetic symmetric all-vs-all Mash table (num_contigs^2 lines, self-pairs included).
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"ctg{i:07d}" for i in range(num_contigs)])
+    upper = np.triu(rng.beta(2, 20, (num_contigs, num_contigs)), 1)
+    distances = upper + upper.T
+    with open(path, 'w') as fh:
+        for i in range(num_contigs):
+            row = distances[i]
+            shared = np.maximum(1, (1000 * (1 - row * 10)).astype(int).clip(1, 1000))
+            p_values = np.where(row < 0.25, 0.0, 0.1)
+            fh.writelines(
+                f"{ids[i]}\t{ids[j]}\t{row[j]:.7g}\t{p_values[j]:.3g}\t{shared[j]}/1000\n"
+                for j in range(num_contigs)
+            )
+
+def run_loader(method: str, mash_path: str, max_distance):
+    start = time.perf_counter()
+    if method == 'stream':
+        lookup = stream_mash_lookup(mash_path, max_distance=max_distance)
+    else:
+        lookup = build_mash_lookup(parse_mash(mash_path))
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, peak_rss_mb, len(lookup.indices) // 2
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Mash distance ingestion.")
+    parser.add_argument("--contigs", type=int, default=2000, help="Number of synthetic contigs (lines = contigs^2)")
+    parser.add_argument("--max-distance", type=float, help="Distance filter applied by the streaming parser")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mash_path = Path(tmp_dir) / "all_vs_all.dist"
+        write_all_vs_all(mash_path, args.contigs)
+        num_lines = args.contigs ** 2
+
+        print(f"lines: {num_lines} ({mash_path.stat().st_size / 1e6:.1f} MB)")
+        for method in ('parse', 'stream'):
+            with ctx.Pool(1) as pool:
+                elapsed, peak_rss_mb, num_pairs = pool.apply(run_loader, (method, str(mash_path), args.max_distance if method == 'stream' else None))
+            print(f"{method:<8} {num_lines / elapsed:>14,.0f} lines/sec  peak RSS {peak_rss_mb:>8,.1f} MB  pairs {num_pairs}")
+
+if __name__ == "__main__":
+    main()
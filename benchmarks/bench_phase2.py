@@ -0,0 +1,83 @@
+"""
+Regression benchmark for Phase 2 initialization.
+Builds the ContigStore of a synthetic assembly (200k contigs by default) and marks the aligned
+contigs with their primary target via primary_target_map, as main.py does. The legacy
+per-contig boolean scan of the PAF table is timed on a sample of contigs and extrapolated.
+Exits with status 1 when Phase 2 takes longer than --max-seconds.
+
+Usage: python -m benchmarks.bench_phase2 [--contigs N] [--alignments-per-contig A] [--max-seconds S]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.filter_haplotypes.core.models import ContigStore, Status, STATUS_CODES
+from src.filter_haplotypes.parsers.paf_parser import primary_target_map
+
+def make_primary_paf(num_contigs: int, alignments_per_contig: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a primary-target PAF table in which 80% of the contigs are aligned, with the
+    categorical query_id/target_id columns produced by parse_paf.
+    """
+    rng = np.random.default_rng(seed)
+    aligned = rng.permutation(num_contigs)[:num_contigs * 4 // 5]
+    query_codes = rng.permutation(np.repeat(aligned, alignments_per_contig))
+    targets = rng.integers(0, 1000, num_contigs)
+    return pd.DataFrame({
+        'query_id': pd.Categorical([f"ctg{i:07d}" for i in query_codes]),
+        'target_id': pd.Categorical([f"chr{i:04d}" for i in targets[query_codes]]),
+    })
+
+def legacy_mark(query_to_summary, primary_paf_df: pd.DataFrame, query_ids):
+    """
+    The original marking loop: one boolean scan of the PAF table per aligned contig.
+    """
+    for q_id in query_ids:
+        if q_id in query_to_summary:
+            summary = query_to_summary[q_id]
+            summary.status = Status.ALIGNED_RETAINED
+            summary.target_id = primary_paf_df[primary_paf_df['query_id'] == q_id]['target_id'].iloc[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Regression benchmark for Phase 2 initialization.")
+    parser.add_argument("--contigs", type=int, default=200000, help="Number of synthetic contigs")
+    parser.add_argument("--alignments-per-contig", type=int, default=3, help="Primary alignments per aligned contig")
+    parser.add_argument("--legacy-sample", type=int, default=200, help="Aligned contigs marked with the legacy loop")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="Fail when Phase 2 takes longer than this")
+    args = parser.parse_args()
+
+    primary_paf_df = make_primary_paf(args.contigs, args.alignments_per_contig)
+    query_ids = [f"ctg{i:07d}" for i in range(args.contigs)]
+
+    start = time.perf_counter()
+    contigs = ContigStore(query_ids, [10000] * len(query_ids), [40.0] * len(query_ids))
+    summary_list = list(contigs)
+    primary_targets = {q_id: target_id for q_id, target_id in primary_target_map(primary_paf_df).items() if q_id in contigs}
+    aligned_rows = contigs.rows(primary_targets)
+    contigs.status[aligned_rows] = STATUS_CODES[Status.ALIGNED_RETAINED]
+    contigs.target_id[aligned_rows] = list(primary_targets.values())
+    phase2_time = time.perf_counter() - start
+
+    query_to_summary = dict(zip(query_ids, summary_list))
+
+    aligned_ids = primary_paf_df['query_id'].unique()
+    sample = aligned_ids[:args.legacy_sample]
+    expected = {q_id: query_to_summary[q_id].target_id for q_id in sample}
+    start = time.perf_counter()
+    legacy_mark(query_to_summary, primary_paf_df, sample)
+    legacy_time = (time.perf_counter() - start) * len(aligned_ids) / len(sample)
+    assert all(query_to_summary[q_id].target_id == target_id for q_id, target_id in expected.items())
+
+    print(f"contigs: {args.contigs} ({len(aligned_ids)} aligned, {len(primary_paf_df)} alignments)")
+    print(f"phase 2:            {phase2_time:>10.2f} s")
+    print(f"legacy marking:     {legacy_time:>10.2f} s (extrapolated from {len(sample)} contigs)")
+    if phase2_time > args.max_seconds:
+        print(f"FAIL: phase 2 took longer than {args.max_seconds:.2f} s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
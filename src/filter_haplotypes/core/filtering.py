@@ -4,15 +4,22 @@ Includes alignment tiling, score finalization, Mash distance threshold estimatio
 and the iterative tournament algorithm for redundancy resolution.
 """
 
+import heapq
+import multiprocessing
+from bisect import bisect_left
 import numpy as np
 import pandas as pd
 from scipy.stats import gaussian_kde
-from typing import List, Dict, Tuple
-from src.filter_haplotypes.core.models import ContigSummary, Status
+from typing import List, Dict, Tuple, NamedTuple, Optional, Union
+from src.filter_haplotypes.core.models import ContigSummary, Status, BuscoCarrierIndex
+from src.filter_haplotypes.parsers.mash_parser import MashDistanceMatrix, get_mash_distance, get_close_neighbors
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Minimum number of alignments per tiling task; chunks always end on a contig boundary
+TILING_CHUNK_ALIGNMENTS = 1 << 16
+
 def calculate_initial_redundancy(summary_list: List[ContigSummary], paf_df: pd.DataFrame):
     """
     Phase 3 Step 3: Calculate initial redundancy for aligned contigs.
@@ -20,54 +27,39 @@ def calculate_initial_redundancy(summary_list: List[ContigSummary], paf_df: pd.D
     :param summary_list: List of ContigSummary objects.
     :param paf_df: Filtered PAF DataFrame (primary targets only).
     """
-    total_contigs_with_overlaps = 0
-    total_overlapping_bases = 0
     total_bases_in_assembly = sum(c.query_length for c in summary_list)
 
     aligned_summaries = {c.query_id: c for c in summary_list if c.status == Status.ALIGNED_RETAINED}
-    
-    for query_id, group in paf_df.groupby('query_id'):
-        if query_id not in aligned_summaries:
-            continue
-            
-        summary = aligned_summaries[query_id]
-        intervals = sorted(zip(group['target_start'], group['target_end']))
-        
-        if not intervals:
-            continue
-            
-        # Calculate overlapping bases
-        overlapping_bases = 0
-        current_max = -1
-        
-        # Simple interval overlap calculation for total covered bases
-        # and then subtract from total sum of interval lengths to get redundant bases?
-        # "total number of bases covered by more than one alignment"
-        
-        # To find bases covered by >1 alignment:
-        # We can use a coordinate count approach or sorted intervals
-        
-        events = []
-        for start, end in intervals:
-            events.append((start, 1))
-            events.append((end, -1))
-        
-        events.sort()
-        
-        coverage = 0
-        last_pos = events[0][0]
-        redundant_bases = 0
-        
-        for pos, delta in events:
-            if coverage > 1:
-                redundant_bases += (pos - last_pos)
-            coverage += delta
-            last_pos = pos
-            
-        summary.initial_overlapping_bases = redundant_bases
-        if redundant_bases > 0:
-            total_contigs_with_overlaps += 1
-            total_overlapping_bases += redundant_bases
+    paf_df = paf_df[paf_df['query_id'].isin(list(aligned_summaries))]
+    codes, query_ids = pd.factorize(paf_df['query_id'])
+
+    # One coverage sweep over the start (+1) and end (-1) events of every contig, sorted by
+    # (contig, position, delta). Each contig's deltas sum to zero, so the global cumulative sum
+    # is the coverage within each contig and the bases covered by more than one alignment are
+    # the gaps between consecutive events where it exceeds 1.
+    event_codes = np.concatenate([codes, codes]).astype(np.int64)
+    positions = np.concatenate([
+        paf_df['target_start'].to_numpy().astype(np.int64),
+        paf_df['target_end'].to_numpy().astype(np.int64)
+    ])
+    is_start = np.repeat(np.array([1, 0], dtype=np.int64), len(codes))
+    if positions.size == 0 or (positions.min() >= 0 and positions.max() < 1 << 32):
+        # Positions fit in 32 bits: sort a single packed (contig, position, delta) int64 key
+        events = np.sort((event_codes << 33) | (positions << 1) | is_start)
+        event_codes = events >> 33
+        positions = (events >> 1) & ((1 << 32) - 1)
+        is_start = events & 1
+    else:
+        order = np.lexsort((is_start, positions, event_codes))
+        event_codes, positions, is_start = event_codes[order], positions[order], is_start[order]
+    coverage = np.cumsum(is_start * 2 - 1)
+    redundant = np.where(coverage[:-1] > 1, np.diff(positions), 0)
+    redundant_bases = np.bincount(event_codes[:-1], weights=redundant, minlength=len(query_ids)).astype(np.int64)
+
+    for query_id, bases in zip(query_ids, redundant_bases.tolist()):
+        aligned_summaries[query_id].initial_overlapping_bases = bases
+    total_contigs_with_overlaps = int((redundant_bases > 0).sum())
+    total_overlapping_bases = int(redundant_bases.sum())
 
     # Logging stats about redundant alignments at [DEBUG] level
     num_aligned = len(aligned_summaries)
@@ -93,34 +85,122 @@ def tile_and_score_contig(query_group: pd.DataFrame, overlap_tolerance: int = 10
     # Sorting: AS descending, then alignment length descending
     sorted_group = query_group.sort_values(by=['AS', 'aln_len'], ascending=[False, False])
     
-    accepted_intervals: List[Tuple[int, int]] = []
-    total_as = 0
-    max_as = 0
-    tiled_out_count = 0
+    # Accepted intervals are kept sorted so each overlap check is a bisect (see tile_sorted_segments)
+    [(accepted_intervals, total_as, max_as, tiled_out_count)] = tile_sorted_segments(
+        sorted_group['target_start'].to_numpy(),
+        sorted_group['target_end'].to_numpy(),
+        sorted_group['AS'].to_numpy(),
+        np.array([0, len(sorted_group)]),
+        overlap_tolerance
+    )
+            
+    sum_normalized_score = total_as / query_length if query_length > 0 else 0.0
     
-    for row in sorted_group.itertuples(index=False):
-        start, end, score = row.target_start, row.target_end, row.AS
-        
-        # Check overlap with already accepted intervals
-        is_overlapping = False
-        for a_start, a_end in accepted_intervals:
-            # Overlap length = min(end1, end2) - max(start1, start2)
-            overlap = min(end, a_end) - max(start, a_start)
-            if overlap > overlap_tolerance:
-                is_overlapping = True
-                break
-        
-        if not is_overlapping:
+    return query_id, accepted_intervals, sum_normalized_score, max_as, tiled_out_count
+
+def tile_sorted_segments(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    scores: np.ndarray,
+    bounds: np.ndarray,
+    overlap_tolerance: int = 10
+) -> List[Tuple[List[Tuple[int, int]], int, int, int]]:
+    """
+    Greedy tiling of consecutive contig segments of alignments, each segment already sorted by
+    AS and then alignment length (both descending).
+
+    Two intervals conflict when they overlap by more than overlap_tolerance, which requires both
+    to be longer than the tolerance. Accepted intervals that long never contain one another, so
+    kept sorted by start their ends are sorted too: the only accepted interval that can conflict
+    with a candidate is the last one starting before end - overlap_tolerance (found by bisect).
+
+    :param starts: Target start of each alignment.
+    :param ends: Target end of each alignment.
+    :param scores: Alignment score (AS) of each alignment.
+    :param bounds: Segment boundaries (len = segments + 1).
+    :param overlap_tolerance: Maximum allowed overlap on target (bp).
+    :return: Per segment, a tuple (intervals, total_as, max_alignment_score, tiled_out_count).
+    """
+    starts, ends, scores = starts.tolist(), ends.tolist(), scores.tolist()
+    results = []
+    for segment_start, segment_end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        accepted_intervals: List[Tuple[int, int]] = []
+        # Accepted intervals longer than the tolerance, sorted by start (and therefore by end)
+        long_starts: List[int] = []
+        long_ends: List[int] = []
+        total_as = 0
+        max_as = 0
+        tiled_out_count = 0
+
+        for i in range(segment_start, segment_end):
+            start, end, score = starts[i], ends[i], scores[i]
+            if end - start > overlap_tolerance:
+                candidates = bisect_left(long_starts, end - overlap_tolerance)
+                if candidates and long_ends[candidates - 1] > start + overlap_tolerance:
+                    tiled_out_count += 1
+                    continue
+                position = bisect_left(long_starts, start)
+                long_starts.insert(position, start)
+                long_ends.insert(position, end)
+
             accepted_intervals.append((start, end))
             total_as += score
             if score > max_as:
                 max_as = score
-        else:
-            tiled_out_count += 1
-            
-    sum_normalized_score = total_as / query_length if query_length > 0 else 0.0
-    
-    return query_id, accepted_intervals, sum_normalized_score, max_as, tiled_out_count
+
+        results.append((accepted_intervals, total_as, max_as, tiled_out_count))
+    return results
+
+def tile_and_score_alignments(
+    paf_df: pd.DataFrame,
+    overlap_tolerance: int = 10,
+    threads: int = 1
+) -> List[Tuple[str, List[Tuple[int, int]], float, int, int]]:
+    """
+    Phase 3 Step 4 & 5: Tiling and score finalization for every contig of a PAF table.
+    The table is sorted once by (query, AS desc, alignment length desc) into NumPy arrays and
+    tiled per contig segment; with several threads, chunks of whole contigs are tiled in a
+    process pool. Gives the same results as tile_and_score_contig on each contig.
+
+    :param paf_df: Filtered PAF DataFrame (primary targets only).
+    :param overlap_tolerance: Maximum allowed overlap on target (bp).
+    :param threads: Number of worker processes.
+    :return: List of tuples (query_id, intervals, sum_normalized_score, max_alignment_score, tiled_out_count).
+    """
+    if paf_df.empty:
+        return []
+
+    codes, query_ids = pd.factorize(paf_df['query_id'])
+    # lexsort is stable, so ties keep their PAF order as in tile_and_score_contig
+    order = np.lexsort((-paf_df['aln_len'].to_numpy(), -paf_df['AS'].to_numpy(), codes))
+    codes = codes[order]
+    starts = paf_df['target_start'].to_numpy()[order]
+    ends = paf_df['target_end'].to_numpy()[order]
+    scores = paf_df['AS'].to_numpy()[order]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]])
+    query_lengths = paf_df['query_len'].to_numpy()[order][bounds[:-1]].tolist()
+
+    # Contig-aligned chunks of at least TILING_CHUNK_ALIGNMENTS alignments, a few per thread
+    num_chunks = max(1, min(4 * threads, len(codes) // TILING_CHUNK_ALIGNMENTS))
+    cuts = np.unique(np.searchsorted(bounds, np.linspace(0, len(codes), num_chunks + 1)[1:-1]))
+    segment_cuts = np.concatenate([[0], cuts, [len(bounds) - 1]])
+    chunks = [
+        (starts[bounds[a]:bounds[b]], ends[bounds[a]:bounds[b]], scores[bounds[a]:bounds[b]],
+         bounds[a:b + 1] - bounds[a], overlap_tolerance)
+        for a, b in zip(segment_cuts[:-1], segment_cuts[1:]) if b > a
+    ]
+    if threads > 1 and len(chunks) > 1:
+        with multiprocessing.Pool(processes=min(threads, len(chunks))) as pool:
+            chunk_results = pool.starmap(tile_sorted_segments, chunks)
+    else:
+        chunk_results = [tile_sorted_segments(*chunk) for chunk in chunks]
+
+    results = []
+    segments = (segment for chunk_result in chunk_results for segment in chunk_result)
+    for code, query_length, (intervals, total_as, max_as, tiled_out_count) in zip(codes[bounds[:-1]], query_lengths, segments):
+        sum_normalized_score = total_as / query_length if query_length > 0 else 0.0
+        results.append((query_ids[code], intervals, sum_normalized_score, max_as, tiled_out_count))
+    return results
 
 def estimate_distance_threshold(overlap_distances: List[float]) -> Tuple[float, str]:
     """
@@ -160,13 +240,51 @@ def estimate_distance_threshold(overlap_distances: List[float]) -> Tuple[float,
     else:
         return 0.05, "Default (Unimodal Mean > 0.1)"
 
-def get_overlapping_pairs(summary_list: List[ContigSummary], min_overlap: int = 1) -> List[Tuple[str, str]]:
+def sweep_overlapping_pairs(contigs: List[ContigSummary], min_overlap: int = 1) -> Dict[Tuple[int, int], int]:
     """
-    Identify pairs of contigs with overlapping intervals on the same target.
+    Sweep-line enumeration of overlapping contig pairs among contigs sharing a target.
+    Intervals are visited by start coordinate while a min-heap keeps the intervals that can
+    still overlap the sweep position, so the cost is O((n + k) log n) for n intervals and k
+    overlapping interval pairs.
+
+    :param contigs: ContigSummary objects aligned to the same target.
+    :param min_overlap: Minimum overlap bases between two intervals.
+    :return: Dictionary mapping (i, j) list positions (i < j) to the total overlapping bases
+             summed over all interval pairs that overlap by at least min_overlap.
+    """
+    events = sorted(
+        (start, end, idx)
+        for idx, c in enumerate(contigs)
+        for start, end in c.intervals
+    )
+
+    pair_overlaps: Dict[Tuple[int, int], int] = {}
+    active: List[Tuple[int, int, int]] = []
+    for start, end, idx in events:
+        # Intervals ending before start + min_overlap cannot overlap this or any later interval
+        while active and active[0][0] < start + min_overlap:
+            heapq.heappop(active)
+        # An interval shorter than min_overlap can never reach the minimum overlap
+        if end - start < min_overlap:
+            continue
+        for a_end, _, a_idx in active:
+            if a_idx == idx:
+                continue
+            # Active intervals start at or before 'start'
+            overlap = min(end, a_end) - start
+            key = (a_idx, idx) if a_idx < idx else (idx, a_idx)
+            pair_overlaps[key] = pair_overlaps.get(key, 0) + max(overlap, 0)
+        heapq.heappush(active, (end, start, idx))
+
+    return pair_overlaps
+
+def get_overlapping_pairs_with_lengths(summary_list: List[ContigSummary], min_overlap: int = 1) -> List[Tuple[str, str, int]]:
+    """
+    Identify pairs of contigs with overlapping intervals on the same target, with their overlap length.
     
     :param summary_list: List of ContigSummary objects.
     :param min_overlap: Minimum overlap bases.
-    :return: List of tuples (query_id1, query_id2).
+    :return: List of tuples (query_id1, query_id2, overlapping_bases), ordered by target and list position.
     """
     aligned = [c for c in summary_list if c.status == Status.ALIGNED_RETAINED]
     target_groups = {}
@@ -177,28 +295,28 @@ def get_overlapping_pairs(summary_list: List[ContigSummary], min_overlap: int =
         
     overlapping_pairs = []
     for target_id, contigs in target_groups.items():
-        for i in range(len(contigs)):
-            c1 = contigs[i]
-            for j in range(i + 1, len(contigs)):
-                c2 = contigs[j]
-                
-                # Check for any overlapping intervals
-                has_overlap = False
-                for s1, e1 in c1.intervals:
-                    for s2, e2 in c2.intervals:
-                        overlap = min(e1, e2) - max(s1, s2)
-                        if overlap >= min_overlap:
-                            has_overlap = True
-                            break
-                    if has_overlap:
-                        break
-                
-                if has_overlap:
-                    overlapping_pairs.append((c1.query_id, c2.query_id))
+        pair_overlaps = sweep_overlapping_pairs(contigs, min_overlap)
+        for i, j in sorted(pair_overlaps):
+            overlapping_pairs.append((contigs[i].query_id, contigs[j].query_id, pair_overlaps[(i, j)]))
                     
     return overlapping_pairs
 
-def get_adjusted_score(contig: ContigSummary, busco_bonus_factor: float = 0.0, all_contigs: List[ContigSummary] = None) -> float:
+def get_overlapping_pairs(summary_list: List[ContigSummary], min_overlap: int = 1) -> List[Tuple[str, str]]:
+    """
+    Identify pairs of contigs with overlapping intervals on the same target.
+    
+    :param summary_list: List of ContigSummary objects.
+    :param min_overlap: Minimum overlap bases.
+    :return: List of tuples (query_id1, query_id2).
+    """
+    return [(id1, id2) for id1, id2, _ in get_overlapping_pairs_with_lengths(summary_list, min_overlap)]
+
+def get_adjusted_score(
+    contig: ContigSummary,
+    busco_bonus_factor: float = 0.0,
+    all_contigs: List[ContigSummary] = None,
+    busco_index: Optional[BuscoCarrierIndex] = None
+) -> float:
     """
     Calculate adjusted score with optional BUSCO density bonus.
     
@@ -211,6 +329,7 @@ def get_adjusted_score(contig: ContigSummary, busco_bonus_factor: float = 0.0, a
     :param contig: ContigSummary object.
     :param busco_bonus_factor: Bonus factor for BUSCO density (default: 0.0 = disabled).
     :param all_contigs: List of all ContigSummary objects (for unique BUSCO checking).
+    :param busco_index: BUSCO carrier index used instead of scanning all_contigs when provided.
     :return: Adjusted score.
     """
     base_score = contig.sum_normalized_score
@@ -220,7 +339,9 @@ def get_adjusted_score(contig: ContigSummary, busco_bonus_factor: float = 0.0, a
     
     # Count unique BUSCO genes (not present on other ALIGNED_RETAINED contigs)
     unique_busco_count = len(contig.busco_genes)
-    if all_contigs is not None:
+    if busco_index is not None:
+        unique_busco_count = busco_index.count_unique(contig, (contig.query_id,))
+    elif all_contigs is not None:
         # Collect all BUSCO ids from other ALIGNED_RETAINED contigs
         other_busco_ids = set()
         for other in all_contigs:
@@ -240,7 +361,12 @@ def get_adjusted_score(contig: ContigSummary, busco_bonus_factor: float = 0.0, a
     
     return adjusted_score
 
-def count_unique_single_copy_orthologs(contig: ContigSummary, all_contigs: List[ContigSummary], exclude_ids: set) -> int:
+def count_unique_single_copy_orthologs(
+    contig: ContigSummary,
+    all_contigs: List[ContigSummary],
+    exclude_ids: set,
+    busco_index: Optional[BuscoCarrierIndex] = None
+) -> int:
     """
     Count unique single-copy orthologs (BUSCO ids) for a contig.
     
@@ -250,10 +376,13 @@ def count_unique_single_copy_orthologs(contig: ContigSummary, all_contigs: List[
     :param contig: The contig to count unique orthologs for.
     :param all_contigs: List of all ContigSummary objects in the assembly.
     :param exclude_ids: Set of query_ids to exclude from the count (typically C and O).
+    :param busco_index: BUSCO carrier index used instead of scanning all_contigs when provided.
     :return: Count of unique single-copy orthologs.
     """
     if not contig.busco_genes:
         return 0
+    if busco_index is not None:
+        return busco_index.count_unique(contig, exclude_ids)
     
     # Collect all BUSCO ids from ALIGNED_RETAINED contigs excluding those in exclude_ids
     other_busco_ids = set()
@@ -270,61 +399,119 @@ def count_unique_single_copy_orthologs(contig: ContigSummary, all_contigs: List[
     
     return unique_count
 
+class CompetitionEdge(NamedTuple):
+    """
+    Directed edge of a per-target competition graph, seen from the contig that may be discarded.
+    """
+    neighbor: int  # List position of the overlapping competitor
+    distance: Optional[float]  # Mash distance from the contig to the competitor (None if unknown)
+    size_ratio: float  # Competitor length / contig length
+    size_protected: bool  # Competitor is below the size safeguard relative to the contig
+
+def build_competition_graph(
+    contigs: List[ContigSummary],
+    mash_lookup: Union[Dict[str, Dict[str, float]], MashDistanceMatrix],
+    min_overlap: int = 1,
+    min_size_safeguard: float = 0.5
+) -> List[Dict[int, CompetitionEdge]]:
+    """
+    Build the competition graph for contigs aligned to the same target.
+    Only overlapping pairs are connected; each direction of a pair is annotated with
+    its Mash distance and size ratio so the tournament never rescans intervals.
+
+    :param contigs: List of ContigSummary objects for a specific target_id.
+    :param mash_lookup: Nested dictionary or MashDistanceMatrix for Mash distance lookups.
+    :param min_overlap: Minimum overlap bases.
+    :param min_size_safeguard: Ratio for size-based retention.
+    :return: Adjacency list indexed by list position; each entry maps neighbour positions
+             (in ascending order) to the CompetitionEdge from that contig to the neighbour.
+    """
+    graph: List[Dict[int, CompetitionEdge]] = [{} for _ in contigs]
+    for i, j in sorted(sweep_overlapping_pairs(contigs, min_overlap)):
+        for a, b in ((i, j), (j, i)):
+            A, B = contigs[a], contigs[b]
+            graph[a][b] = CompetitionEdge(
+                neighbor=b,
+                distance=get_mash_distance(mash_lookup, A.query_id, B.query_id),
+                size_ratio=B.query_length / A.query_length if A.query_length > 0 else float('inf'),
+                size_protected=B.query_length < min_size_safeguard * A.query_length
+            )
+    # Keep neighbours in list order so the tournament visits competitors deterministically
+    return [dict(sorted(edges.items())) for edges in graph]
+
 def run_tournament_on_target(
     contigs: List[ContigSummary],
-    mash_lookup: Dict[str, Dict[str, float]],
+    mash_lookup: Union[Dict[str, Dict[str, float]], MashDistanceMatrix],
     distance_threshold: float,
     min_overlap: int = 1,
     min_size_safeguard: float = 0.5,
     max_tournament_iterations: int = 100000,
     busco_bonus_factor: float = 0.0,
-    all_contigs: List[ContigSummary] = None
+    all_contigs: List[ContigSummary] = None,
+    busco_index: Optional[BuscoCarrierIndex] = None
 ) -> List[ContigSummary]:
     """
     Phase 5 Step 7 & 8: Perform tournament for a group of contigs aligned to the same target.
+    Competitions only happen along the edges of a competition graph built once per target,
+    so each pass costs O(edges) rather than an all-vs-all interval scan.
     
     :param contigs: List of ContigSummary objects for a specific target_id.
-    :param mash_lookup: Nested dictionary for Mash distance lookups.
+    :param mash_lookup: Nested dictionary or MashDistanceMatrix for Mash distance lookups.
     :param distance_threshold: Mash distance threshold.
     :param min_overlap: Minimum overlap bases.
     :param min_size_safeguard: Ratio for size-based retention.
     :param max_tournament_iterations: Maximum iterations for the tournament loop.
     :param busco_bonus_factor: Bonus factor for BUSCO density scoring (default: 0.0 = disabled).
     :param all_contigs: List of all ContigSummary objects (for BUSCO ortholog checking).
+    :param busco_index: BUSCO carrier index over all contigs; enables BUSCO ortholog checking
+                        without all_contigs and is updated as statuses change.
     :return: Updated list of ContigSummary objects.
     """
     if not contigs:
         return []
 
-    # Helper to check competition rules
-    def check_competition(C: ContigSummary, O: ContigSummary) -> bool:
+    # Stored distances are float32: compare them to the threshold at the same precision,
+    # as neighbors_within does for Phase 6
+    if isinstance(mash_lookup, MashDistanceMatrix):
+        distance_threshold = MashDistanceMatrix.stored_precision(distance_threshold)
+
+    # Shared BUSCO carrier index: uniqueness queries cost O(|busco_genes|) per comparison
+    if busco_index is None and all_contigs is not None:
+        busco_index = BuscoCarrierIndex(all_contigs)
+
+    def set_status(c: ContigSummary, status: Status):
+        if busco_index is not None:
+            busco_index.set_status(c, status)
+        else:
+            c.status = status
+
+    # Sorting for Pass 1: target_id (already grouped), then min start coordinate
+    def min_start(c: ContigSummary) -> int:
+        return min(i[0] for i in c.intervals) if c.intervals else 0
+
+    contigs.sort(key=min_start)
+    graph = build_competition_graph(contigs, mash_lookup, min_overlap, min_size_safeguard)
+    position = {c.query_id: idx for idx, c in enumerate(contigs)}
+
+    # Helper to check competition rules: can contig at position c_idx be disqualified along 'edge'?
+    def check_competition(c_idx: int, edge: CompetitionEdge) -> bool:
+        C = contigs[c_idx]
+        O = contigs[edge.neighbor]
         # 1. Shared Target (assumed by grouping)
-        # 2. Overlap Condition
-        has_overlap = False
-        for sC, eC in C.intervals:
-            for sO, eO in O.intervals:
-                if min(eC, eO) - max(sC, sO) >= min_overlap:
-                    has_overlap = True
-                    break
-            if has_overlap: break
-        if not has_overlap: return False
+        # 2. Overlap Condition (guaranteed by the competition graph)
 
         # 3. Active Status (O must be RETAINED)
         if O.status != Status.ALIGNED_RETAINED: return False
 
         # 4. Superior Score (using adjusted scores with BUSCO bonus)
-        score_C = get_adjusted_score(C, busco_bonus_factor, all_contigs)
-        score_O = get_adjusted_score(O, busco_bonus_factor, all_contigs)
+        score_C = get_adjusted_score(C, busco_bonus_factor, busco_index=busco_index)
+        score_O = get_adjusted_score(O, busco_bonus_factor, busco_index=busco_index)
         
         if score_O > score_C:
             pass
         elif score_O == score_C:
-            # Tie-break: earlier in sorted list wins. 
-            # We will sort 'contigs' at the start of tournament.
-            # So if O appears before C in 'contigs', O wins.
-            idx_C = contigs.index(C)
-            idx_O = contigs.index(O)
-            if idx_O < idx_C:
+            # Tie-break: earlier in sorted list wins.
+            if edge.neighbor < c_idx:
                 logger.warning(f"Score tie between {C.query_id} and {O.query_id}. {O.query_id} wins by position.")
             else:
                 return False
@@ -332,79 +519,70 @@ def run_tournament_on_target(
             return False
 
         # 5. Similarity
-        dist = mash_lookup.get(C.query_id, {}).get(O.query_id)
-        if dist is None or dist >= distance_threshold:
+        if edge.distance is None or edge.distance >= distance_threshold:
             return False
 
         # 6. Size Safeguard
-        if O.query_length < min_size_safeguard * C.query_length:
+        if edge.size_protected:
             return False
 
         # 7. BUSCO Ortholog Rule
         # O can only disqualify C if C has <= unique single-copy orthologs compared to O
-        if all_contigs is not None:
-            exclude_ids = {C.query_id, O.query_id}
-            unique_orthologs_C = count_unique_single_copy_orthologs(C, all_contigs, exclude_ids)
-            unique_orthologs_O = count_unique_single_copy_orthologs(O, all_contigs, exclude_ids)
+        if busco_index is not None:
+            exclude_ids = (C.query_id, O.query_id)
+            unique_orthologs_C = busco_index.count_unique(C, exclude_ids)
+            unique_orthologs_O = busco_index.count_unique(O, exclude_ids)
             if unique_orthologs_C > unique_orthologs_O:
                 return False
 
         return True
 
-    # Sorting for Pass 1: target_id (already grouped), then min start coordinate
-    contigs.sort(key=lambda x: min(i[0] for i in x.intervals) if x.intervals else 0)
+    # Helper to record why a retained contig survives against its overlapping competitors
+    def record_retained_reasons(c_idx: int, use_busco_index: bool):
+        C = contigs[c_idx]
+        for edge in graph[c_idx].values():
+            O = contigs[edge.neighbor]
+            # If it overlaps with a retained contig but isn't discarded, record why
+            if O.status != Status.ALIGNED_RETAINED:
+                continue
+            if use_busco_index:
+                score_C = get_adjusted_score(C, busco_bonus_factor, busco_index=busco_index)
+                score_O = get_adjusted_score(O, busco_bonus_factor, busco_index=busco_index)
+            else:
+                score_C = get_adjusted_score(C, busco_bonus_factor)
+                score_O = get_adjusted_score(O, busco_bonus_factor)
+
+            if score_C > score_O:
+                C.retained_reason["Score"] = True
+            # Divergent enough to be kept despite lower score?
+            if edge.distance is not None and edge.distance > distance_threshold and score_C < score_O:
+                C.retained_reason["Mash"] = True
+            # Too large to be discarded by a much smaller contig?
+            if edge.size_protected and score_C < score_O:
+                C.retained_reason["Size"] = True
+
+        # If no overlaps at all, it's unique to this locus
+        if not graph[c_idx]:
+            C.retained_reason["Unique"] = True
 
     # Pass 1: Initial Sweep
     # This pass identifies contigs that are immediately redundant against better-scoring contigs.
-    for C in contigs:
+    for c_idx, C in enumerate(contigs):
         if C.status != Status.ALIGNED_RETAINED: continue
         
         disqualifier_found = False
-        for O in contigs:
-            if O.query_id == C.query_id: continue
+        for edge in graph[c_idx].values():
             # If O is superior to C, mark C for discard
-            if check_competition(C, O):
-                C.status = Status.ALIGNED_DISCARDED
-                C.disqualifier = O.query_id
+            if check_competition(c_idx, edge):
+                set_status(C, Status.ALIGNED_DISCARDED)
+                C.disqualifier = contigs[edge.neighbor].query_id
                 C.discarded_reason["Round1"] = True
                 disqualifier_found = True
                 break
         
         if not disqualifier_found:
             # If not discarded, determine the specific reasons why it was kept
-            any_overlap = False
-            for O in contigs:
-                if O.query_id == C.query_id: continue
-                # Identify if there's any overlap with other contigs on this target
-                ovl = False
-                for sC, eC in C.intervals:
-                    for sO, eO in O.intervals:
-                        if min(eC, eO) - max(sC, sO) >= min_overlap:
-                            ovl = True; break
-                    if ovl: break
-                if not ovl: continue
-                
-                any_overlap = True
-                # If it overlaps with a retained contig but isn't discarded, record why
-                if O.status == Status.ALIGNED_RETAINED:
-                    score_C = get_adjusted_score(C, busco_bonus_factor, all_contigs)
-                    score_O = get_adjusted_score(O, busco_bonus_factor, all_contigs)
-                    
-                    if score_C > score_O:
-                        C.retained_reason["Score"] = True
-                    
-                    dist = mash_lookup.get(C.query_id, {}).get(O.query_id)
-                    # Divergent enough to be kept despite lower score?
-                    if dist is not None and dist > distance_threshold and score_C < score_O:
-                        C.retained_reason["Mash"] = True
-                    
-                    # Too large to be discarded by a much smaller contig?
-                    if O.query_length < min_size_safeguard * C.query_length and score_C < score_O:
-                        C.retained_reason["Size"] = True
-            
-            # If no overlaps at all, it's unique to this locus
-            if not any_overlap:
-                C.retained_reason["Unique"] = True
+            record_retained_reasons(c_idx, use_busco_index=True)
 
     # Pass 2+: Iterative Loop
     # This loop handles 'orphans' and ensures stability across status changes.
@@ -416,40 +594,42 @@ def run_tournament_on_target(
         
         # Identify Orphans: Discarded contigs whose disqualifier was itself discarded later
         orphans = []
-        id_to_contig = {c.query_id: c for c in contigs}
         for c in contigs:
             if c.status == Status.ALIGNED_DISCARDED:
-                dq = id_to_contig.get(c.disqualifier)
-                if dq and dq.status == Status.ALIGNED_DISCARDED:
+                dq_idx = position.get(c.disqualifier)
+                if dq_idx is not None and contigs[dq_idx].status == Status.ALIGNED_DISCARDED:
                     orphans.append(c)
         
         # Sort orphans by genomic position to maintain deterministic behavior
-        orphans.sort(key=lambda x: min(i[0] for i in x.intervals) if x.intervals else 0)
+        orphans.sort(key=min_start)
         
         for C in orphans:
             # The Challenge: See if the orphan can be promoted or if it's still disqualified
+            c_idx = position[C.query_id]
             
             # 1. Challenge existing winners
-            for R in contigs:
+            for r_idx in graph[c_idx]:
+                R = contigs[r_idx]
                 if R.status != Status.ALIGNED_RETAINED: continue
                 # Does orphan C discard current winner R?
                 old_status = C.status
-                C.status = Status.ALIGNED_RETAINED # Temporarily treat as active for competition check
-                if check_competition(R, C):
-                    R.status = Status.ALIGNED_DISCARDED
+                set_status(C, Status.ALIGNED_RETAINED) # Temporarily treat as active for competition check
+                if check_competition(r_idx, graph[r_idx][c_idx]):
+                    set_status(R, Status.ALIGNED_DISCARDED)
                     R.disqualifier = C.query_id
                     R.discarded_reason["OrphanOverride"] = True
                     # Reset retained reasons as it's now discarded
                     for k in ["OrphanRecovery", "Score", "Mash", "Size"]:
                         R.retained_reason[k] = False
                     status_changed = True
-                C.status = old_status
+                set_status(C, old_status)
 
             # 2. Check if C is still disqualified by any remaining winner R
             disqualified_by_R = None
-            for R in contigs:
+            for edge in graph[c_idx].values():
+                R = contigs[edge.neighbor]
                 if R.status != Status.ALIGNED_RETAINED: continue
-                if check_competition(C, R):
+                if check_competition(c_idx, edge):
                     disqualified_by_R = R
                     break
             
@@ -461,37 +641,12 @@ def run_tournament_on_target(
                     C.retained_reason[k] = False
             else:
                 # Promote C to RETAINED as no active winner disqualifies it
-                C.status = Status.ALIGNED_RETAINED
+                set_status(C, Status.ALIGNED_RETAINED)
                 C.disqualifier = None
                 C.retained_reason["OrphanRecovery"] = True
                 
                 # Update competitive retained reasons
-                any_overlap = False
-                for R in contigs:
-                    if R.query_id == C.query_id: continue
-                    ovl = False
-                    for sC, eC in C.intervals:
-                        for sR, eR in R.intervals:
-                            if min(eC, eR) - max(sC, sR) >= min_overlap:
-                                ovl = True; break
-                        if ovl: break
-                    if not ovl: continue
-                    
-                    any_overlap = True
-                    if R.status == Status.ALIGNED_RETAINED:
-                        score_C = get_adjusted_score(C, busco_bonus_factor)
-                        score_R = get_adjusted_score(R, busco_bonus_factor)
-                        
-                        if score_C > score_R:
-                            C.retained_reason["Score"] = True
-                        dist = mash_lookup.get(C.query_id, {}).get(R.query_id)
-                        if dist is not None and dist > distance_threshold and score_C < score_R:
-                            C.retained_reason["Mash"] = True
-                        if R.query_length < min_size_safeguard * C.query_length and score_C < score_R:
-                            C.retained_reason["Size"] = True
-                
-                if not any_overlap:
-                    C.retained_reason["Unique"] = True
+                record_retained_reasons(c_idx, use_busco_index=False)
                     
                 status_changed = True
 
@@ -506,7 +661,7 @@ def run_tournament_on_target(
 def screen_unaligned_contig(
     unaligned_contig: ContigSummary,
     retained_contigs: List[ContigSummary],
-    mash_lookup: Dict[str, Dict[str, float]],
+    mash_lookup: Union[Dict[str, Dict[str, float]], MashDistanceMatrix],
     distance_threshold: float
 ) -> ContigSummary:
     """
@@ -514,17 +669,20 @@ def screen_unaligned_contig(
     
     :param unaligned_contig: The unaligned ContigSummary to check.
     :param retained_contigs: List of currently RETAINED contigs (ALIGNED or UNALIGNED).
-    :param mash_lookup: Nested dictionary for Mash distance lookups.
+    :param mash_lookup: Nested dictionary or MashDistanceMatrix for Mash distance lookups.
     :param distance_threshold: Mash distance threshold.
     :return: Updated unaligned_contig.
     """
     u_id = unaligned_contig.query_id
+    # Only contigs under the threshold can disqualify; most unaligned contigs have none
+    close_ids = get_close_neighbors(mash_lookup, u_id, distance_threshold)
+    if not close_ids:
+        return unaligned_contig
     
     for c in retained_contigs:
         if c.query_id == u_id: continue
         
-        dist = mash_lookup.get(u_id, {}).get(c.query_id)
-        if dist is not None and dist < distance_threshold:
+        if c.query_id in close_ids:
             unaligned_contig.status = Status.UNALIGNED_DISCARDED
             unaligned_contig.disqualifier = c.query_id
             unaligned_contig.discarded_reason["Mash_Redundancy"] = True
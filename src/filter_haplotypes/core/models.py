@@ -1,11 +1,14 @@
 """
 Data models for FilterHaplotypes.
-Defines the ContigSummary class and filtering Status enum.
+Defines the filtering Status enum, the columnar ContigStore with its ContigSummary views,
+and the BUSCO carrier index.
 """
 
-from dataclasses import dataclass, field
+from collections.abc import MutableMapping
 from enum import Enum
-from typing import List, Tuple, Set, Optional, Dict
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
 
 class Status(Enum):
     """
@@ -16,36 +19,486 @@ class Status(Enum):
     UNALIGNED_RETAINED = "UNALIGNED_RETAINED"
     UNALIGNED_DISCARDED = "UNALIGNED_DISCARDED"
 
-@dataclass
+# Status codes stored in ContigStore.status are positions in STATUSES
+STATUSES: Tuple[Status, ...] = tuple(Status)
+STATUS_CODES: Dict[Status, int] = {status: code for code, status in enumerate(STATUSES)}
+
+# Reason flags, stored as bits (in this order) of ContigStore.discarded_flags / retained_flags
+DISCARDED_REASONS = ("Round1", "OrphanOverride", "Mash_Redundancy", "GC")
+RETAINED_REASONS = ("Score", "Mash", "Size", "OrphanRecovery", "Unique")
+DISCARDED_BITS = {name: 1 << bit for bit, name in enumerate(DISCARDED_REASONS)}
+RETAINED_BITS = {name: 1 << bit for bit, name in enumerate(RETAINED_REASONS)}
+
+# Per-contig columns (one entry per contig); intervals and BUSCO genes are stored separately
+STORE_COLUMNS: Dict[str, Any] = {
+    'query_length': np.int64,
+    'gc_content': np.float64,
+    'status': np.uint8,
+    'discarded_flags': np.uint8,
+    'retained_flags': np.uint8,
+    'disqualifier': object,
+    'target_id': object,
+    'sum_normalized_score': np.float64,
+    'max_alignment_score': np.int64,
+    'initial_overlapping_bases': np.int64,
+    'tiled_out_count': np.int64,
+}
+
+NO_BUSCO_GENES: frozenset = frozenset()
+
+class ReasonFlags(MutableMapping):
+    """
+    Dictionary-like view of one contig's reason bit-flags (reason name -> bool).
+    """
+    __slots__ = ('_flags', '_index', '_bits')
+
+    def __init__(self, flags: np.ndarray, index: int, bits: Dict[str, int]):
+        self._flags = flags
+        self._index = index
+        self._bits = bits
+
+    def __getitem__(self, name: str) -> bool:
+        return bool(self._flags[self._index] & self._bits[name])
+
+    def __setitem__(self, name: str, value: bool):
+        bit = self._bits[name]
+        if value:
+            self._flags[self._index] |= bit
+        else:
+            self._flags[self._index] &= ~bit & 0xff
+
+    def __delitem__(self, name: str):
+        raise TypeError("Reason flags cannot be removed")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._bits)
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+def reason_bits(reasons: Mapping[str, bool], bits: Dict[str, int]) -> int:
+    """
+    Encode a reason dictionary as bit-flags.
+
+    :param reasons: Mapping of reason name to bool (names missing from it are False).
+    :param bits: Bit of each reason name (DISCARDED_BITS or RETAINED_BITS).
+    :return: Bit-flags.
+    """
+    unknown = set(reasons) - set(bits)
+    if unknown:
+        raise KeyError(f"Unknown reasons: {sorted(unknown)}")
+    return sum(bit for name, bit in bits.items() if reasons.get(name, False))
+
+class ContigStore:
+    """
+    Struct-of-arrays store of contig summaries. Every per-contig attribute is a NumPy column
+    (STORE_COLUMNS), filtering reasons are bit-flags, and alignment intervals are kept as
+    start/end arrays indexed by an offsets array. BUSCO genes are kept for carriers only.
+    Indexing or iterating the store gives ContigSummary views; subsets (take) are what gets
+    shipped to worker processes.
+    """
+
+    def __init__(
+        self,
+        query_ids: Iterable[str],
+        query_lengths: Iterable[int],
+        gc_contents: Optional[Iterable[float]] = None,
+        busco_genes: Optional[Mapping[str, Set[str]]] = None
+    ):
+        """
+        :param query_ids: Contig IDs.
+        :param query_lengths: Contig lengths.
+        :param gc_contents: GC% of each contig (default 0.0).
+        :param busco_genes: Dictionary mapping contig ID to its complete BUSCO IDs.
+        """
+        self.query_ids: List[str] = list(query_ids)
+        num_contigs = len(self.query_ids)
+        for column, dtype in STORE_COLUMNS.items():
+            setattr(self, column, np.full(num_contigs, None) if dtype is object else np.zeros(num_contigs, dtype=dtype))
+        self.query_length[:] = np.fromiter(query_lengths, dtype=np.int64, count=num_contigs)
+        if gc_contents is not None:
+            self.gc_content[:] = np.fromiter(gc_contents, dtype=np.float64, count=num_contigs)
+        self.status[:] = STATUS_CODES[Status.UNALIGNED_RETAINED]
+
+        self.interval_offsets = np.zeros(num_contigs + 1, dtype=np.int64)
+        self.interval_starts = np.empty(0, dtype=np.int64)
+        self.interval_ends = np.empty(0, dtype=np.int64)
+
+        self._build_index()
+        # Complete BUSCO IDs by row, for carriers only
+        self.busco_genes: Dict[int, Set[str]] = {}
+        for query_id, genes in (busco_genes or {}).items():
+            row = self.index.get(query_id)
+            if row is not None and genes:
+                self.busco_genes[row] = genes
+
+    def _build_index(self):
+        self.index: Dict[str, int] = {query_id: row for row, query_id in enumerate(self.query_ids)}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The ID -> row index is rebuilt on unpickling rather than shipped to workers
+        state = self.__dict__.copy()
+        del state['index']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._build_index()
+
+    @classmethod
+    def from_summaries(cls, summaries: Iterable["ContigSummary"]) -> "ContigStore":
+        """
+        Build a store holding a copy of the given summaries, in order.
+
+        :param summaries: ContigSummary objects (from any store).
+        :return: A new ContigStore.
+        """
+        summaries = list(summaries)
+        store = cls([c.query_id for c in summaries], [c.query_length for c in summaries])
+        for row, c in enumerate(summaries):
+            store[row].update_from(c, with_intervals=False)
+        store.set_intervals(range(len(summaries)), [c.intervals for c in summaries])
+        return store
+
+    def __len__(self) -> int:
+        return len(self.query_ids)
+
+    def __contains__(self, query_id: str) -> bool:
+        return query_id in self.index
+
+    def __getitem__(self, row: int) -> "ContigSummary":
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"Contig row {row} out of range")
+        return ContigSummary.view(self, row)
+
+    def __iter__(self) -> Iterator["ContigSummary"]:
+        for row in range(len(self)):
+            yield ContigSummary.view(self, row)
+
+    def get(self, query_id: str) -> Optional["ContigSummary"]:
+        """
+        :return: The ContigSummary view of a contig, or None if it is not in the store.
+        """
+        row = self.index.get(query_id)
+        return ContigSummary.view(self, row) if row is not None else None
+
+    def rows(self, query_ids: Iterable[str]) -> np.ndarray:
+        """
+        :return: Row of each given contig ID (all must be in the store).
+        """
+        return np.fromiter((self.index[query_id] for query_id in query_ids), dtype=np.int64)
+
+    def status_mask(self, *statuses: Status) -> np.ndarray:
+        """
+        :return: Boolean mask of the contigs with any of the given statuses.
+        """
+        return np.isin(self.status, [STATUS_CODES[status] for status in statuses])
+
+    def intervals(self, row: int) -> Tuple[Tuple[int, int], ...]:
+        """
+        :return: Alignment intervals (start, end) of a contig.
+        """
+        start, end = self.interval_offsets[row], self.interval_offsets[row + 1]
+        return tuple(zip(self.interval_starts[start:end].tolist(), self.interval_ends[start:end].tolist()))
+
+    def set_intervals(self, rows: Sequence[int], intervals: Sequence[Sequence[Tuple[int, int]]]):
+        """
+        Replace the intervals of several contigs at once (the offsets array is rebuilt once).
+
+        :param rows: Rows of the contigs.
+        :param intervals: New intervals of each contig.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        counts = np.diff(self.interval_offsets)
+        # Row of every kept interval, followed by the row of every new interval
+        kept = np.ones(len(self), dtype=bool)
+        kept[rows] = False
+        interval_rows = np.repeat(np.arange(len(self)), counts)
+        keep = kept[interval_rows]
+        new_counts = np.fromiter((len(row_intervals) for row_intervals in intervals), dtype=np.int64, count=len(rows))
+        new_intervals = np.array(
+            [interval for row_intervals in intervals for interval in row_intervals], dtype=np.int64
+        ).reshape(-1, 2)
+
+        interval_rows = np.concatenate([interval_rows[keep], np.repeat(rows, new_counts)])
+        order = np.argsort(interval_rows, kind='stable')
+        self.interval_starts = np.concatenate([self.interval_starts[keep], new_intervals[:, 0]])[order]
+        self.interval_ends = np.concatenate([self.interval_ends[keep], new_intervals[:, 1]])[order]
+        self.interval_offsets = np.concatenate([[0], np.cumsum(np.bincount(interval_rows, minlength=len(self)))])
+
+    def take(self, rows: Sequence[int]) -> "ContigStore":
+        """
+        Copy a subset of the contigs into a new store.
+
+        :param rows: Rows to copy, in the order they should appear in the new store.
+        :return: A new ContigStore.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        subset = ContigStore.__new__(ContigStore)
+        subset.query_ids = [self.query_ids[row] for row in rows.tolist()]
+        for column in STORE_COLUMNS:
+            setattr(subset, column, getattr(self, column)[rows])
+
+        counts = np.diff(self.interval_offsets)[rows]
+        subset.interval_offsets = np.concatenate([[0], np.cumsum(counts)])
+        positions = np.repeat(self.interval_offsets[rows] - subset.interval_offsets[:-1], counts) + np.arange(subset.interval_offsets[-1])
+        subset.interval_starts = self.interval_starts[positions]
+        subset.interval_ends = self.interval_ends[positions]
+
+        subset._build_index()
+        subset.busco_genes = {
+            new_row: self.busco_genes[row] for new_row, row in enumerate(rows.tolist()) if row in self.busco_genes
+        }
+        return subset
+
+    def chunks(self, num_chunks: int) -> List["ContigStore"]:
+        """
+        Split the store into consecutive subsets of near-equal size.
+
+        :param num_chunks: Maximum number of chunks.
+        :return: Non-empty ContigStore subsets, in order.
+        """
+        return [self.take(rows) for rows in np.array_split(np.arange(len(self)), max(1, num_chunks)) if len(rows)]
+
+    def update_from(self, other: "ContigStore", columns: Sequence[str]) -> np.ndarray:
+        """
+        Copy columns from another store into the rows of the same contigs.
+
+        :param other: Store holding a subset of this store's contigs (e.g. returned by a worker).
+        :param columns: Names of the STORE_COLUMNS to copy.
+        :return: Row in this store of each contig of other.
+        """
+        rows = self.rows(other.query_ids)
+        for column in columns:
+            getattr(self, column)[rows] = getattr(other, column)
+        return rows
+
+def _column_property(column: str, doc: str) -> property:
+    def getter(self):
+        value = getattr(self._store, column)[self._row]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def setter(self, value):
+        getattr(self._store, column)[self._row] = value
+
+    return property(getter, setter, doc=doc)
+
+def _restore_summary(fields: Dict[str, Any]) -> "ContigSummary":
+    return ContigSummary(**fields)
+
 class ContigSummary:
     """
-    Data class representing a summary of a contig, its alignments, and its filtering status.
-    """
-    # General Attributes
-    query_id: str
-    query_length: int
-    gc_content: float = 0.0
-    busco_genes: Set[str] = field(default_factory=set)
-    status: Status = Status.UNALIGNED_RETAINED
-    discarded_reason: Dict[str, bool] = field(default_factory=lambda: {
-        "Round1": False,
-        "OrphanOverride": False,
-        "Mash_Redundancy": False,
-        "GC": False
-    })
-    retained_reason: Dict[str, bool] = field(default_factory=lambda: {
-        "Score": False,
-        "Mash": False,
-        "Size": False,
-        "OrphanRecovery": False,
-        "Unique": False
-    })
-    disqualifier: Optional[str] = None
-
-    # Alignment-Specific Attributes
-    target_id: Optional[str] = None
-    intervals: List[Tuple[int, int]] = field(default_factory=list)
-    sum_normalized_score: float = 0.0
-    max_alignment_score: int = 0
-    initial_overlapping_bases: int = 0
-    tiled_out_count: int = 0  # To store the count of discarded (tiled-out) alignment events
+    Summary of a contig, its alignments, and its filtering status: a view of one row of a
+    ContigStore. Constructing a ContigSummary directly creates a single-contig store.
+    """
+    __slots__ = ('_store', '_row')
+
+    FIELDS = (
+        'query_id', 'query_length', 'gc_content', 'busco_genes', 'status', 'discarded_reason',
+        'retained_reason', 'disqualifier', 'target_id', 'intervals', 'sum_normalized_score',
+        'max_alignment_score', 'initial_overlapping_bases', 'tiled_out_count'
+    )
+
+    def __init__(
+        self,
+        query_id: str,
+        query_length: int,
+        gc_content: float = 0.0,
+        busco_genes: Optional[Set[str]] = None,
+        status: Status = Status.UNALIGNED_RETAINED,
+        discarded_reason: Optional[Mapping[str, bool]] = None,
+        retained_reason: Optional[Mapping[str, bool]] = None,
+        disqualifier: Optional[str] = None,
+        target_id: Optional[str] = None,
+        intervals: Optional[List[Tuple[int, int]]] = None,
+        sum_normalized_score: float = 0.0,
+        max_alignment_score: int = 0,
+        initial_overlapping_bases: int = 0,
+        tiled_out_count: int = 0
+    ):
+        self._store = ContigStore([query_id], [query_length], [gc_content], {query_id: busco_genes} if busco_genes else None)
+        self._row = 0
+        self.status = status
+        if discarded_reason:
+            self.discarded_reason = discarded_reason
+        if retained_reason:
+            self.retained_reason = retained_reason
+        self.disqualifier = disqualifier
+        self.target_id = target_id
+        if intervals:
+            self.intervals = intervals
+        self.sum_normalized_score = sum_normalized_score
+        self.max_alignment_score = max_alignment_score
+        self.initial_overlapping_bases = initial_overlapping_bases
+        self.tiled_out_count = tiled_out_count
+
+    @classmethod
+    def view(cls, store: ContigStore, row: int) -> "ContigSummary":
+        """
+        :return: A view of one row of a store.
+        """
+        summary = object.__new__(cls)
+        summary._store = store
+        summary._row = row
+        return summary
+
+    def __reduce__(self):
+        # A view is pickled as a standalone summary, never with the whole store
+        return _restore_summary, ({name: getattr(self, name) for name in self.FIELDS},)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"ContigSummary({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        # Value equality over every field, whichever store the summaries are views of
+        if not isinstance(other, ContigSummary):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    # Mutable and compared by value, so unhashable
+    __hash__ = None
+
+    @property
+    def query_id(self) -> str:
+        return self._store.query_ids[self._row]
+
+    query_length = _column_property('query_length', "Contig length.")
+    gc_content = _column_property('gc_content', "GC% of the contig.")
+    disqualifier = _column_property('disqualifier', "ID of the contig that caused this one to be discarded.")
+    target_id = _column_property('target_id', "Primary target of an aligned contig.")
+    sum_normalized_score = _column_property('sum_normalized_score', "Tiled alignment score over contig length.")
+    max_alignment_score = _column_property('max_alignment_score', "Best tiled alignment score.")
+    initial_overlapping_bases = _column_property('initial_overlapping_bases', "Bases covered by more than one alignment.")
+    tiled_out_count = _column_property('tiled_out_count', "Number of discarded (tiled-out) alignments.")
+
+    @property
+    def status(self) -> Status:
+        return STATUSES[self._store.status[self._row]]
+
+    @status.setter
+    def status(self, status: Status):
+        self._store.status[self._row] = STATUS_CODES[status]
+
+    @property
+    def discarded_reason(self) -> ReasonFlags:
+        return ReasonFlags(self._store.discarded_flags, self._row, DISCARDED_BITS)
+
+    @discarded_reason.setter
+    def discarded_reason(self, reasons: Mapping[str, bool]):
+        self._store.discarded_flags[self._row] = reason_bits(reasons, DISCARDED_BITS)
+
+    @property
+    def retained_reason(self) -> ReasonFlags:
+        return ReasonFlags(self._store.retained_flags, self._row, RETAINED_BITS)
+
+    @retained_reason.setter
+    def retained_reason(self, reasons: Mapping[str, bool]):
+        self._store.retained_flags[self._row] = reason_bits(reasons, RETAINED_BITS)
+
+    @property
+    def busco_genes(self) -> Set[str]:
+        return self._store.busco_genes.get(self._row, NO_BUSCO_GENES)
+
+    @busco_genes.setter
+    def busco_genes(self, genes: Set[str]):
+        if genes:
+            self._store.busco_genes[self._row] = genes
+        else:
+            self._store.busco_genes.pop(self._row, None)
+
+    @property
+    def intervals(self) -> Tuple[Tuple[int, int], ...]:
+        """
+        Alignment intervals (start, end) on the target. The tuple is a copy of the store's
+        interval arrays: to change the intervals, assign a new sequence to this attribute.
+        """
+        return self._store.intervals(self._row)
+
+    @intervals.setter
+    def intervals(self, intervals: Sequence[Tuple[int, int]]):
+        self._store.set_intervals([self._row], [intervals])
+
+    def update_from(self, other: "ContigSummary", with_intervals: bool = True):
+        """
+        Copy every attribute except query_id from another summary.
+
+        :param other: Summary to copy from.
+        :param with_intervals: Also copy the intervals (rebuilds the store's interval offsets).
+        """
+        for name in self.FIELDS[1:]:
+            if name != 'intervals' or with_intervals:
+                setattr(self, name, getattr(other, name))
+
+class BuscoCarrierIndex:
+    """
+    Occurrence counts of BUSCO ids over ALIGNED_RETAINED contigs (busco_id -> number of carriers).
+    The index is kept in sync through set_status, so uniqueness queries cost O(|busco_genes|)
+    instead of a scan over every contig.
+    """
+
+    def __init__(self, contigs: Iterable[ContigSummary] = ()):
+        self.counts: Dict[str, int] = {}
+        # BUSCO genes of each ALIGNED_RETAINED carrier, by query_id
+        self.carriers: Dict[str, Set[str]] = {}
+        for c in contigs:
+            if c.status == Status.ALIGNED_RETAINED:
+                self.add(c)
+
+    def add(self, contig: ContigSummary):
+        """
+        Register a contig as an ALIGNED_RETAINED carrier of its BUSCO genes.
+        """
+        if not contig.busco_genes or contig.query_id in self.carriers:
+            return
+        self.carriers[contig.query_id] = contig.busco_genes
+        for busco_id in contig.busco_genes:
+            self.counts[busco_id] = self.counts.get(busco_id, 0) + 1
+
+    def remove(self, contig: ContigSummary):
+        """
+        Unregister a contig that is no longer ALIGNED_RETAINED.
+        """
+        genes = self.carriers.pop(contig.query_id, None)
+        if not genes:
+            return
+        for busco_id in genes:
+            self.counts[busco_id] -= 1
+
+    def copy(self) -> 'BuscoCarrierIndex':
+        """
+        Independent copy of the counts and carriers; the carriers' gene sets are shared read-only.
+        """
+        index = BuscoCarrierIndex()
+        index.counts = dict(self.counts)
+        index.carriers = dict(self.carriers)
+        return index
+
+    def set_status(self, contig: ContigSummary, status: Status):
+        """
+        Change a contig's status and update the carrier counts accordingly.
+        """
+        contig.status = status
+        if status == Status.ALIGNED_RETAINED:
+            self.add(contig)
+        else:
+            self.remove(contig)
+
+    def count_unique(self, contig: ContigSummary, exclude_ids: Iterable[str]) -> int:
+        """
+        Count BUSCO ids of a contig carried by no ALIGNED_RETAINED contig outside exclude_ids.
+        """
+        if not contig.busco_genes:
+            return 0
+        excluded = [self.carriers[q_id] for q_id in exclude_ids if q_id in self.carriers]
+        unique_count = 0
+        for busco_id in contig.busco_genes:
+            carriers = self.counts.get(busco_id, 0) - sum(1 for genes in excluded if busco_id in genes)
+            if carriers == 0:
+                unique_count += 1
+        return unique_count
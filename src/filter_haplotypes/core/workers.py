@@ -0,0 +1,70 @@
+"""
+Multiprocessing worker entry points for FilterHaplotypes.
+Workers attach once (via the pool initializer) to the memory-mapped Mash distance matrix
+and to other read-only shared state, so per-task arguments stay small.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from src.filter_haplotypes.core.models import ContigStore, BuscoCarrierIndex
+from src.filter_haplotypes.core.filtering import run_tournament_on_target, screen_unaligned_contig
+from src.filter_haplotypes.parsers.mash_parser import MashDistanceMatrix
+from src.filter_haplotypes.utils.logging import worker_configurer
+
+# Per-process state populated by init_worker
+_WORKER_STATE: Dict[str, Any] = {}
+
+def init_worker(
+    log_queue,
+    mash_dir: Optional[Union[str, Path]] = None,
+    retained_contigs: Optional[ContigStore] = None,
+    busco_index: Optional[BuscoCarrierIndex] = None
+):
+    """
+    Pool initializer: configure logging and attach to the shared read-only state.
+
+    :param log_queue: Logging queue from setup_logging.
+    :param mash_dir: Directory holding a saved MashDistanceMatrix (memory-mapped read-only).
+    :param retained_contigs: Currently retained contigs (Phase 6 screening).
+    :param busco_index: BUSCO carrier index before the tournament (Phase 5), copied by each task.
+    """
+    worker_configurer(log_queue)
+    _WORKER_STATE.clear()
+    if mash_dir is not None:
+        _WORKER_STATE['mash'] = MashDistanceMatrix.load(mash_dir, mmap_mode='r')
+    if retained_contigs is not None:
+        _WORKER_STATE['retained'] = list(retained_contigs)
+    if busco_index is not None:
+        _WORKER_STATE['busco'] = busco_index
+
+def tournament_task(
+    contigs: ContigStore,
+    distance_threshold: float,
+    min_overlap: int,
+    min_size_safeguard: float,
+    max_tournament_iterations: int,
+    busco_bonus_factor: float
+) -> ContigStore:
+    """
+    Phase 5 task: run the tournament for one target against the shared Mash distances.
+    The contigs of the target are updated in place and the store is sent back.
+    Status changes are tracked on a per-task copy of the shared BUSCO carrier index, so they
+    never leak into the tournament of another target run by the same worker.
+    """
+    base_index = _WORKER_STATE.get('busco')
+    busco_index = base_index.copy() if base_index is not None else None
+    run_tournament_on_target(
+        list(contigs), _WORKER_STATE['mash'], distance_threshold, min_overlap, min_size_safeguard,
+        max_tournament_iterations, busco_bonus_factor, None, busco_index
+    )
+    return contigs
+
+def screen_unaligned_task(unaligned_contigs: ContigStore, distance_threshold: float) -> ContigStore:
+    """
+    Phase 6 task: screen a chunk of unaligned contigs against the shared retained contigs.
+    The contigs are updated in place and the store is sent back.
+    """
+    for unaligned_contig in unaligned_contigs:
+        screen_unaligned_contig(unaligned_contig, _WORKER_STATE['retained'], _WORKER_STATE['mash'], distance_threshold)
+    return unaligned_contigs
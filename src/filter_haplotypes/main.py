@@ -7,23 +7,26 @@ to generating the final interactive report and filtered assembly.
 import argparse
 import logging
 import multiprocessing
+import shutil
 import sys
+import tempfile
 from pathlib import Path
 
-from src.filter_haplotypes.parsers.fasta_parser import parse_fasta
-from src.filter_haplotypes.parsers.paf_parser import parse_paf, get_primary_targets
-from src.filter_haplotypes.parsers.mash_parser import parse_mash, build_mash_lookup, get_mash_distance
-from src.filter_haplotypes.parsers.busco_parser import parse_busco, get_busco_counts
-from src.filter_haplotypes.core.models import ContigSummary, Status
+from src.filter_haplotypes.parsers.fasta_parser import scan_fasta
+from src.filter_haplotypes.parsers.paf_parser import parse_paf, get_primary_targets, primary_target_map
+from src.filter_haplotypes.parsers.mash_parser import stream_mash_lookup, get_mash_distance, get_close_neighbors
+from src.filter_haplotypes.parsers.sketch_parser import parse_mash_sketch, find_candidate_pairs, sketch_distance_lookup
+from src.filter_haplotypes.parsers.sketcher import sketch_fasta
+from src.filter_haplotypes.parsers.busco_parser import BuscoTable, BuscoCompleteness
+from src.filter_haplotypes.core.models import ContigStore, Status, BuscoCarrierIndex, STATUS_CODES, DISCARDED_BITS
 from src.filter_haplotypes.core.filtering import (
     calculate_initial_redundancy,
-    tile_and_score_contig,
+    tile_and_score_alignments,
     get_overlapping_pairs,
     estimate_distance_threshold,
-    run_tournament_on_target,
-    screen_unaligned_contig
 )
-from src.filter_haplotypes.utils.logging import setup_logging, worker_configurer
+from src.filter_haplotypes.core.workers import init_worker, tournament_task, screen_unaligned_task
+from src.filter_haplotypes.utils.logging import setup_logging
 from src.filter_haplotypes.utils.stats import calculate_assembly_stats
 from src.filter_haplotypes.visualization.report_generator import generate_report, write_filtered_fasta
 
@@ -34,14 +37,18 @@ def main():
     )
     
     # Mandatory
-    parser.add_argument("-p", "--paf", required=True, help="Alignment file (PAF) generated via minimap2 -c")
-    parser.add_argument("-m", "--mash", required=True, help="Mash distances TSV (Query vs Query)")
-    parser.add_argument("-f", "--fasta", required=True, help="Original assembly FASTA file")
+    parser.add_argument("-p", "--paf", required=True, help="Alignment file (PAF) generated via minimap2 -c (plain, gzip, bgzip or zstd)")
+    mash_source = parser.add_mutually_exclusive_group(required=True)
+    mash_source.add_argument("-m", "--mash", help="Mash distances TSV (Query vs Query) (plain, gzip, bgzip or zstd)")
+    mash_source.add_argument("--mash-sketch", help="Sketch of the contigs (.msh, JSON from 'mash info -d', or .npz from --sketch-from-fasta); distances are computed only for queried pairs")
+    mash_source.add_argument("--sketch-from-fasta", action="store_true", help="Sketch the contigs of --fasta with the built-in MinHash sketcher instead of reading Mash output")
+    parser.add_argument("-f", "--fasta", required=True, help="Original assembly FASTA file (plain, gzip, bgzip or zstd)")
     
     # Optional
     parser.add_argument("-b", "--busco", help="Optional BUSCO full_table.tsv")
     parser.add_argument("-o", "--output", default="./output", help="Output directory for results")
     parser.add_argument("--no-fasta", action="store_true", help="Skip writing filtered_assembly.fasta output file")
+    parser.add_argument("--bgzip-output", action="store_true", help="Write filtered_assembly.fasta.gz (BGZF, compressed in parallel) with .fai and .gzi indexes")
     
     # Configurable
     parser.add_argument("--min-mq", type=int, default=20, help="Mapping Quality threshold")
@@ -51,6 +58,9 @@ def main():
     parser.add_argument("--distance-threshold", type=float, help="Mash distance threshold (Overrides estimator if supplied)")
     parser.add_argument("--busco-bonus-factor", type=float, default=0.0, help="BUSCO density bonus factor for scoring (0.0 = disabled, 0.01-0.02 = conservative, 0.05 = moderate, 0.10 = aggressive)")
     parser.add_argument("--threads", type=int, default=max(1, multiprocessing.cpu_count() - 1), help="Number of CPU cores for parallel processing")
+    parser.add_argument("--mash-two-pass", action="store_true", help="Read the Mash file twice, keeping only overlapping pairs and pairs under the threshold (lower memory)")
+    parser.add_argument("--sketch-kmer", type=int, default=21, help="K-mer size for --sketch-from-fasta (at most 32)")
+    parser.add_argument("--sketch-size", type=int, default=1000, help="Hashes per contig for --sketch-from-fasta")
     parser.add_argument("--max-tournament-iterations", type=int, default=100000, help="Maximum iterations for tournament loop")
 
     args = parser.parse_args()
@@ -59,99 +69,107 @@ def main():
     log_queue, log_listener = setup_logging(output_dir)
     
     logger = logging.getLogger(__name__)
+    shared_dir = None
     try:
         logger.info("Starting FilterHaplotypes pipeline...")
 
         # Phase 1: Pre-processing
         logger.info("Phase 1: Parsing and filtering PAF...")
-        paf_df = parse_paf(args.paf, args.min_mq)
+        paf_df = parse_paf(args.paf, args.min_mq, threads=args.threads)
         primary_paf_df = get_primary_targets(paf_df)
         
         # Phase 2: Initialization
         logger.info("Phase 2: Initializing ContigSummary objects...")
-        # GC calculation is parallelized inside parse_fasta
-        fasta_data = parse_fasta(args.fasta, args.threads)
-        busco_map = parse_busco(args.busco) if args.busco else {}
+        # GC calculation is parallelized inside scan_fasta, which also indexes the FASTA for Phase 7
+        fasta_data, fasta_index = scan_fasta(args.fasta, args.threads)
+        # The BUSCO table is parsed once; completeness is then tracked as contig statuses change
+        busco_table = BuscoTable.load(args.busco) if args.busco else None
+        busco_map = busco_table.gene_map() if busco_table is not None else {}
         
-        summary_list = []
-        query_to_summary = {}
-        for q_id, (gc, length) in fasta_data.items():
-            cs = ContigSummary(
-                query_id=q_id,
-                query_length=length,
-                gc_content=gc,
-                busco_genes=busco_map.get(q_id, set())
-            )
-            summary_list.append(cs)
-            query_to_summary[q_id] = cs
+        # Contig summaries are stored column-wise; summary_list holds lightweight views of its rows
+        contigs = ContigStore(
+            fasta_data.keys(),
+            (length for _, length in fasta_data.values()),
+            (gc for gc, _ in fasta_data.values()),
+            busco_map
+        )
+        summary_list = list(contigs)
             
         # Mark aligned contigs
-        aligned_query_ids = primary_paf_df['query_id'].unique()
-        for q_id in aligned_query_ids:
-            if q_id in query_to_summary:
-                summary = query_to_summary[q_id]
-                summary.status = Status.ALIGNED_RETAINED
-                # primary_target_id
-                target_id = primary_paf_df[primary_paf_df['query_id'] == q_id]['target_id'].iloc[0]
-                summary.target_id = target_id
+        primary_targets = {q_id: target_id for q_id, target_id in primary_target_map(primary_paf_df).items() if q_id in contigs}
+        aligned_rows = contigs.rows(primary_targets)
+        contigs.status[aligned_rows] = STATUS_CODES[Status.ALIGNED_RETAINED]
+        contigs.target_id[aligned_rows] = list(primary_targets.values())
+
+        retained_statuses = (Status.ALIGNED_RETAINED, Status.UNALIGNED_RETAINED)
+        busco_tracker = BuscoCompleteness(busco_table, contigs.query_ids) if busco_table is not None else None
+        busco_initial = busco_tracker.record("Initial") if busco_tracker is not None else {}
         
         # GC filtering: Calculate median GC% of contigs in 90th percentile for length
         logger.info("Phase 2: Applying GC content filter...")
         import numpy as np
         
         # Calculate 90th percentile threshold for contig length
-        all_lengths = [c.query_length for c in summary_list]
-        length_p90 = np.percentile(all_lengths, 90)
+        length_p90 = np.percentile(contigs.query_length, 90)
         
-        # Get contigs in the 90th percentile
-        contigs_p90 = [c for c in summary_list if c.query_length >= length_p90]
-        
-        # Calculate median GC% of those contigs
-        gc_values_p90 = [c.gc_content for c in contigs_p90]
-        median_gc = np.median(gc_values_p90)
+        # Calculate median GC% of the contigs in the 90th percentile
+        median_gc = np.median(contigs.gc_content[contigs.query_length >= length_p90])
         
         logger.info(f"90th percentile length threshold: {length_p90:.2f} bp")
         logger.info(f"Median GC% of contigs in 90th percentile: {median_gc:.2f}%")
         
         # Filter contigs with GC% deviation > 5 percentage points
-        gc_filtered_count = 0
-        for c in summary_list:
-            if c.status in [Status.ALIGNED_RETAINED, Status.UNALIGNED_RETAINED]:
-                gc_deviation = abs(c.gc_content - median_gc)
-                if gc_deviation > 5.0:
-                    # Update status to discarded
-                    if c.status == Status.ALIGNED_RETAINED:
-                        c.status = Status.ALIGNED_DISCARDED
-                    else:
-                        c.status = Status.UNALIGNED_DISCARDED
-                    c.discarded_reason["GC"] = True
-                    gc_filtered_count += 1
+        gc_outliers = contigs.status_mask(*retained_statuses) & (np.abs(contigs.gc_content - median_gc) > 5.0)
+        for status, discarded_status in ((Status.ALIGNED_RETAINED, Status.ALIGNED_DISCARDED), (Status.UNALIGNED_RETAINED, Status.UNALIGNED_DISCARDED)):
+            contigs.status[contigs.status_mask(status) & gc_outliers] = STATUS_CODES[discarded_status]
+        gc_filtered_rows = np.flatnonzero(gc_outliers)
+        contigs.discarded_flags[gc_filtered_rows] |= DISCARDED_BITS["GC"]
+        gc_filtered_count = len(gc_filtered_rows)
+        if busco_tracker is not None:
+            for row in gc_filtered_rows.tolist():
+                busco_tracker.set_retained(contigs.query_ids[row], False)
         
         logger.info(f"Contigs filtered due to GC deviation: {gc_filtered_count}")
+        if busco_tracker is not None:
+            busco_tracker.record("Phase 2: GC filter")
 
         # Phase 3: Alignment Filtering and Scoring
         logger.info("Phase 3: Tiling and scoring alignments...")
         calculate_initial_redundancy(summary_list, primary_paf_df)
         
-        # Parallelize Tiling
-        query_groups = [group for _, group in primary_paf_df.groupby('query_id')]
-        with multiprocessing.Pool(args.threads, initializer=worker_configurer, initargs=(log_queue,)) as pool:
-            tiling_results = pool.starmap(tile_and_score_contig, [(group, args.min_overlap) for group in query_groups])
-        
-        for q_id, intervals, score, max_as, tiled_out in tiling_results:
-            if q_id in query_to_summary:
-                cs = query_to_summary[q_id]
-                cs.intervals = intervals
-                cs.sum_normalized_score = score
-                cs.max_alignment_score = max_as
-                cs.tiled_out_count = tiled_out
+        tiling_results = tile_and_score_alignments(primary_paf_df, args.min_overlap, args.threads)
+
+        tiling_results = [result for result in tiling_results if result[0] in contigs]
+        if tiling_results:
+            q_ids, intervals, scores, max_scores, tiled_out = zip(*tiling_results)
+            tiled_rows = contigs.rows(q_ids)
+            contigs.set_intervals(tiled_rows, intervals)
+            contigs.sum_normalized_score[tiled_rows] = scores
+            contigs.max_alignment_score[tiled_rows] = max_scores
+            contigs.tiled_out_count[tiled_rows] = tiled_out
 
         # Phase 4: Mash Distance Threshold Calculation
         logger.info("Phase 4: Calculating Mash distance threshold...")
-        mash_df = parse_mash(args.mash)
-        mash_lookup = build_mash_lookup(mash_df)
-        
         overlapping_pairs = get_overlapping_pairs(summary_list, args.min_overlap)
+        sketches = None
+        if args.sketch_from_fasta:
+            sketches = sketch_fasta(args.fasta, args.sketch_kmer, args.sketch_size, args.threads)
+            # Saved for reuse with --mash-sketch
+            sketches.save(output_dir / 'contig_sketches.npz')
+        elif args.mash_sketch:
+            sketches = parse_mash_sketch(args.mash_sketch)
+        
+        if sketches is not None:
+            # Distances are computed from the sketches for queried pairs only, starting with overlapping pairs
+            mash_lookup = sketch_distance_lookup(sketches, overlapping_pairs, threads=args.threads)
+        elif args.mash_two_pass:
+            # Pass 1: only overlapping pairs are needed, unless the threshold is already known
+            mash_lookup = stream_mash_lookup(
+                args.mash, args.threads, max_distance=args.distance_threshold, keep_pairs=overlapping_pairs
+            )
+        else:
+            mash_lookup = stream_mash_lookup(args.mash, args.threads)
+        
         overlap_distances = []
         for id1, id2 in overlapping_pairs:
             dist = get_mash_distance(mash_lookup, id1, id2)
@@ -167,32 +185,51 @@ def main():
             dist_threshold, method = estimate_distance_threshold(overlap_distances)
             
         logger.info(f"Final distance threshold: {dist_threshold:.4f} (Method: {method})")
+        
+        if sketches is not None and not args.aligned_only:
+            # Phase 6 candidates: unaligned contigs against every contig they can be screened against,
+            # restricted to pairs sharing at least one sketch hash
+            unaligned_ids = [c.query_id for c in summary_list if c.status == Status.UNALIGNED_RETAINED]
+            screen_ids = [c.query_id for c in summary_list if c.status in (Status.ALIGNED_RETAINED, Status.UNALIGNED_RETAINED)]
+            candidates = find_candidate_pairs(sketches, unaligned_ids, screen_ids)
+            mash_lookup = sketch_distance_lookup(
+                sketches, overlapping_pairs, candidates, max_distance=dist_threshold, threads=args.threads
+            )
+        elif args.mash_two_pass and args.distance_threshold is None:
+            # Pass 2: overlapping pairs (tournament) plus every pair under the threshold (redundancy screening)
+            logger.info("Re-reading Mash distances under the final threshold...")
+            mash_lookup = stream_mash_lookup(
+                args.mash, args.threads, max_distance=dist_threshold, keep_pairs=overlapping_pairs
+            )
+        
+        # Workers memory-map the distance matrix instead of receiving a pickled copy per task
+        shared_dir = Path(tempfile.mkdtemp(prefix='.shared_', dir=output_dir))
+        mash_lookup.save(shared_dir / 'mash')
 
         # Phase 5: Redundancy Resolution (Iterative Tournament)
         logger.info("Phase 5: Running iterative tournament...")
-        # Group by target_id
+        # Group rows by target_id
         target_groups = {}
-        for c in summary_list:
-            if c.status == Status.ALIGNED_RETAINED:
-                if c.target_id not in target_groups:
-                    target_groups[c.target_id] = []
-                target_groups[c.target_id].append(c)
+        for row in np.flatnonzero(contigs.status_mask(Status.ALIGNED_RETAINED)).tolist():
+            target_groups.setdefault(contigs.target_id[row], []).append(row)
+        
+        # BUSCO carriers are indexed once and shipped to each worker once, not with every task
+        busco_index = BuscoCarrierIndex(summary_list)
         
-        # Parallelize by target group
-        target_items = list(target_groups.values())
-        with multiprocessing.Pool(args.threads, initializer=worker_configurer, initargs=(log_queue,)) as pool:
-            tournament_results = pool.starmap(run_tournament_on_target, [
-                (group, mash_lookup, dist_threshold, args.min_overlap, args.min_size_safeguard, args.max_tournament_iterations, args.busco_bonus_factor, summary_list)
-                for group in target_items
+        # Parallelize by target group; each task receives and returns a columnar subset of the store
+        with multiprocessing.Pool(args.threads, initializer=init_worker, initargs=(log_queue, shared_dir / 'mash', None, busco_index)) as pool:
+            tournament_results = pool.starmap(tournament_task, [
+                (contigs.take(rows), dist_threshold, args.min_overlap, args.min_size_safeguard, args.max_tournament_iterations, args.busco_bonus_factor)
+                for rows in target_groups.values()
             ])
         
         for group in tournament_results:
-            for updated_cs in group:
-                original = query_to_summary[updated_cs.query_id]
-                original.status = updated_cs.status
-                original.disqualifier = updated_cs.disqualifier
-                original.discarded_reason = updated_cs.discarded_reason
-                original.retained_reason = updated_cs.retained_reason
+            rows = contigs.update_from(group, ('status', 'disqualifier', 'discarded_flags', 'retained_flags'))
+            if busco_tracker is not None:
+                for row in rows.tolist():
+                    busco_tracker.set_retained(contigs.query_ids[row], summary_list[row].status in retained_statuses)
+        if busco_tracker is not None:
+            busco_tracker.record("Phase 5: Tournament")
 
         # Phase 6: Unaligned Contig Handling
         unaligned = [c for c in summary_list if c.status == Status.UNALIGNED_RETAINED]
@@ -202,46 +239,47 @@ def main():
             # Mark all unaligned contigs as UNALIGNED_DISCARDED
             for u in unaligned:
                 u.status = Status.UNALIGNED_DISCARDED
+                if busco_tracker is not None:
+                    busco_tracker.set_retained(u.query_id, False)
             
             num_unaligned_total = len(unaligned)
             logger.info(f"Unaligned contigs discarded: {num_unaligned_total} (100.00%)")
         else:
             logger.info("Phase 6: Screening unaligned contigs...")
             # Sort by length descending as requested
-            unaligned.sort(key=lambda x: x.query_length, reverse=True)
+            unaligned_rows = np.flatnonzero(contigs.status_mask(Status.UNALIGNED_RETAINED))
+            unaligned_rows = unaligned_rows[np.argsort(-contigs.query_length[unaligned_rows], kind='stable')]
             
-            retained_so_far = [c for c in summary_list if c.status == Status.ALIGNED_RETAINED]
+            current_retained = contigs.take(np.flatnonzero(contigs.status_mask(Status.ALIGNED_RETAINED)))
             
-            current_retained = list(retained_so_far)
-            
-            with multiprocessing.Pool(args.threads, initializer=worker_configurer, initargs=(log_queue,)) as pool:
-                screened_unaligned = pool.starmap(screen_unaligned_contig, [
-                    (u, current_retained, mash_lookup, dist_threshold) for u in unaligned
+            # Unaligned contigs are screened in chunks, each shipped as a columnar subset of the store
+            with multiprocessing.Pool(args.threads, initializer=init_worker, initargs=(log_queue, shared_dir / 'mash', current_retained)) as pool:
+                screened_chunks = pool.starmap(screen_unaligned_task, [
+                    (chunk, dist_threshold) for chunk in contigs.take(unaligned_rows).chunks(4 * args.threads)
                 ])
+            screened_unaligned = [u for chunk in screened_chunks for u in chunk]
             
             # Now update summary_list and handle U-U redundancy for those still RETAINED
             unaligned_retained_after_aligned_check = [u for u in screened_unaligned if u.status == Status.UNALIGNED_RETAINED]
             
             final_unaligned_retained = []
             for u in unaligned_retained_after_aligned_check:
-                is_redundant = False
-                for r in final_unaligned_retained:
-                    dist = get_mash_distance(mash_lookup, u.query_id, r.query_id)
-                    if dist is not None and dist < dist_threshold:
-                        u.status = Status.UNALIGNED_DISCARDED
-                        u.disqualifier = r.query_id
-                        u.discarded_reason["Mash_Redundancy"] = True
-                        is_redundant = True
-                        break
-                if not is_redundant:
+                close_ids = get_close_neighbors(mash_lookup, u.query_id, dist_threshold)
+                # The first retained unaligned contig under the threshold disqualifies u
+                disqualifier = next((r for r in final_unaligned_retained if r.query_id in close_ids), None) if close_ids else None
+                if disqualifier is not None:
+                    u.status = Status.UNALIGNED_DISCARDED
+                    u.disqualifier = disqualifier.query_id
+                    u.discarded_reason["Mash_Redundancy"] = True
+                else:
                     final_unaligned_retained.append(u)
                     
-            # Update the summary list with results from Phase 6
-            for u in screened_unaligned:
-                original = query_to_summary[u.query_id]
-                original.status = u.status
-                original.disqualifier = u.disqualifier
-                original.discarded_reason = u.discarded_reason
+            # Update the store with results from Phase 6
+            for chunk in screened_chunks:
+                rows = contigs.update_from(chunk, ('status', 'disqualifier', 'discarded_flags'))
+                if busco_tracker is not None:
+                    for row in rows.tolist():
+                        busco_tracker.set_retained(contigs.query_ids[row], summary_list[row].status in retained_statuses)
 
             num_unaligned_total = len(unaligned)
             num_unaligned_retained = len(final_unaligned_retained)
@@ -250,18 +288,20 @@ def main():
                 logger.info(f"Unaligned contigs retained: {num_unaligned_retained} ({perc_unaligned_retained:.2f}%)")
                 logger.info(f"Unaligned contigs discarded: {num_unaligned_total - num_unaligned_retained} ({100 - perc_unaligned_retained:.2f}%)")
 
+        if busco_tracker is not None:
+            busco_tracker.record("Phase 6: Unaligned screening")
+
         # Phase 7: Reporting
         logger.info("Phase 7: Generating reports...")
         stats_initial = calculate_assembly_stats([c.query_length for c in summary_list])
-        busco_initial = get_busco_counts(args.busco, set(query_to_summary.keys())) if args.busco else {}
         
-        retained_ids = {c.query_id for c in summary_list if c.status in [Status.ALIGNED_RETAINED, Status.UNALIGNED_RETAINED]}
-        busco_filtered = get_busco_counts(args.busco, retained_ids) if args.busco else {}
+        retained_ids = {c.query_id for c in summary_list if c.status in retained_statuses}
+        busco_filtered = busco_tracker.counts() if busco_tracker is not None else {}
         
         # Collect run parameters for the report
         run_parameters = {
             'PAF File': args.paf,
-            'Mash File': args.mash,
+            'Mash File': args.mash or (f"{args.mash_sketch} (sketch)" if args.mash_sketch else "Sketched from FASTA"),
             'FASTA File': args.fasta,
             'BUSCO File': args.busco if args.busco else 'Not provided',
             'Output Directory': str(output_dir),
@@ -276,7 +316,7 @@ def main():
         }
         
         generate_report(
-            summary_list,
+            contigs,
             overlap_distances,
             dist_threshold,
             stats_initial,
@@ -284,11 +324,13 @@ def main():
             busco_filtered,
             output_dir,
             args.threads,
-            run_parameters
+            run_parameters,
+            busco_tracker.phases if busco_tracker is not None else []
         )
         
         if not args.no_fasta:
-            write_filtered_fasta(Path(args.fasta), output_dir / 'filtered_assembly.fasta', retained_ids)
+            fasta_name = 'filtered_assembly.fasta.gz' if args.bgzip_output else 'filtered_assembly.fasta'
+            write_filtered_fasta(Path(args.fasta), output_dir / fasta_name, retained_ids, args.threads, fasta_index, args.bgzip_output)
             logger.info(f"Pipeline complete. Results saved in {output_dir}")
         else:
             logger.info(f"Pipeline complete. Results saved in {output_dir} (filtered_assembly.fasta skipped)")
@@ -296,6 +338,8 @@ def main():
         logger.error(f"Critical failure: {e}")
         sys.exit(1)
     finally:
+        if shared_dir is not None:
+            shutil.rmtree(shared_dir, ignore_errors=True)
         log_listener.stop()
 
 if __name__ == "__main__":
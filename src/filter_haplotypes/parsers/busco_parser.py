@@ -1,14 +1,166 @@
 """
 BUSCO table parser for FilterHaplotypes.
 Handles reading full_table.tsv and assessing assembly completeness.
+The table is parsed once into a BuscoTable with categorical columns; completeness counts
+are vectorized over the integer codes of its complete (Complete or Duplicated) records,
+and BuscoCompleteness keeps them up to date as contigs are retained or discarded.
 """
 
+import numpy as np
 import pandas as pd
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Set, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Standard BUSCO columns used here: 0: Busco id, 1: Status, 2: Sequence
+BUSCO_COLUMNS = ['busco_id', 'status', 'sequence']
+COMPLETE_STATUSES = ['Complete', 'Duplicated']
+
+class BuscoTable:
+    """
+    A parsed BUSCO full_table.tsv: one row per record with categorical busco_id, status and
+    sequence columns. The BUSCO and sequence codes of the complete records are precomputed.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.astype({column: 'category' for column in BUSCO_COLUMNS})
+        complete = self.df['status'].isin(COMPLETE_STATUSES).to_numpy() & self.df['sequence'].notna().to_numpy()
+        self.busco_ids = self.df['busco_id'].cat.categories
+        self.sequences = self.df['sequence'].cat.categories
+        self.complete_busco_codes = self.df['busco_id'].cat.codes.to_numpy()[complete]
+        self.complete_sequence_codes = self.df['sequence'].cat.codes.to_numpy()[complete]
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @classmethod
+    def load(cls, busco_path: str) -> "BuscoTable":
+        """
+        Read a BUSCO full_table.tsv. Unreadable or empty files give an empty table.
+
+        :param busco_path: Path to the BUSCO table.
+        :return: A BuscoTable.
+        """
+        try:
+            # BUSCO table often has many comment lines starting with #; rows have varying numbers
+            # of fields (Missing rows stop after the status), so only the first three are read
+            df = pd.read_csv(
+                busco_path, sep='\t', comment='#', header=None, names=BUSCO_COLUMNS,
+                usecols=range(len(BUSCO_COLUMNS)), dtype=str, encoding='utf-8'
+            )
+        except Exception as e:
+            logger.error(f"Failed to read BUSCO file {busco_path}: {e}")
+            df = pd.DataFrame(columns=BUSCO_COLUMNS, dtype=str)
+
+        if df.empty:
+            logger.warning(f"BUSCO file {busco_path} is empty or only contains comments.")
+        return cls(df)
+
+    def gene_map(self) -> Dict[str, Set[str]]:
+        """
+        :return: A dictionary mapping sequence/contig ID to a set of complete BUSCO IDs.
+        """
+        busco_map: Dict[str, Set[str]] = {}
+        for sequence_code, busco_code in zip(self.complete_sequence_codes, self.complete_busco_codes):
+            busco_map.setdefault(self.sequences[sequence_code], set()).add(self.busco_ids[busco_code])
+        return busco_map
+
+    def counts(self, retained_contigs: Iterable[str]) -> Dict[str, int]:
+        """
+        Calculate BUSCO completeness for a set of retained contigs.
+        A BUSCO is 'Complete' if it's found once and 'Duplicated' if it's found more than once
+        across the complete records of the retained contigs.
+
+        :param retained_contigs: Retained contig IDs.
+        :return: Dictionary with 'complete_single' and 'duplicated' counts.
+        """
+        retained = self.sequences.isin(list(retained_contigs))
+        occurrences = np.bincount(
+            self.complete_busco_codes[retained[self.complete_sequence_codes]],
+            minlength=len(self.busco_ids)
+        )
+        complete_single = int((occurrences == 1).sum())
+        duplicated = int((occurrences > 1).sum())
+        return {
+            'complete_single': complete_single,
+            'duplicated': duplicated,
+            'missing': len(self.busco_ids) - complete_single - duplicated
+        }
+
+class BuscoCompleteness:
+    """
+    Live BUSCO completeness of the retained contigs. A per-BUSCO carrier count array (complete
+    records on retained contigs) and the single/duplicated totals are updated in O(|genes|)
+    whenever a contig is retained or discarded. 'missing' covers every BUSCO of the table
+    without a complete record on a retained contig (missing or fragmented).
+    """
+
+    def __init__(self, table: BuscoTable, retained_contigs: Iterable[str] = ()):
+        self.total = len(table.busco_ids)
+        self.carriers = np.zeros(self.total, dtype=np.int32)
+        self.complete_single = 0
+        self.duplicated = 0
+        # (phase, counts) snapshots taken by record
+        self.phases: List[Tuple[str, Dict[str, int]]] = []
+
+        # BUSCO codes of the complete records of each sequence
+        order = np.argsort(table.complete_sequence_codes, kind='stable')
+        sequence_codes = table.complete_sequence_codes[order]
+        busco_codes = table.complete_busco_codes[order]
+        bounds = np.searchsorted(sequence_codes, np.arange(len(table.sequences) + 1))
+        self._genes: Dict[str, List[int]] = {
+            table.sequences[i]: busco_codes[bounds[i]:bounds[i + 1]].tolist()
+            for i in np.flatnonzero(np.diff(bounds))
+        }
+        self._retained: Set[str] = set()
+        for query_id in retained_contigs:
+            self.set_retained(query_id, True)
+
+    def set_retained(self, query_id: str, retained: bool):
+        """
+        Record that a contig is (no longer) retained.
+        """
+        if retained == (query_id in self._retained):
+            return
+        if retained:
+            self._retained.add(query_id)
+        else:
+            self._retained.discard(query_id)
+
+        step = 1 if retained else -1
+        for code in self._genes.get(query_id, ()):
+            before = int(self.carriers[code])
+            after = before + step
+            self.carriers[code] = after
+            self.complete_single += (after == 1) - (before == 1)
+            self.duplicated += (after > 1) - (before > 1)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        :return: Dictionary with 'complete_single', 'duplicated' and 'missing' counts.
+        """
+        return {
+            'complete_single': self.complete_single,
+            'duplicated': self.duplicated,
+            'missing': self.total - self.complete_single - self.duplicated
+        }
+
+    def record(self, phase: str) -> Dict[str, int]:
+        """
+        Log the current completeness and keep it as the snapshot of a phase.
+
+        :param phase: Phase label shown in the log and the report.
+        :return: The current counts.
+        """
+        counts = self.counts()
+        self.phases.append((phase, counts))
+        logger.info(
+            f"BUSCO completeness ({phase}): {counts['complete_single']} single, "
+            f"{counts['duplicated']} duplicated, {counts['missing']} missing of {self.total}"
+        )
+        return counts
+
 def parse_busco(busco_path: str) -> Dict[str, Set[str]]:
     """
     Parse a BUSCO full_table.tsv file and extract complete BUSCO IDs for each contig.
@@ -16,62 +168,15 @@ def parse_busco(busco_path: str) -> Dict[str, Set[str]]:
     :param busco_path: Path to the BUSCO table.
     :return: A dictionary mapping sequence/contig ID to a set of complete BUSCO IDs.
     """
-    try:
-        # BUSCO table often has many comment lines starting with #
-        df = pd.read_csv(busco_path, sep='\t', comment='#', header=None, encoding='utf-8')
-    except Exception as e:
-        logger.error(f"Failed to read BUSCO file {busco_path}: {e}")
-        return {}
-
-    if df.empty:
-        logger.warning(f"BUSCO file {busco_path} is empty or only contains comments.")
-        return {}
-
-    # Map standard BUSCO columns
-    # 0: Busco id, 1: Status, 2: Sequence
-    columns = {0: 'busco_id', 1: 'status', 2: 'sequence'}
-    df = df.rename(columns=columns)
-    
-    # Filter for 'Complete' or 'Duplicated'
-    complete_statuses = ['Complete', 'Duplicated']
-    df_complete = df[df['status'].isin(complete_statuses)]
-    
-    # Group by sequence and collect busco_ids
-    busco_map = df_complete.groupby('sequence')['busco_id'].apply(set).to_dict()
-    
-    return busco_map
+    return BuscoTable.load(busco_path).gene_map()
 
 def get_busco_counts(busco_path: str, retained_contigs: Set[str]) -> Dict[str, int]:
     """
     Calculate BUSCO completeness for a set of retained contigs.
+    Reads the table on every call; use BuscoTable.counts to reuse a parsed table.
 
     :param busco_path: Path to the BUSCO table.
     :param retained_contigs: Set of retained contig IDs.
     :return: Dictionary with 'complete_single' and 'duplicated' counts.
     """
-    try:
-        df = pd.read_csv(busco_path, sep='\t', comment='#', header=None, encoding='utf-8')
-    except Exception as e:
-        logger.error(f"Failed to read BUSCO file {busco_path}: {e}")
-        return {'complete_single': 0, 'duplicated': 0}
-
-    # 0: Busco id, 1: Status, 2: Sequence
-    df = df.rename(columns={0: 'busco_id', 1: 'status', 2: 'sequence'})
-    
-    # Filter for complete/duplicated genes found in retained contigs
-    df_retained = df[df['sequence'].isin(retained_contigs)]
-    
-    # BUSCO logic: 
-    # A gene is 'Complete' if it's found at least once.
-    # It's 'Duplicated' if it's found more than once across all retained contigs.
-    
-    # Count occurrences of each BUSCO ID in retained contigs
-    counts = df_retained[df_retained['status'].isin(['Complete', 'Duplicated'])]['busco_id'].value_counts()
-    
-    complete_single = (counts == 1).sum()
-    duplicated = (counts > 1).sum()
-    
-    return {
-        'complete_single': int(complete_single),
-        'duplicated': int(duplicated)
-    }
+    return BuscoTable.load(busco_path).counts(retained_contigs)
@@ -1,34 +1,526 @@
 """
 FASTA file parser for FilterHaplotypes.
 Handles sequence reading and parallel GC content calculation.
+GC content and length are computed by streaming the file in large byte blocks and
+counting byte classes with NumPy, in parallel over byte ranges of uncompressed files.
+The same pass builds a faidx-compatible index used for memory-mapped random access.
 """
 
-from Bio import SeqIO
-from Bio.SeqUtils import gc_fraction
+import logging
+import mmap
+import os
 import multiprocessing
-from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
+from src.filter_haplotypes.utils.file_io import open_input, detect_compression
 
-def calculate_gc(sequence_record) -> Tuple[str, float, int]:
+logger = logging.getLogger(__name__)
+
+FASTA_BLOCK_SIZE = 1 << 23
+
+# Per-byte contributions to (G/C/S count, gc_fraction denominator, sequence length), matching
+# Bio.SeqUtils.gc_fraction(ambiguous="remove"); whitespace is not part of the sequence
+BYTE_COUNTS = np.zeros((256, 3), dtype=np.int64)
+BYTE_COUNTS[:, 2] = 1
+BYTE_COUNTS[list(b' \t\n\r\x0b\x0c'), 2] = 0
+BYTE_COUNTS[list(b'ATWUatwu'), 1] = 1
+BYTE_COUNTS[list(b'CGScgs'), 0:2] = 1
+
+class _RecordCounts:
+    """
+    Running counts of one FASTA record, plus its faidx line layout when indexing.
+    """
+    __slots__ = ('query_id', 'gc', 'valid', 'length', 'offset', 'line_bases', 'line_width', 'newlines', 'last_newline', 'short_line', 'regular')
+
+    def __init__(self, query_id: str, offset: int):
+        self.query_id = query_id
+        self.gc = self.valid = self.length = 0
+        self.offset = offset
+        self.line_bases: Optional[int] = None
+        self.line_width: Optional[int] = None
+        self.newlines = 0
+        self.last_newline = offset - 1
+        self.short_line = False
+        self.regular = True
+
+    def count(self, segment: np.ndarray):
+        if len(segment):
+            gc, valid, length = np.bincount(segment, minlength=256) @ BYTE_COUNTS
+            self.gc += int(gc)
+            self.valid += int(valid)
+            self.length += int(length)
+
+    def check_lines(self, newlines: np.ndarray):
+        """
+        Check that every line except the last has the width of the first one
+        (the width of the last line is checked by finish).
+
+        :param newlines: Absolute offsets of the record's newline bytes, in order.
+        """
+        if self.short_line:
+            self.regular = False
+        misaligned = np.flatnonzero((newlines - self.offset + 1) % self.line_width)
+        if len(misaligned) > 1 or (len(misaligned) == 1 and misaligned[0] != len(newlines) - 1):
+            self.regular = False
+        self.short_line = self.short_line or len(misaligned) > 0
+        self.newlines += len(newlines)
+        self.last_newline = int(newlines[-1])
+
+    def finish(self, end: int) -> tuple:
+        """
+        :param end: Absolute offset just past the record's sequence.
+        :return: (query_id, gc_count, gc_denominator, length, offset, line_bases, line_width, regular).
+        """
+        self.offset = min(self.offset, end)
+        if self.line_width is None:
+            # Single unterminated line (or no sequence at all)
+            self.line_bases, self.line_width = self.length, self.length + 1
+        # The last line may be shorter than the others but not longer
+        tail = end - self.last_newline - 1
+        if tail:
+            regular = self.regular and not self.short_line and tail <= self.line_bases
+        else:
+            regular = self.regular and self.last_newline - self.offset < self.newlines * self.line_width
+        # Whitespace other than the line terminators means faidx cannot address the record
+        terminator = self.line_width - self.line_bases
+        regular = regular and self.length == (end - self.offset) - self.newlines * terminator
+        return (self.query_id, self.gc, self.valid, self.length, self.offset, self.line_bases, self.line_width, regular)
+
+class _FastaCounter:
+    """
+    Accumulates per-record GC and length counts over consecutive blocks of a FASTA stream,
+    optionally recording the faidx layout (offset, line bases, line width) of every record.
+    Header lines must not be split across blocks; sequence lines may be.
+    Text before the first header is ignored.
+    """
+
+    def __init__(self, build_index: bool = False):
+        self.build_index = build_index
+        self.records: List[tuple] = []
+        self._current: Optional[_RecordCounts] = None
+
+    def feed(self, block: bytes, at_line_start: bool, block_offset: int = 0):
+        """
+        Count one block.
+
+        :param block: Raw bytes; every header line in it must be complete.
+        :param at_line_start: Whether the block starts at the beginning of a line.
+        :param block_offset: Absolute file offset of the block.
+        """
+        data = np.frombuffer(block, dtype=np.uint8)
+        segment_start = 0
+        header = 0 if at_line_start and block.startswith(b'>') else _next_header(block, 0)
+        while header >= 0:
+            self._add(data, segment_start, header, block_offset)
+            header_end = block.find(b'\n', header)
+            self._finish_record(block_offset + header)
+            self._current = _RecordCounts(_header_id(block[header + 1:header_end]), block_offset + header_end + 1)
+            segment_start = header_end + 1
+            header = _next_header(block, header_end)
+        self._add(data, segment_start, len(data), block_offset)
+
+    def _add(self, data: np.ndarray, start: int, end: int, block_offset: int):
+        record = self._current
+        if record is None or start == end:
+            return
+        if not self.build_index:
+            record.count(data[start:end])
+            return
+
+        newlines = np.flatnonzero(data[start:end] == ord('\n')) + start
+        if len(newlines) and record.line_width is None:
+            # The first line fixes the layout every other line (except the last) must follow
+            first = newlines[0]
+            record.count(data[start:first])
+            record.line_bases = record.length
+            record.line_width = block_offset + first + 1 - record.offset
+            start = first
+        record.count(data[start:end])
+        if len(newlines):
+            record.check_lines(newlines + block_offset)
+
+    def _finish_record(self, end: int):
+        if self._current is not None:
+            self.records.append(self._current.finish(end))
+            self._current = None
+
+    def finish(self, end: int) -> List[tuple]:
+        """
+        :param end: Absolute offset of the end of the stream.
+        :return: List of (query_id, gc_count, gc_denominator, length, offset, line_bases, line_width, regular)
+                 in file order.
+        """
+        self._finish_record(end)
+        return self.records
+
+def _next_header(block: bytes, start: int) -> int:
+    """
+    Offset of the first header line starting after position start, or -1.
+    """
+    found = block.find(b'\n>', start)
+    return found + 1 if found >= 0 else -1
+
+def _header_id(header_line: bytes) -> str:
+    """
+    Record ID of a header line (without '>'): its first whitespace-delimited word, as in Biopython.
+    """
+    fields = header_line.split(None, 1)
+    return fields[0].decode('utf-8') if fields else ''
+
+def _split_unfinished_header(block: bytes, at_line_start: bool) -> Tuple[bytes, bytes]:
+    """
+    Split off an unfinished header line at the end of a block; unfinished sequence lines stay in the block.
+
+    :return: (block, unfinished header or b'').
+    """
+    tail = block.rfind(b'\n') + 1
+    if tail < len(block) and block[tail] == ord('>') and (tail > 0 or at_line_start):
+        return block[:tail], block[tail:]
+    return block, b''
+
+def _iter_blocks(handle: BinaryIO, limit: Optional[int] = None) -> Iterator[Tuple[bytes, bool]]:
+    """
+    Read a FASTA stream in blocks of about FASTA_BLOCK_SIZE bytes that never split a header line.
+
+    :param handle: Binary stream.
+    :param limit: Maximum number of bytes to read.
+    :return: An iterator of (block, whether the block starts at the beginning of a line).
+             A header left unterminated at the end of the stream is completed with a newline.
+    """
+    pending = b''
+    at_line_start = True
+    remaining = limit
+    while remaining is None or remaining > 0:
+        chunk = handle.read(FASTA_BLOCK_SIZE if remaining is None else min(FASTA_BLOCK_SIZE, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        # An unfinished header line is carried into the next block
+        block, pending = _split_unfinished_header(pending + chunk, at_line_start)
+        if block:
+            yield block, at_line_start
+            at_line_start = block.endswith(b'\n')
+    if pending:
+        yield pending + b'\n', at_line_start
+
+def _count_stream(handle: BinaryIO, limit: Optional[int] = None, offset: int = 0, build_index: bool = False) -> List[tuple]:
+    """
+    Count GC and length of the records in a binary stream, reading at most limit bytes.
+
+    :param offset: Absolute file offset of the stream position (for the index).
+    """
+    counter = _FastaCounter(build_index)
+    for block, at_line_start in _iter_blocks(handle, limit):
+        counter.feed(block, at_line_start, offset)
+        offset += len(block)
+    # The stream position excludes the newline added after an unterminated final header
+    return counter.finish(handle.tell() if build_index else offset)
+
+def _count_range(fasta_path: str, start: int, end: int, build_index: bool = False) -> List[tuple]:
+    """
+    Pool task: count the records of an uncompressed FASTA between two record boundaries.
+    """
+    with open(fasta_path, 'rb') as handle:
+        handle.seek(start)
+        return _count_stream(handle, end - start, start, build_index)
+
+def _record_boundaries(fasta_path: str, num_ranges: int) -> List[int]:
+    """
+    Split an uncompressed FASTA into up to num_ranges byte ranges starting at record headers.
+
+    :return: Sorted offsets [0, ..., file_size] delimiting the ranges.
+    """
+    file_size = os.path.getsize(fasta_path)
+    boundaries = [0]
+    with open(fasta_path, 'rb') as handle:
+        for i in range(1, num_ranges):
+            offset = max(file_size * i // num_ranges, boundaries[-1])
+            handle.seek(max(offset - 1, 0))
+            position = handle.tell()
+            carry = b''
+            boundary = file_size
+            while True:
+                chunk = handle.read(1 << 16)
+                if not chunk:
+                    break
+                found = (carry + chunk).find(b'\n>')
+                if found >= 0:
+                    boundary = position - len(carry) + found + 1
+                    break
+                position += len(chunk)
+                carry = chunk[-1:]
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < file_size:
+        boundaries.append(file_size)
+    return boundaries
+
+class FastaIndex:
     """
-    Calculate GC content and length for a single sequence record.
+    faidx-compatible index of an uncompressed FASTA: for every record (in file order) its
+    length, the offset of its first base and the bases and bytes per line.
+    """
+
+    COLUMNS = ('name', 'length', 'offset', 'line_bases', 'line_width')
+
+    def __init__(self, names: List[str], lengths: np.ndarray, offsets: np.ndarray, line_bases: np.ndarray, line_widths: np.ndarray):
+        self.names = list(names)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.line_bases = np.asarray(line_bases, dtype=np.int64)
+        self.line_widths = np.asarray(line_widths, dtype=np.int64)
+        self._positions: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.positions
+
+    @property
+    def positions(self) -> Dict[str, int]:
+        """
+        Map of record name to its position in the index (the last one for duplicate names).
+        """
+        if self._positions is None:
+            self._positions = {name: i for i, name in enumerate(self.names)}
+        return self._positions
+
+    def save(self, path: Union[str, Path]):
+        """
+        Write the index in samtools faidx (.fai) format.
+        """
+        with open(path, 'w', encoding='utf-8') as fh:
+            for row in zip(self.names, self.lengths, self.offsets, self.line_bases, self.line_widths):
+                fh.write('\t'.join(map(str, row)) + '\n')
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "FastaIndex":
+        """
+        Read a samtools faidx (.fai) index.
+        """
+        df = pd.read_csv(path, sep='\t', header=None, usecols=range(5), names=list(cls.COLUMNS), dtype={'name': str}, keep_default_na=False)
+        return cls(df['name'].tolist(), df['length'].values, df['offset'].values, df['line_bases'].values, df['line_width'].values)
+
+class FastaReader:
+    """
+    Random-access reader over a memory-mapped uncompressed FASTA, addressed through a FastaIndex.
+    """
+
+    def __init__(self, fasta_path: Union[str, Path], index: FastaIndex):
+        self.index = index
+        self._fh = open(fasta_path, 'rb')
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(self._fh.fileno()).st_size else b''
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._fh.close()
+
+    def __enter__(self) -> "FastaReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _base_offset(self, i: int, base: int) -> int:
+        line_bases = self.index.line_bases[i]
+        line, column = divmod(base, line_bases) if line_bases else (0, 0)
+        return int(self.index.offsets[i] + line * self.index.line_widths[i] + column)
+
+    def header_start(self, i: int) -> int:
+        """
+        Byte offset of the '>' opening the i-th record.
+        """
+        return self._mm.rfind(b'\n', 0, max(int(self.index.offsets[i]) - 1, 0)) + 1
+
+    def read_range(self, start: int, end: int) -> bytes:
+        """
+        Raw bytes [start, end) of the file.
+        """
+        return self._mm[start:end]
+
+    def record_range(self, i: int) -> Tuple[int, int]:
+        """
+        Byte range of the i-th record, from its '>' to the start of the next record (or the end of the file).
+        """
+        end = self.header_start(i + 1) if i + 1 < len(self.index) else len(self._mm)
+        return self.header_start(i), end
+
+    def title(self, i: int) -> bytes:
+        """
+        Header line of the i-th record, without '>' and trailing whitespace.
+        """
+        return self._mm[self.header_start(i) + 1:int(self.index.offsets[i])].rstrip()
+
+    def fetch(self, name: Union[str, int], start: int = 0, end: Optional[int] = None) -> bytes:
+        """
+        Fetch bases [start, end) of a record without reading the rest of the file.
+
+        :param name: Record name or position in the index.
+        :param start: 0-based start.
+        :param end: 0-based exclusive end (defaults to the record length).
+        :return: Sequence bytes with line terminators removed.
+        """
+        i = name if isinstance(name, int) else self.index.positions[name]
+        length = int(self.index.lengths[i])
+        end = length if end is None else min(end, length)
+        start = max(0, start)
+        if start >= end:
+            return b''
+        raw = self._mm[self._base_offset(i, start):self._base_offset(i, end - 1) + 1]
+        return raw.translate(None, b'\r\n')
+
+def _index_from_records(records: List[tuple]) -> Optional[FastaIndex]:
+    """
+    Build a FastaIndex from _FastaCounter records, or return None if any record has irregular lines.
+    """
+    irregular = sum(1 for record in records if not record[7])
+    if irregular:
+        logger.info(f"FASTA index not built: {irregular} records have irregular line lengths")
+        return None
+    names, _, _, lengths, offsets, line_bases, line_widths, _ = zip(*records) if records else ([],) * 8
+    return FastaIndex(names, lengths, offsets, line_bases, line_widths)
+
+class FastaIndexer:
+    """
+    Builds a FastaIndex incrementally from the bytes of a FASTA as they are written,
+    in pieces of any size.
+    """
+
+    def __init__(self):
+        self._counter = _FastaCounter(build_index=True)
+        self._pending = b''
+        self._offset = 0
+        self._at_line_start = True
 
-    :param sequence_record: A Biopython SeqRecord object.
-    :return: A tuple containing query_id, gc_content (percentage), and length.
+    def update(self, piece: bytes):
+        block, self._pending = _split_unfinished_header(self._pending + piece, self._at_line_start)
+        if block:
+            self._counter.feed(block, self._at_line_start, self._offset)
+            self._offset += len(block)
+            self._at_line_start = block.endswith(b'\n')
+
+    def finish(self) -> Optional[FastaIndex]:
+        """
+        :return: The index of everything passed to update, or None if lines are irregular.
+        """
+        end = self._offset + len(self._pending)
+        if self._pending:
+            self._counter.feed(self._pending + b'\n', self._at_line_start, self._offset)
+        return _index_from_records(self._counter.finish(end))
+
+def scan_fasta(fasta_path: str, threads: int = 1, build_index: bool = True) -> Tuple[Dict[str, Tuple[float, int]], Optional[FastaIndex]]:
+    """
+    Calculate GC content and length of each contig in parallel and, for uncompressed files,
+    build a faidx-compatible index on the same pass.
+    The file is streamed in blocks, so memory does not grow with the assembly size.
+    GC content matches Bio.SeqUtils.gc_fraction (ambiguous bases removed).
+
+    :param fasta_path: Path to the FASTA file (optionally gzip, BGZF or Zstandard compressed).
+    :param threads: Number of processes used to count byte ranges of uncompressed files
+                    (or threads for BGZF decompression of compressed ones).
+    :param build_index: Whether to build the index. An existing, up-to-date '<fasta>.fai' is reused instead.
+    :return: A dictionary mapping query_id to a tuple of (gc_content, length), and the FastaIndex
+             (None for compressed input or records with irregular line lengths).
     """
-    gc = gc_fraction(sequence_record.seq) * 100
-    return str(sequence_record.id), float(gc), len(sequence_record.seq)
+    if detect_compression(fasta_path) is not None:
+        # Compressed input cannot be split (or memory-mapped) by byte offset; count it as a single stream
+        with open_input(fasta_path, 'rb', threads) as handle:
+            results = [_count_stream(handle)]
+        build_index = False
+        index = None
+    else:
+        index = _load_existing_index(fasta_path) if build_index else None
+        build_index = build_index and index is None
+        boundaries = _record_boundaries(fasta_path, max(1, threads))
+        ranges = [(fasta_path, start, end, build_index) for start, end in zip(boundaries[:-1], boundaries[1:])]
+        if len(ranges) > 1:
+            with multiprocessing.Pool(processes=threads) as pool:
+                results = pool.starmap(_count_range, ranges)
+        else:
+            results = [_count_range(*r) for r in ranges]
+
+    records = [record for chunk in results for record in chunk]
+    if build_index:
+        index = _index_from_records(records)
+
+    gc_data = {
+        query_id: ((gc / valid * 100) if valid else 0.0, length)
+        for query_id, gc, valid, length, *_ in records
+    }
+    return gc_data, index
+
+def _load_existing_index(fasta_path: str) -> Optional[FastaIndex]:
+    """
+    Load '<fasta>.fai' if it exists and is not older than the FASTA.
+    """
+    fai_path = Path(f"{fasta_path}.fai")
+    if not fai_path.exists() or fai_path.stat().st_mtime < Path(fasta_path).stat().st_mtime:
+        return None
+    try:
+        index = FastaIndex.load(fai_path)
+    except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        logger.warning(f"Ignoring unreadable FASTA index {fai_path}: {e}")
+        return None
+    logger.info(f"Using existing FASTA index {fai_path}")
+    return index
 
 def parse_fasta(fasta_path: str, threads: int = 1) -> Dict[str, Tuple[float, int]]:
     """
     Parse a FASTA file and calculate GC content and length for each contig in parallel.
+    See scan_fasta, which also builds the FASTA index.
 
-    :param fasta_path: Path to the FASTA file.
-    :param threads: Number of threads to use for parallel processing.
+    :param fasta_path: Path to the FASTA file (optionally gzip, BGZF or Zstandard compressed).
+    :param threads: Number of processes (or BGZF decompression threads).
     :return: A dictionary mapping query_id to a tuple of (gc_content, length).
     """
-    records = list(SeqIO.parse(fasta_path, "fasta"))
-    
-    with multiprocessing.Pool(processes=threads) as pool:
-        results = pool.map(calculate_gc, records)
-    
-    return {query_id: (gc, length) for query_id, gc, length in results}
+    return scan_fasta(fasta_path, threads, build_index=False)[0]
+
+def iter_retained_records(handle: BinaryIO, retained_ids: Set[str]) -> Iterator[bytes]:
+    """
+    Stream the raw bytes of the records whose ID is in retained_ids, unmodified and in file order.
+
+    :param handle: Binary FASTA stream.
+    :param retained_ids: Set of query_ids to keep.
+    :return: An iterator of byte pieces; concatenated they form the retained records.
+    """
+    keep = False
+    for block, at_line_start in _iter_blocks(handle):
+        segment_start = 0
+        header = 0 if at_line_start and block.startswith(b'>') else _next_header(block, 0)
+        while header >= 0:
+            if keep and header > segment_start:
+                yield block[segment_start:header]
+            header_end = block.find(b'\n', header)
+            keep = _header_id(block[header + 1:header_end]) in retained_ids
+            segment_start = header
+            header = _next_header(block, header_end)
+        if keep and segment_start < len(block):
+            yield block[segment_start:]
+
+def iter_fasta_sequences(fasta_path: str, threads: int = 1) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream a FASTA file record by record without building SeqRecord objects.
+    The ID is the first whitespace-delimited word of the header, as in Biopython.
+
+    :param fasta_path: Path to the FASTA file (optionally gzip, BGZF or Zstandard compressed).
+    :param threads: Number of threads for BGZF decompression.
+    :return: An iterator of tuples (query_id, sequence bytes).
+    """
+    query_id = None
+    lines = []
+    with open_input(fasta_path, 'rb', threads) as handle:
+        for line in handle:
+            if line.startswith(b'>'):
+                if query_id is not None:
+                    yield query_id, b''.join(lines)
+                query_id = _header_id(line[1:])
+                lines = []
+            elif query_id is not None:
+                lines.append(line.rstrip().replace(b' ', b''))
+    if query_id is not None:
+        yield query_id, b''.join(lines)
@@ -1,69 +1,425 @@
 """
 Mash distance file parser for FilterHaplotypes.
 Handles reading Mash TSV output and building high-performance lookup structures.
+Large all-vs-all tables are streamed in chunks straight into a sparse distance matrix,
+so the full table is never held in memory.
 """
 
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 import logging
+from src.filter_haplotypes.utils.file_io import open_input
 
 logger = logging.getLogger(__name__)
 
-def parse_mash(mash_path: str) -> pd.DataFrame:
+MASH_COLUMNS = ['id1', 'id2', 'distance', 'p_value', 'hashes']
+MASH_MAX_P_VALUE = 0.05
+MASH_CHUNKSIZE = 1_000_000
+
+def iter_mash_chunks(
+    mash_path: str,
+    threads: int = 1,
+    chunksize: int = MASH_CHUNKSIZE,
+    max_p_value: float = MASH_MAX_P_VALUE,
+    columns: Optional[List[str]] = None
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """
+    Stream a Mash distance file in fixed-size chunks, keeping records with P-value < max_p_value.
+
+    :param mash_path: Path to the Mash distance file (optionally gzip, BGZF or Zstandard compressed).
+    :param threads: Number of threads for BGZF decompression.
+    :param chunksize: Number of Mash lines read per chunk.
+    :param max_p_value: Exclusive P-value cutoff.
+    :param columns: Subset of MASH_COLUMNS to parse (default: all); must include 'p_value'.
+    :return: An iterator of tuples (filtered_chunk, lines_read).
+    """
+    with open_input(mash_path, 'rb', threads) as handle:
+        reader = pd.read_csv(
+            handle, sep='\t', header=None, names=MASH_COLUMNS, usecols=columns,
+            dtype={'id1': str, 'id2': str}, chunksize=chunksize, encoding='utf-8'
+        )
+        for chunk in reader:
+            yield chunk[chunk['p_value'] < max_p_value], len(chunk)
+
+def parse_mash(mash_path: str, threads: int = 1) -> pd.DataFrame:
     """
     Parse a Mash distance file (TSV) and filter by P-value.
 
-    :param mash_path: Path to the Mash distance file.
+    :param mash_path: Path to the Mash distance file (optionally gzip, BGZF or Zstandard compressed).
+    :param threads: Number of threads for BGZF decompression.
     :return: A pandas DataFrame containing Mash records with P-value < 0.05.
     """
-    columns = ['id1', 'id2', 'distance', 'p_value', 'hashes']
+    chunks = []
+    lines_read = 0
     try:
-        df = pd.read_csv(mash_path, sep='\t', header=None, names=columns, encoding='utf-8')
+        for chunk, chunk_lines in iter_mash_chunks(mash_path, threads):
+            chunks.append(chunk)
+            lines_read += chunk_lines
     except Exception as e:
         logger.error(f"Failed to read Mash file {mash_path}: {e}")
         raise
 
-    # Filter by P-value < 0.05
-    initial_count = len(df)
-    df_filtered = df[df['p_value'] < 0.05].copy()
-    filtered_count = len(df_filtered)
-    
-    if initial_count > filtered_count:
-        logger.info(f"Filtered out {initial_count - filtered_count} Mash records with P-value >= 0.05")
-    
+    df_filtered = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=MASH_COLUMNS)
+    if lines_read > len(df_filtered):
+        logger.info(f"Filtered out {lines_read - len(df_filtered)} Mash records with P-value >= 0.05")
+
     return df_filtered
 
-def build_mash_lookup(df: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+def _last_per_key(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deduplicate keys keeping the value of the last occurrence.
+
+    :return: Tuple (sorted unique keys, matching values).
+    """
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    return keys[last], values[last]
+
+class _SortedKeySet:
+    """
+    Growing set of int64 keys with vectorized membership tests.
+    New keys are buffered in sorted runs that are merged once they outgrow a fraction
+    of the main array, so inserts cost amortized O(log n) per key.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self._runs: List[np.ndarray] = []
+        self._run_size = 0
+
+    def __len__(self) -> int:
+        self._merge()
+        return len(self.keys)
+
+    def _merge(self):
+        if self._runs:
+            self.keys = np.unique(np.concatenate([self.keys] + self._runs))
+            self._runs = []
+            self._run_size = 0
+
+    def add(self, keys: np.ndarray):
+        if len(keys) == 0:
+            return
+        self._runs.append(np.unique(keys))
+        self._run_size += len(keys)
+        if self._run_size > max(len(self.keys) // 4, 65536):
+            self._merge()
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for sorted_keys in [self.keys] + self._runs:
+            if len(sorted_keys) == 0:
+                continue
+            pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+            found |= sorted_keys[pos] == keys
+        return found
+
+class MashPairStore:
+    """
+    Accumulates Mash records streamed in chunks as canonical contig-index pairs.
+    IDs get stable integer codes in order of appearance and each unordered pair is keyed as an
+    int64 (low code in the high 32 bits). Self-pairs are dropped, and the duplicate (B, A)
+    orientation of a pair collapses onto (A, B), keeping the last record as parse_mash does.
+    """
+
+    def __init__(self, compact_size: int = 4 * MASH_CHUNKSIZE):
+        self.ids = pd.Index([], dtype=object)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.distances = np.empty(0, dtype=np.float32)
+        self.records_added = 0
+        self.compact_size = compact_size
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_size = 0
+
+    def pair_keys(self, id1: np.ndarray, id2: np.ndarray) -> np.ndarray:
+        """
+        Encode ID pairs as canonical int64 keys, registering unseen IDs (-1 for self-pairs).
+        """
+        codes1 = self.ids.get_indexer(id1)
+        codes2 = self.ids.get_indexer(id2)
+        if (codes1 < 0).any() or (codes2 < 0).any():
+            unseen = pd.unique(np.concatenate([id1[codes1 < 0], id2[codes2 < 0]]))
+            self.ids = self.ids.append(pd.Index(unseen, dtype=object))
+            codes1 = self.ids.get_indexer(id1)
+            codes2 = self.ids.get_indexer(id2)
+        codes1 = codes1.astype(np.int64)
+        codes2 = codes2.astype(np.int64)
+        keys = (np.minimum(codes1, codes2) << 32) | np.maximum(codes1, codes2)
+        keys[codes1 == codes2] = -1
+        return keys
+
+    def add(self, keys: np.ndarray, distances: np.ndarray):
+        """
+        Add records in file order; duplicates within the batch are collapsed immediately.
+        """
+        self.records_added += len(keys)
+        keys, distances = _last_per_key(keys, distances.astype(np.float32))
+        self._pending.append((keys, distances))
+        self._pending_size += len(keys)
+        if self._pending_size > self.compact_size:
+            self.compact()
+
+    def compact(self):
+        """
+        Merge pending batches into the sorted store (later batches override earlier ones).
+        """
+        if not self._pending:
+            return
+        self.keys, self.distances = _last_per_key(
+            np.concatenate([self.keys] + [k for k, _ in self._pending]),
+            np.concatenate([self.distances] + [d for _, d in self._pending])
+        )
+        self._pending = []
+        self._pending_size = 0
+
+    def to_matrix(self) -> "MashDistanceMatrix":
+        self.compact()
+        low = (self.keys >> 32).astype(np.int32)
+        high = (self.keys & 0xFFFFFFFF).astype(np.int32)
+        return MashDistanceMatrix.from_pairs(np.asarray(self.ids, dtype=str), low, high, self.distances)
+
+def stream_mash_lookup(
+    mash_path: str,
+    threads: int = 1,
+    max_distance: Optional[float] = None,
+    keep_pairs: Optional[Iterable[Tuple[str, str]]] = None,
+    max_p_value: float = MASH_MAX_P_VALUE,
+    chunksize: int = MASH_CHUNKSIZE
+) -> "MashDistanceMatrix":
+    """
+    Stream a Mash distance file chunk by chunk straight into a MashDistanceMatrix.
+    Records with P-value >= max_p_value and self-pairs are dropped, and both orientations of
+    a pair are stored once. Memory scales with the stored pairs, not with the file size.
+
+    Without max_distance and keep_pairs every pair is stored. Otherwise a pair is stored if it is
+    listed in keep_pairs (in either orientation) or if any of its records has a distance below
+    max_distance. All later records of a stored pair are kept too, so the last record still
+    determines the distance, as with parse_mash.
+
+    :param mash_path: Path to the Mash distance file (optionally gzip, BGZF or Zstandard compressed).
+    :param threads: Number of threads for BGZF decompression.
+    :param max_distance: Store pairs with a distance strictly below this value.
+    :param keep_pairs: ID pairs stored regardless of distance.
+    :param max_p_value: Exclusive P-value cutoff.
+    :param chunksize: Number of Mash lines read per chunk.
+    :return: A MashDistanceMatrix.
     """
-    Build a high-performance nested dictionary for Mash distance lookups.
-    Stores distance for both (id1, id2) and (id2, id1).
+    store = MashPairStore(compact_size=4 * chunksize)
+    select = max_distance is not None or keep_pairs is not None
+    required = _SortedKeySet()
+    if keep_pairs is not None:
+        keep_pairs = list(keep_pairs)
+        if keep_pairs:
+            required.add(store.pair_keys(
+                np.array([p[0] for p in keep_pairs], dtype=object),
+                np.array([p[1] for p in keep_pairs], dtype=object)
+            ))
+    close = _SortedKeySet()
+
+    lines_read = 0
+    passed_count = 0
+    self_pairs = 0
+    try:
+        for chunk, chunk_lines in iter_mash_chunks(
+            mash_path, threads, chunksize, max_p_value, columns=['id1', 'id2', 'distance', 'p_value']
+        ):
+            lines_read += chunk_lines
+            passed_count += len(chunk)
+            keys = store.pair_keys(chunk['id1'].to_numpy(dtype=object), chunk['id2'].to_numpy(dtype=object))
+            distances = chunk['distance'].to_numpy(dtype=np.float64)
+            mask = keys >= 0
+            self_pairs += int((~mask).sum())
+            if select:
+                selected = required.contains(keys)
+                if max_distance is not None:
+                    is_close = mask & (distances < max_distance)
+                    close.add(keys[is_close])
+                    selected |= is_close | close.contains(keys)
+                mask &= selected
+            store.add(keys[mask], distances[mask])
+    except Exception as e:
+        logger.error(f"Failed to read Mash file {mash_path}: {e}")
+        raise
+
+    lookup = store.to_matrix()
+    num_pairs = len(lookup.indices) // 2
+    if lines_read > passed_count:
+        logger.info(f"Filtered out {lines_read - passed_count} Mash records with P-value >= {max_p_value}")
+    logger.info(
+        f"Mash records: {lines_read} read, {self_pairs} self-pairs, "
+        f"{store.records_added - num_pairs} duplicate records collapsed, {num_pairs} pairs stored"
+    )
+    if select:
+        reason = f"{len(required)} required pairs"
+        if max_distance is not None:
+            reason += f", {len(close)} pairs below distance {max_distance:.4f}"
+        logger.info(f"Stored pairs restricted to {reason}")
+
+    return lookup
+
+class MashDistanceMatrix:
+    """
+    Symmetric Mash distances stored as a sparse CSR matrix keyed by integer contig indices
+    (int32 column indices, float32 distances, each row sorted by column).
+    A pair costs 8 bytes per direction instead of two Python dict entries.
+    The arrays can be saved to a directory and memory-mapped read-only by worker processes,
+    so every worker shares one copy of the distances instead of receiving a pickled lookup.
+    """
+
+    ARRAY_NAMES = ('ids', 'indptr', 'indices', 'distances')
+
+    def __init__(self, ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, distances: np.ndarray):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.distances = distances
+        self._id_to_index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_pairs(cls, ids: np.ndarray, low: np.ndarray, high: np.ndarray, distances: np.ndarray) -> "MashDistanceMatrix":
+        """
+        Build the symmetric matrix from unique unordered pairs of contig indices.
+
+        :param ids: Contig IDs indexed by contig index.
+        :param low: First contig index of each pair.
+        :param high: Second contig index of each pair.
+        :param distances: Mash distance of each pair.
+        :return: A MashDistanceMatrix.
+        """
+        rows = np.concatenate([low, high]).astype(np.int32)
+        cols = np.concatenate([high, low]).astype(np.int32)
+        values = np.concatenate([distances, distances]).astype(np.float32)
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(ids)), out=indptr[1:])
+        return cls(ids, indptr, cols[order], values[order])
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "MashDistanceMatrix":
+        """
+        Build the matrix from a filtered Mash DataFrame. Self-pairs are dropped and, as with the
+        nested dictionary lookup, a later record overrides an earlier one for the same pair
+        in either orientation.
+
+        :param df: Filtered Mash DataFrame.
+        :return: A MashDistanceMatrix.
+        """
+        store = MashPairStore()
+        keys = store.pair_keys(df['id1'].to_numpy(dtype=object), df['id2'].to_numpy(dtype=object))
+        valid = keys >= 0
+        store.add(keys[valid], df['distance'].to_numpy(dtype=np.float64)[valid])
+        return store.to_matrix()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, query_id: str) -> bool:
+        return query_id in self.id_to_index
+
+    @property
+    def id_to_index(self) -> Dict[str, int]:
+        if self._id_to_index is None:
+            self._id_to_index = {str(q_id): idx for idx, q_id in enumerate(self.ids)}
+        return self._id_to_index
+
+    @staticmethod
+    def stored_precision(distance: float) -> float:
+        """
+        Round a distance (e.g. a threshold) to the float32 precision of the stored distances,
+        so a stored distance equal to it compares equal instead of just below.
+        """
+        return float(np.float32(distance))
+
+    def distance(self, id1: str, id2: str) -> Optional[float]:
+        """
+        Retrieve the Mash distance between two contigs by binary search within the row of id1.
+
+        :return: Mash distance or None if the pair is not present.
+        """
+        i = self.id_to_index.get(id1)
+        j = self.id_to_index.get(id2)
+        if i is None or j is None:
+            return None
+        start, end = self.indptr[i], self.indptr[i + 1]
+        pos = start + np.searchsorted(self.indices[start:end], j)
+        if pos < end and self.indices[pos] == j:
+            return float(self.distances[pos])
+        return None
+
+    def neighbors_within(self, query_id: str, max_distance: float) -> Dict[str, float]:
+        """
+        Retrieve all contigs whose Mash distance to query_id is strictly below max_distance.
+
+        :param query_id: Query ID.
+        :param max_distance: Exclusive distance threshold.
+        :return: Dictionary {neighbor_id: distance}.
+        """
+        i = self.id_to_index.get(query_id)
+        if i is None:
+            return {}
+        start, end = self.indptr[i], self.indptr[i + 1]
+        row_distances = self.distances[start:end]
+        close = np.flatnonzero(row_distances < np.float32(max_distance))
+        neighbor_ids = self.ids[self.indices[start:end][close]]
+        return {str(n_id): float(d) for n_id, d in zip(neighbor_ids, row_distances[close])}
+
+    def save(self, directory: Union[str, Path]):
+        """
+        Write the CSR arrays as .npy files so they can be memory-mapped by other processes.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap_mode: Optional[str] = 'r') -> "MashDistanceMatrix":
+        """
+        Attach to CSR arrays written by save, memory-mapped read-only by default.
+        """
+        directory = Path(directory)
+        arrays = [np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in cls.ARRAY_NAMES]
+        return cls(*arrays)
+
+def build_mash_lookup(df: pd.DataFrame) -> MashDistanceMatrix:
+    """
+    Build the sparse symmetric lookup structure for Mash distances.
 
     :param df: Filtered Mash DataFrame.
-    :return: A nested dictionary {id1: {id2: distance}}.
-    """
-    lookup = {}
-    for row in df.itertuples(index=False):
-        id1, id2, dist = row.id1, row.id2, row.distance
-        
-        if id1 not in lookup:
-            lookup[id1] = {}
-        lookup[id1][id2] = dist
-        
-        if id2 not in lookup:
-            lookup[id2] = {}
-        lookup[id2][id1] = dist
-        
+    :return: A MashDistanceMatrix; query it with get_mash_distance and get_close_neighbors.
+    """
+    lookup = MashDistanceMatrix.from_dataframe(df)
+    logger.debug(f"Mash lookup: {len(lookup)} contigs, {len(lookup.indices) // 2} pairs")
     return lookup
 
-def get_mash_distance(lookup: Dict[str, Dict[str, float]], id1: str, id2: str) -> Optional[float]:
+def get_mash_distance(lookup: Union[Dict[str, Dict[str, float]], MashDistanceMatrix], id1: str, id2: str) -> Optional[float]:
     """
-    Retrieve Mash distance between two IDs from the lookup dictionary.
+    Retrieve Mash distance between two IDs from the lookup structure.
 
-    :param lookup: The nested dictionary {id1: {id2: distance}}.
+    :param lookup: The nested dictionary {id1: {id2: distance}} or a MashDistanceMatrix.
     :param id1: Query ID 1.
     :param id2: Query ID 2.
     :return: Mash distance or None if not found.
     """
     if id1 == id2:
         return 0.0
+    if isinstance(lookup, MashDistanceMatrix):
+        return lookup.distance(id1, id2)
     return lookup.get(id1, {}).get(id2)
+
+def get_close_neighbors(lookup: Union[Dict[str, Dict[str, float]], MashDistanceMatrix], query_id: str, max_distance: float) -> Set[str]:
+    """
+    Retrieve the IDs of all contigs with a Mash distance to query_id strictly below max_distance.
+
+    :param lookup: The nested dictionary {id1: {id2: distance}} or a MashDistanceMatrix.
+    :param query_id: Query ID.
+    :param max_distance: Exclusive distance threshold.
+    :return: Set of neighbor IDs (never including query_id itself).
+    """
+    if isinstance(lookup, MashDistanceMatrix):
+        return set(lookup.neighbors_within(query_id, max_distance))
+    return {n_id for n_id, dist in lookup.get(query_id, {}).items() if dist < max_distance and n_id != query_id}
@@ -4,73 +4,262 @@ Handles reading PAF records, extracting alignment scores (AS),
 and identifying primary target loci for each query contig.
 """
 
+import io
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Iterator
 import logging
+from src.filter_haplotypes.utils.file_io import open_input
 
 logger = logging.getLogger(__name__)
 
-def parse_paf(paf_path: str, min_mq: int = 10) -> pd.DataFrame:
+# SAM-style optional tags understood by extract_tags: tag -> (prefix, dtype, fill value).
+# 'cg' is reported as the length of the CIGAR string rather than the string itself.
+PAF_TAGS = {
+    'AS': ('AS:i:', np.int64, 0),
+    'NM': ('NM:i:', np.int64, 0),
+    'tp': ('tp:A:', 'U1', ''),
+    'dv': ('dv:f:', np.float64, np.nan),
+    'cg': ('cg:Z:', np.int64, 0),
+}
+
+def extract_tags(tag_df: pd.DataFrame, tags: Sequence[str] = ('AS',)) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
     """
-    Parse a PAF file and filter by mapping quality and extract AS:i tag.
+    Extract SAM-style optional tags from the PAF tag columns using vectorized string operations.
+    The first occurrence of a tag on each row wins; malformed values are skipped.
+
+    :param tag_df: DataFrame holding the optional PAF columns (column 13 onwards).
+    :param tags: Tags to extract (keys of PAF_TAGS).
+    :return: A tuple (values, found) of dictionaries mapping each tag to a typed NumPy column
+             and to a boolean mask of rows where the tag was present.
+    """
+    num_rows = len(tag_df)
+    values = {}
+    found = {}
+    for tag in tags:
+        if tag not in PAF_TAGS:
+            raise ValueError(f"Unsupported PAF tag '{tag}'. Supported tags: {', '.join(PAF_TAGS)}")
+        prefix, dtype, fill = PAF_TAGS[tag]
+        values[tag] = np.full(num_rows, fill, dtype=dtype)
+        found[tag] = np.zeros(num_rows, dtype=bool)
+
+    for col in tag_df.columns:
+        series = tag_df[col]
+        if series.dtype.kind in 'biufc':
+            continue
+        # Fixed-width unicode view of the column for C-level prefix matching
+        fixed = series.to_numpy(dtype='U')
+        raw_column = series.to_numpy(dtype=object)
+        for tag in tags:
+            prefix, dtype, _ = PAF_TAGS[tag]
+            pending = ~found[tag]
+            if not pending.any():
+                continue
+            mask = np.char.startswith(fixed, prefix) & pending
+            if not mask.any():
+                continue
+            raw = pd.Series(raw_column[mask]).str.slice(len(prefix))
+            if tag == 'cg':
+                parsed = raw.str.len().to_numpy(dtype=np.int64)
+                valid = np.ones(len(parsed), dtype=bool)
+            elif tag == 'tp':
+                parsed = raw.str.slice(0, 1).to_numpy(dtype='U1')
+                valid = raw.str.len().to_numpy() > 0
+            else:
+                try:
+                    parsed = raw.astype(dtype).to_numpy()
+                    valid = np.ones(len(parsed), dtype=bool)
+                except ValueError:
+                    # Malformed values present: fall back to coercing parser
+                    numeric = pd.to_numeric(raw, errors='coerce')
+                    valid = numeric.notna().to_numpy()
+                    parsed = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+            rows = np.flatnonzero(mask)[valid]
+            values[tag][rows] = parsed[valid].astype(dtype)
+            found[tag][rows] = True
+
+    return values, found
+
+# PAF mandatory columns
+PAF_COLUMNS = [
+    'query_id', 'query_len', 'query_start', 'query_end', 'strand',
+    'target_id', 'target_len', 'target_start', 'target_end',
+    'n_match', 'aln_len', 'mq'
+]
+
+# Compact storage: categorical IDs/strand, uint8 MQ, and int32 integers where the values fit
+PAF_ID_COLUMNS = ['query_id', 'target_id', 'strand']
+PAF_INT_COLUMNS = [
+    'query_len', 'query_start', 'query_end', 'target_len', 'target_start', 'target_end',
+    'n_match', 'aln_len', 'AS'
+]
+
+def compact_paf_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a PAF DataFrame to compact dtypes: categorical query/target IDs and strand,
+    uint8 mapping quality, and int32 integer columns when their range fits (int64 otherwise).
+    Integer columns stay signed so coordinate differences never wrap around.
+
+    :param df: PAF DataFrame with the mandatory columns and 'AS'.
+    :return: The same records with compact dtypes.
+    """
+    compact = {}
+    for col in df.columns:
+        values = df[col]
+        if col in PAF_ID_COLUMNS:
+            compact[col] = values.astype('category')
+        elif col == 'mq':
+            compact[col] = values.astype(np.uint8)
+        elif col in PAF_INT_COLUMNS:
+            int32_info = np.iinfo(np.int32)
+            fits = values.empty or (values.min() >= int32_info.min and values.max() <= int32_info.max)
+            compact[col] = values.astype(np.int32 if fits else np.int64)
+        else:
+            compact[col] = values
+    return pd.DataFrame(compact, index=df.index)
+
+def concat_paf_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate compact PAF chunks, merging categorical columns into a single sorted
+    category set so codes and alphabetical ordering are consistent across chunks.
+
+    :param chunks: List of DataFrames produced by compact_paf_dtypes.
+    :return: A single compact DataFrame with a fresh RangeIndex.
+    """
+    columns = {}
+    for col in chunks[0].columns:
+        if col in PAF_ID_COLUMNS:
+            columns[col] = pd.api.types.union_categoricals(
+                [chunk[col] for chunk in chunks], sort_categories=True, ignore_order=True
+            )
+        else:
+            columns[col] = np.concatenate([chunk[col].to_numpy() for chunk in chunks])
+    return pd.DataFrame(columns)
+
+def iter_paf_chunks(paf_path: str, min_mq: int = 10, chunksize: int = 250_000, threads: int = 1) -> Iterator[Tuple[pd.DataFrame, int, int]]:
+    """
+    Stream a PAF file in fixed-size chunks, applying the MQ filter and AS:i extraction per chunk.
+    Only the mandatory columns and the parsed AS score of passing records are kept.
+    Plain, gzip, BGZF and Zstandard compressed files are accepted.
 
     :param paf_path: Path to the PAF file.
     :param min_mq: Minimum mapping quality threshold.
-    :return: A pandas DataFrame containing the filtered PAF records with an 'AS' column.
-    """
-    # PAF mandatory columns
-    columns = [
-        'query_id', 'query_len', 'query_start', 'query_end', 'strand',
-        'target_id', 'target_len', 'target_start', 'target_end',
-        'n_match', 'aln_len', 'mq'
-    ]
-    
+    :param chunksize: Number of PAF lines read per chunk.
+    :param threads: Number of threads for BGZF decompression.
+    :return: An iterator of tuples (filtered_chunk, lines_read, missing_as_count);
+             chunks use the compact dtypes of compact_paf_dtypes.
+    """
+    num_mandatory = len(PAF_COLUMNS)
+    with open_input(paf_path, 'rt', threads) as handle:
+        while True:
+            lines = list(islice(handle, chunksize))
+            if not lines:
+                break
+            # The number of optional tags is unbounded, so the chunk is read as wide as its
+            # widest line; shorter lines are padded with missing values. ID columns are always
+            # read as strings so numeric names ("1") and other names ("X") in different chunks
+            # give categories of the same dtype.
+            num_fields = max(num_mandatory, 1 + max(line.count('\t') for line in lines))
+            try:
+                chunk = pd.read_csv(
+                    io.StringIO(''.join(lines)), sep='\t', header=None, names=list(range(num_fields)),
+                    dtype={PAF_COLUMNS.index(col): str for col in PAF_ID_COLUMNS}, low_memory=False
+                )
+            except pd.errors.EmptyDataError:
+                continue
+            lines_read = len(chunk)
+            chunk = chunk[chunk[num_mandatory - 1] >= min_mq]
+
+            df_chunk = chunk.iloc[:, :num_mandatory].copy()
+            df_chunk.columns = PAF_COLUMNS
+
+            # Extract AS:i tag from the whole tag tail (missing tags default to 0)
+            tag_values, tag_found = extract_tags(chunk.iloc[:, num_mandatory:], ('AS',))
+            df_chunk['AS'] = tag_values['AS']
+
+            yield compact_paf_dtypes(df_chunk), lines_read, int((~tag_found['AS']).sum())
+
+def parse_paf(paf_path: str, min_mq: int = 10, chunksize: int = 250_000, threads: int = 1) -> pd.DataFrame:
+    """
+    Parse a PAF file and filter by mapping quality and extract AS:i tag.
+    The file is streamed in chunks so the unfiltered table is never held in memory.
+
+    :param paf_path: Path to the PAF file (optionally gzip, BGZF or Zstandard compressed).
+    :param min_mq: Minimum mapping quality threshold.
+    :param chunksize: Number of PAF lines read per chunk.
+    :param threads: Number of threads for BGZF decompression.
+    :return: A pandas DataFrame containing the filtered PAF records with an 'AS' column,
+             using categorical IDs/strand and compact integer dtypes.
+    """
+    chunks = []
+    total_lines = 0
+    num_missing = 0
     try:
-        # PAF can have varying number of columns due to tags
-        df = pd.read_csv(paf_path, sep='\t', header=None, low_memory=False, encoding='utf-8')
+        for df_chunk, lines_read, missing in iter_paf_chunks(paf_path, min_mq, chunksize, threads):
+            chunks.append(df_chunk)
+            total_lines += lines_read
+            num_missing += missing
+    except pd.errors.EmptyDataError:
+        pass
     except Exception as e:
         logger.error(f"Failed to read PAF file {paf_path}: {e}")
         raise
 
-    if df.empty:
+    if total_lines == 0:
         logger.warning(f"PAF file {paf_path} is empty.")
-        return pd.DataFrame(columns=columns + ['AS'])
-
-    # Map mandatory columns
-    num_mandatory = len(columns)
-    df_mandatory = df.iloc[:, :num_mandatory].copy()
-    df_mandatory.columns = columns
-    
-    # Extract AS:i tag from remaining columns
-    def extract_as_tag(row):
-        for val in row[num_mandatory:]:
-            if isinstance(val, str) and val.startswith('AS:i:'):
-                try:
-                    return int(val.split(':')[-1])
-                except ValueError:
-                    continue
-        return None
+        return pd.DataFrame(columns=PAF_COLUMNS + ['AS'])
 
-    df_mandatory['AS'] = df.apply(extract_as_tag, axis=1)
-    
     # Validation: Check for AS tag
-    if df_mandatory['AS'].isnull().any():
-        num_missing = df_mandatory['AS'].isnull().sum()
-        logger.warning(f"{num_missing} records missing 'AS:i:' tag in {paf_path}")
-    
-    # Filter by MQ
-    df_filtered = df_mandatory[df_mandatory['mq'] >= min_mq].copy()
-    
-    # Drop records without AS tag if necessary, or default to 0
-    df_filtered['AS'] = df_filtered['AS'].fillna(0).astype(int)
-    
+    if num_missing > 0:
+        logger.warning(f"{num_missing} records passing the MQ filter are missing 'AS:i:' tag in {paf_path}")
+
+    df_filtered = concat_paf_chunks(chunks)
+    logger.debug(f"Retained {len(df_filtered)} of {total_lines} PAF records with MQ >= {min_mq}")
+
+    # The comparison materializes the table with default dtypes, so it only runs when logged
+    if logger.isEnabledFor(logging.DEBUG):
+        compact_bytes = df_filtered.memory_usage(deep=True).sum()
+        default_bytes = df_filtered.astype({
+            **{col: object for col in PAF_ID_COLUMNS},
+            **{col: np.int64 for col in PAF_INT_COLUMNS + ['mq']}
+        }).memory_usage(deep=True).sum()
+        logger.debug(
+            f"PAF table memory: {compact_bytes / 1e6:.2f} MB compact vs {default_bytes / 1e6:.2f} MB "
+            f"with default dtypes ({(default_bytes - compact_bytes) / 1e6:.2f} MB saved)"
+        )
+
     return df_filtered
 
+def segment_percentile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """
+    Compute a percentile for each contiguous segment of a segment-wise sorted array.
+    Uses the same linear interpolation as np.percentile, so results are identical.
+
+    :param sorted_values: Values sorted in ascending order within each segment.
+    :param starts: Start offset of each segment.
+    :param counts: Number of values in each segment (all > 0).
+    :param q: Percentile in [0, 100].
+    :return: Array of per-segment percentiles (float64).
+    """
+    values = sorted_values.astype(np.float64, copy=False)
+    virtual_index = (counts - 1) * (q / 100)
+    previous = np.floor(virtual_index).astype(np.int64)
+    following = np.minimum(previous + 1, counts - 1)
+    gamma = virtual_index - previous
+
+    a = values[starts + previous]
+    b = values[starts + following]
+    diff = b - a
+    # np.percentile lerps from the nearer bound for numerical stability
+    return np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
 def get_primary_targets(df: pd.DataFrame) -> pd.DataFrame:
     """
     Identify the primary target locus for each query contig.
     Selection: Highest 90th percentile of AS, then longest alignment length, then alphabetical target_id.
+    Per-target statistics are computed with a sorted-segment kernel and the primary records are
+    selected with a boolean mask, without per-group Python calls or a merge.
 
     :param df: Filtered PAF DataFrame.
     :return: DataFrame with only primary target records for each query_id.
@@ -78,24 +267,39 @@ def get_primary_targets(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
 
-    # Calculate 90th percentile of AS per target for each query
-    # and also get the max aln_len per target (for tie-breaking)
-    target_stats = df.groupby(['query_id', 'target_id']).agg(
-        p90_as=('AS', lambda x: np.percentile(x, 90)),
-        max_aln_len=('aln_len', 'max')
-    ).reset_index()
+    # Group id for every (query_id, target_id) pair
+    group_ids = df.groupby(['query_id', 'target_id'], observed=True, sort=False).ngroup().to_numpy()
+    num_groups = int(group_ids.max()) + 1
+
+    # Sort AS within each group and compute the 90th percentile per group,
+    # plus the max aln_len per target (for tie-breaking)
+    order = np.lexsort((df['AS'].to_numpy(), group_ids))
+    counts = np.bincount(group_ids, minlength=num_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    p90_as = segment_percentile(df['AS'].to_numpy()[order], starts, counts, 90)
+    max_aln_len = np.maximum.reduceat(df['aln_len'].to_numpy()[order], starts)
+
+    first_rows = order[starts]
+    query_rank = pd.factorize(df['query_id'].to_numpy()[first_rows], sort=True)[0]
+    target_rank = pd.factorize(df['target_id'].to_numpy()[first_rows], sort=True)[0]
 
     # Sort to find the best target per query
     # Primary: 90th percentile AS, Secondary: max aln_len, Tertiary: alphabetical target_id
-    target_stats_sorted = target_stats.sort_values(
-        by=['query_id', 'p90_as', 'max_aln_len', 'target_id'],
-        ascending=[True, False, False, True]
-    )
-    
-    # For each query_id, define primary target
-    primary_targets = target_stats_sorted.groupby('query_id').first().reset_index()[['query_id', 'target_id']]
-    
+    ranked = np.lexsort((target_rank, -max_aln_len.astype(np.int64), -p90_as, query_rank))
+    is_first = np.ones(num_groups, dtype=bool)
+    is_first[1:] = query_rank[ranked][1:] != query_rank[ranked][:-1]
+    is_primary = np.zeros(num_groups, dtype=bool)
+    is_primary[ranked[is_first]] = True
+
     # Filter original df to keep only records aligning to primary targets
-    merged = df.merge(primary_targets, on=['query_id', 'target_id'], how='inner')
-    
-    return merged
+    return df[is_primary[group_ids]].reset_index(drop=True)
+
+def primary_target_map(primary_df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Map each aligned query contig to its primary target in one pass over the table.
+
+    :param primary_df: PAF DataFrame of primary target records (from get_primary_targets).
+    :return: Dictionary mapping query_id to target_id, in order of first appearance.
+    """
+    first_records = primary_df.drop_duplicates('query_id')
+    return dict(zip(first_records['query_id'].astype(str), first_records['target_id'].astype(str)))
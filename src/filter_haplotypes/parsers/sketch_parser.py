@@ -0,0 +1,349 @@
+"""
+MinHash sketch parser for FilterHaplotypes.
+Reads Mash sketches (.msh, the JSON dump of `mash info -d`, or .npz files written by the
+built-in sketcher) and computes Mash distances on demand, only for the contig pairs the
+pipeline actually queries.
+Distances follow Mash: the Jaccard index is estimated on the bottom-s hashes of the union
+of two sketches, and P-values use the same binomial model.
+"""
+
+import json
+import logging
+import multiprocessing
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy.stats import binom
+
+from src.filter_haplotypes.parsers.mash_parser import MashDistanceMatrix, MASH_MAX_P_VALUE
+from src.filter_haplotypes.utils.file_io import open_input
+
+logger = logging.getLogger(__name__)
+
+NPZ_MAGIC = b'PK\x03\x04'
+SKETCH_PAIR_BATCH = 20_000
+# Cap on the hashes merged per distance batch (both sketches of every pair), which bounds the
+# working set of sketch_distances to a few hundred MB whatever the sketch size
+SKETCH_BATCH_HASHES = 1 << 22
+SKETCH_QUERY_BATCH = 2_000
+
+class MinHashSketches:
+    """
+    A set of MinHash sketches stored as one concatenated uint64 array.
+    The hashes of sketch i are hashes[offsets[i]:offsets[i + 1]], sorted ascending.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        lengths: np.ndarray,
+        hashes: np.ndarray,
+        offsets: np.ndarray,
+        kmer_size: int,
+        sketch_size: int,
+        hash_type: str = "MurmurHash3_x64_128"
+    ):
+        self.ids = ids
+        self.lengths = lengths
+        self.hashes = hashes
+        self.offsets = offsets
+        self.kmer_size = kmer_size
+        self.sketch_size = sketch_size
+        self.hash_type = hash_type
+        self._id_to_index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def id_to_index(self) -> Dict[str, int]:
+        if self._id_to_index is None:
+            self._id_to_index = {str(q_id): idx for idx, q_id in enumerate(self.ids)}
+        return self._id_to_index
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def indices_of(self, query_ids: Iterable[str]) -> np.ndarray:
+        """
+        Map contig IDs to sketch indices (-1 for contigs without a sketch).
+        """
+        return np.array([self.id_to_index.get(q_id, -1) for q_id in query_ids], dtype=np.int64)
+
+    @classmethod
+    def from_lists(
+        cls,
+        ids: List[str],
+        lengths: List[int],
+        hash_lists: List[np.ndarray],
+        kmer_size: int,
+        sketch_size: int,
+        hash_type: str = "MurmurHash3_x64_128"
+    ) -> "MinHashSketches":
+        """
+        Build sketches from per-contig hash arrays (sorted and deduplicated here).
+        """
+        hash_lists = [np.unique(np.asarray(h, dtype=np.uint64)) for h in hash_lists]
+        offsets = np.zeros(len(hash_lists) + 1, dtype=np.int64)
+        np.cumsum([len(h) for h in hash_lists], out=offsets[1:])
+        hashes = np.concatenate(hash_lists) if hash_lists else np.empty(0, dtype=np.uint64)
+        return cls(
+            np.asarray(ids, dtype=str), np.asarray(lengths, dtype=np.int64),
+            hashes, offsets, kmer_size, sketch_size, hash_type
+        )
+
+    def save(self, path: Union[str, Path]):
+        """
+        Write the sketches to a compact binary .npz file (raw uint64 hashes plus offsets).
+        """
+        np.savez(
+            path, ids=self.ids, lengths=self.lengths, hashes=self.hashes, offsets=self.offsets,
+            params=np.array([self.kmer_size, self.sketch_size], dtype=np.int64), hash_type=np.array(self.hash_type)
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "MinHashSketches":
+        """
+        Read sketches written by save.
+        """
+        with np.load(path) as data:
+            kmer_size, sketch_size = (int(v) for v in data['params'])
+            return cls(
+                data['ids'], data['lengths'], data['hashes'], data['offsets'],
+                kmer_size, sketch_size, str(data['hash_type'])
+            )
+
+def parse_mash_sketch(sketch_path: str) -> MinHashSketches:
+    """
+    Load sketches from a .npz file written by MinHashSketches.save (e.g. by the built-in sketcher),
+    a Mash .msh file (via `mash info -d`, which must be on PATH) or a JSON dump previously
+    written by `mash info -d` (optionally compressed).
+
+    :param sketch_path: Path to the .npz, .msh or JSON file.
+    :return: A MinHashSketches object with one sketch per contig.
+    """
+    with open(sketch_path, 'rb') as handle:
+        if handle.read(4) == NPZ_MAGIC:
+            sketches = MinHashSketches.load(sketch_path)
+            logger.info(f"Loaded {len(sketches)} {sketches.hash_type} sketches (k={sketches.kmer_size}, s={sketches.sketch_size}) from {sketch_path}")
+            return sketches
+
+    with open_input(sketch_path, 'rb') as handle:
+        is_json = handle.read(64).lstrip()[:1] == b'{'
+
+    if is_json:
+        with open_input(sketch_path, 'rt') as handle:
+            dump = json.load(handle)
+    else:
+        mash_exe = shutil.which('mash')
+        if mash_exe is None:
+            raise FileNotFoundError(
+                f"Reading the binary sketch {sketch_path} requires 'mash' on PATH; "
+                f"alternatively pass the output of 'mash info -d {sketch_path}'"
+            )
+        try:
+            result = subprocess.run([mash_exe, 'info', '-d', sketch_path], check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Failed to dump Mash sketch {sketch_path}: {e.stderr}")
+            raise
+        dump = json.loads(result.stdout)
+
+    if dump.get('hashBits', 64) != 64:
+        raise ValueError(f"Only 64-bit Mash sketches are supported ({sketch_path} uses {dump['hashBits']}-bit hashes)")
+
+    records = dump['sketches']
+    sketches = MinHashSketches.from_lists(
+        [r['name'] for r in records],
+        [r['length'] for r in records],
+        [np.array([int(h) for h in r['hashes']], dtype=np.uint64) for r in records],
+        int(dump['kmer']),
+        int(dump['sketchSize']),
+        dump.get('hashType', "MurmurHash3_x64_128")
+    )
+    logger.info(f"Loaded {len(sketches)} Mash sketches (k={sketches.kmer_size}, s={sketches.sketch_size}) from {sketch_path}")
+    return sketches
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Concatenate the index ranges [start, start + count) without a Python loop.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    run_starts = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - run_starts, counts) + np.arange(total, dtype=np.int64)
+
+def sketch_distances(sketches: MinHashSketches, idx1: np.ndarray, idx2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute Mash distances and P-values for a batch of sketch index pairs.
+    The sketches of all pairs are merged in one sort; per pair, only the bottom-s distinct
+    hashes of the union are considered and the shared ones among them are counted.
+
+    :param sketches: MinHashSketches holding both sides of every pair.
+    :param idx1: Sketch indices of the first contig of each pair.
+    :param idx2: Sketch indices of the second contig of each pair.
+    :return: Tuple (distances, p_values) as float64 arrays.
+    """
+    num_pairs = len(idx1)
+    sizes = sketches.sizes
+    sizes1, sizes2 = sizes[idx1], sizes[idx2]
+    values = np.concatenate([
+        sketches.hashes[_ranges(sketches.offsets[idx1], sizes1)],
+        sketches.hashes[_ranges(sketches.offsets[idx2], sizes2)]
+    ])
+    # Batches hold at most a few million hashes, so pair numbers and ranks fit in int32
+    pair_of = np.concatenate([
+        np.repeat(np.arange(num_pairs, dtype=np.int32), sizes1),
+        np.repeat(np.arange(num_pairs, dtype=np.int32), sizes2)
+    ])
+    order = np.lexsort((values, pair_of))
+    values, pair_of = values[order], pair_of[order]
+
+    # A hash present in both sketches appears twice in a row; the second copy is the duplicate
+    duplicate = np.zeros(len(values), dtype=bool)
+    duplicate[1:] = (values[1:] == values[:-1]) & (pair_of[1:] == pair_of[:-1])
+    distinct = ~duplicate
+
+    # Rank of each hash among the distinct hashes of its pair's union (a duplicate shares its rank)
+    distinct_seen = np.cumsum(distinct, dtype=np.int32)
+    pair_starts = np.searchsorted(pair_of, np.arange(num_pairs, dtype=np.int32))
+    rank = distinct_seen - distinct_seen[pair_starts[pair_of]]
+    in_bottom = rank < sketches.sketch_size
+
+    denom = np.bincount(pair_of[distinct & in_bottom], minlength=num_pairs)
+    common = np.bincount(pair_of[duplicate & in_bottom], minlength=num_pairs)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jaccard = np.where(denom > 0, common / np.maximum(denom, 1), 0.0)
+        distances = np.where(common > 0, -np.log(2 * jaccard / (1 + jaccard)) / sketches.kmer_size, 1.0)
+
+        kmer_space = 4.0 ** sketches.kmer_size
+        p_x = 1.0 / (1.0 + kmer_space / sketches.lengths[idx1])
+        p_y = 1.0 / (1.0 + kmer_space / sketches.lengths[idx2])
+        r = p_x * p_y / (p_x + p_y - p_x * p_y)
+        p_values = np.where(common > 0, binom.sf(common - 1, denom, r), 1.0)
+    return distances, p_values
+
+# Per-process sketches for the distance pool
+_POOL_SKETCHES: Dict[str, MinHashSketches] = {}
+
+def _init_distance_worker(sketches: MinHashSketches):
+    _POOL_SKETCHES['sketches'] = sketches
+
+def _distance_task(idx1: np.ndarray, idx2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return sketch_distances(_POOL_SKETCHES['sketches'], idx1, idx2)
+
+def compute_sketch_distances(
+    sketches: MinHashSketches,
+    idx1: np.ndarray,
+    idx2: np.ndarray,
+    threads: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute Mash distances for many pairs, in batches spread over a process pool.
+
+    :param sketches: MinHashSketches holding both sides of every pair.
+    :param idx1: Sketch indices of the first contig of each pair.
+    :param idx2: Sketch indices of the second contig of each pair.
+    :param threads: Number of worker processes.
+    :return: Tuple (distances, p_values) aligned with the input pairs.
+    """
+    if len(idx1) == 0:
+        return np.empty(0), np.empty(0)
+    # Each pair merges up to 2 * sketch_size hashes; larger sketches get smaller batches
+    batch_pairs = max(1, min(SKETCH_PAIR_BATCH, SKETCH_BATCH_HASHES // (2 * max(sketches.sketch_size, 1))))
+    batches = [
+        (idx1[start:start + batch_pairs], idx2[start:start + batch_pairs])
+        for start in range(0, len(idx1), batch_pairs)
+    ]
+    if threads <= 1 or len(batches) == 1:
+        results = [sketch_distances(sketches, b1, b2) for b1, b2 in batches]
+    else:
+        with multiprocessing.Pool(threads, initializer=_init_distance_worker, initargs=(sketches,)) as pool:
+            results = pool.starmap(_distance_task, batches)
+    return np.concatenate([d for d, _ in results]), np.concatenate([p for _, p in results])
+
+def find_candidate_pairs(sketches: MinHashSketches, query_ids: Iterable[str], target_ids: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find (query, target) contig pairs sharing at least one sketch hash using an inverted hash index.
+    Pairs without a shared hash have a Jaccard estimate of 0 (distance 1, P-value 1) and are skipped.
+
+    :param sketches: MinHashSketches.
+    :param query_ids: Contigs to find candidates for.
+    :param target_ids: Contigs that may be paired with a query.
+    :return: Tuple (idx1, idx2) of unique unordered sketch index pairs with idx1 < idx2.
+    """
+    query_idx = sketches.indices_of(query_ids)
+    query_idx = query_idx[query_idx >= 0]
+    target_idx = sketches.indices_of(target_ids)
+    target_idx = np.unique(target_idx[target_idx >= 0])
+
+    sizes = sketches.sizes
+    posting_hashes = sketches.hashes[_ranges(sketches.offsets[target_idx], sizes[target_idx])]
+    posting_owner = np.repeat(target_idx, sizes[target_idx])
+    order = np.argsort(posting_hashes, kind='stable')
+    posting_hashes, posting_owner = posting_hashes[order], posting_owner[order]
+
+    keys = []
+    for start in range(0, len(query_idx), SKETCH_QUERY_BATCH):
+        batch = query_idx[start:start + SKETCH_QUERY_BATCH]
+        query_hashes = sketches.hashes[_ranges(sketches.offsets[batch], sizes[batch])]
+        query_owner = np.repeat(batch, sizes[batch])
+        left = np.searchsorted(posting_hashes, query_hashes, side='left')
+        counts = np.searchsorted(posting_hashes, query_hashes, side='right') - left
+        partners = posting_owner[_ranges(left, counts)]
+        owners = np.repeat(query_owner, counts)
+        keep = partners != owners
+        low = np.minimum(owners[keep], partners[keep])
+        high = np.maximum(owners[keep], partners[keep])
+        keys.append(np.unique((low << 32) | high))
+
+    keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+    return keys >> 32, keys & 0xFFFFFFFF
+
+def sketch_distance_lookup(
+    sketches: MinHashSketches,
+    keep_pairs: Iterable[Tuple[str, str]],
+    candidates: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    max_distance: Optional[float] = None,
+    max_p_value: float = MASH_MAX_P_VALUE,
+    threads: int = 1
+) -> MashDistanceMatrix:
+    """
+    Compute Mash distances from sketches for the queried pairs only and store them
+    in a MashDistanceMatrix, applying the same P-value filter as parse_mash.
+
+    :param sketches: MinHashSketches.
+    :param keep_pairs: ID pairs stored at any distance (e.g. overlapping pairs).
+    :param candidates: Sketch index pairs (from find_candidate_pairs) stored only below max_distance.
+    :param max_distance: Exclusive distance threshold for candidate pairs.
+    :param max_p_value: Exclusive P-value cutoff.
+    :param threads: Number of worker processes.
+    :return: A MashDistanceMatrix over the sketch IDs.
+    """
+    keep_pairs = list(keep_pairs)
+    keep1 = sketches.indices_of(p[0] for p in keep_pairs)
+    keep2 = sketches.indices_of(p[1] for p in keep_pairs)
+    valid = (keep1 >= 0) & (keep2 >= 0) & (keep1 != keep2)
+    keep_keys = np.unique((np.minimum(keep1, keep2) << 32 | np.maximum(keep1, keep2))[valid])
+
+    keys = keep_keys
+    if candidates is not None:
+        candidate_keys = (candidates[0] << 32) | candidates[1]
+        keys = np.union1d(keep_keys, candidate_keys)
+
+    low, high = keys >> 32, keys & 0xFFFFFFFF
+    distances, p_values = compute_sketch_distances(sketches, low, high, threads)
+
+    stored = p_values < max_p_value
+    if candidates is not None:
+        required = np.isin(keys, keep_keys)
+        stored &= required | (distances < max_distance if max_distance is not None else True)
+
+    logger.info(f"Computed {len(keys)} Mash distances from sketches; stored {int(stored.sum())} pairs")
+    return MashDistanceMatrix.from_pairs(sketches.ids, low[stored], high[stored], distances[stored])
@@ -0,0 +1,171 @@
+"""
+Built-in MinHash sketcher for FilterHaplotypes.
+Streams the assembly FASTA and computes a bottom-s MinHash sketch of the canonical k-mers of
+each contig in a process pool, so Mash distances can be derived without running `mash`.
+K-mers are 2-bit encoded and hashed with vectorized NumPy operations.
+"""
+
+import logging
+import multiprocessing
+from typing import List, Tuple
+
+import numpy as np
+
+from src.filter_haplotypes.parsers.fasta_parser import iter_fasta_sequences
+from src.filter_haplotypes.parsers.sketch_parser import MinHashSketches
+
+logger = logging.getLogger(__name__)
+
+SKETCH_HASH_TYPE = "splitmix64"
+DEFAULT_KMER_SIZE = 21
+DEFAULT_SKETCH_SIZE = 1000
+DEFAULT_SEED = 42
+# Sequence is sketched in windows of this many bases to bound the memory of long contigs
+SKETCH_WINDOW = 1 << 22
+# Bases submitted to the pool per batch of contigs
+SKETCH_BATCH_BASES = 1 << 26
+
+# A, C, G, T (either case) map to 0-3; every other byte marks an invalid k-mer
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate((b'Aa', b'Cc', b'Gg', b'Tt')):
+    for _base in _bases:
+        BASE_CODES[_base] = _code
+
+def hash_kmers(kmers: np.ndarray, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    Hash 2-bit encoded k-mers with the splitmix64 finalizer.
+
+    :param kmers: uint64 array of encoded k-mers.
+    :param seed: Hash seed.
+    :return: uint64 array of hashes.
+    """
+    with np.errstate(over='ignore'):
+        x = kmers + np.uint64((seed * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+def canonical_kmers(codes: np.ndarray, kmer_size: int) -> np.ndarray:
+    """
+    Encode every valid k-mer of a base-code array as the minimum of its forward and
+    reverse-complement 2-bit encodings. K-mers containing an invalid base are skipped.
+
+    :param codes: uint8 array from BASE_CODES.
+    :param kmer_size: K-mer length (1-32).
+    :return: uint64 array of canonical k-mers.
+    """
+    num_kmers = len(codes) - kmer_size + 1
+    if num_kmers <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    invalid = np.concatenate([[0], np.cumsum(codes == 4)])
+    valid = (invalid[kmer_size:] - invalid[:-kmer_size]) == 0
+
+    # Build encodings of blocks of 1, 2, 4, ... bases by doubling and append the blocks
+    # selected by the binary representation of kmer_size: O(L log k) instead of O(L k)
+    block_forward = np.where(codes == 4, 0, codes).astype(np.uint64)
+    block_reverse = np.uint64(3) - block_forward
+    forward = reverse = None
+    filled, block_size, remaining = 0, 1, kmer_size
+    while remaining:
+        if remaining & 1:
+            block = block_forward[filled:filled + num_kmers]
+            rc_block = block_reverse[filled:filled + num_kmers]
+            if forward is None:
+                forward, reverse = block.copy(), rc_block.copy()
+            else:
+                forward = (forward << np.uint64(2 * block_size)) | block
+                reverse = reverse | (rc_block << np.uint64(2 * filled))
+            filled += block_size
+        remaining >>= 1
+        if remaining:
+            span = len(block_forward) - block_size
+            shift = np.uint64(2 * block_size)
+            block_forward = (block_forward[:span] << shift) | block_forward[block_size:block_size + span]
+            block_reverse = block_reverse[:span] | (block_reverse[block_size:block_size + span] << shift)
+            block_size *= 2
+    return np.minimum(forward, reverse)[valid]
+
+def bottom_hashes(hashes: np.ndarray, sketch_size: int) -> np.ndarray:
+    """
+    Select the sketch_size smallest distinct hashes without sorting the whole array.
+
+    :param hashes: uint64 array of hashes (may contain duplicates).
+    :param sketch_size: Number of distinct hashes to keep.
+    :return: Sorted uint64 array of at most sketch_size distinct hashes.
+    """
+    candidates = sketch_size
+    while candidates < len(hashes):
+        # The smallest values (with multiplicity) hold the bottom distinct hashes once enough are distinct
+        smallest = np.unique(np.partition(hashes, candidates - 1)[:candidates])
+        if len(smallest) >= sketch_size:
+            return smallest[:sketch_size]
+        candidates *= 2
+    return np.unique(hashes)[:sketch_size]
+
+def sketch_sequence(sequence: bytes, kmer_size: int, sketch_size: int, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """
+    Compute the bottom-s MinHash sketch of one sequence.
+
+    :param sequence: Sequence bytes.
+    :param kmer_size: K-mer length (1-32).
+    :param sketch_size: Maximum number of hashes kept.
+    :param seed: Hash seed.
+    :return: Sorted uint64 array of at most sketch_size distinct hashes.
+    """
+    codes = BASE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+    sketch = np.empty(0, dtype=np.uint64)
+    # Consecutive windows overlap by k - 1 bases so no k-mer is lost at a boundary
+    for start in range(0, max(len(codes) - kmer_size + 1, 1), SKETCH_WINDOW):
+        window = codes[start:start + SKETCH_WINDOW + kmer_size - 1]
+        hashes = np.concatenate([sketch, hash_kmers(canonical_kmers(window, kmer_size), seed)])
+        sketch = bottom_hashes(hashes, sketch_size)
+    return sketch
+
+def _sketch_record(query_id: str, sequence: bytes, kmer_size: int, sketch_size: int, seed: int) -> Tuple[str, int, np.ndarray]:
+    return query_id, len(sequence), sketch_sequence(sequence, kmer_size, sketch_size, seed)
+
+def sketch_fasta(
+    fasta_path: str,
+    kmer_size: int = DEFAULT_KMER_SIZE,
+    sketch_size: int = DEFAULT_SKETCH_SIZE,
+    threads: int = 1,
+    seed: int = DEFAULT_SEED
+) -> MinHashSketches:
+    """
+    Stream a FASTA file and compute one MinHash sketch per contig in a process pool.
+
+    :param fasta_path: Path to the FASTA file (optionally gzip, BGZF or Zstandard compressed).
+    :param kmer_size: K-mer length (1-32).
+    :param sketch_size: Number of hashes per sketch.
+    :param threads: Number of worker processes.
+    :param seed: Hash seed.
+    :return: A MinHashSketches object with one sketch per contig.
+    """
+    if not 1 <= kmer_size <= 32:
+        raise ValueError(f"k-mer size must be between 1 and 32 (got {kmer_size})")
+
+    ids: List[str] = []
+    lengths: List[int] = []
+    hash_lists: List[np.ndarray] = []
+
+    def collect(results):
+        for query_id, length, sketch in results:
+            ids.append(query_id)
+            lengths.append(length)
+            hash_lists.append(sketch)
+
+    with multiprocessing.Pool(processes=threads) as pool:
+        batch, batch_bases = [], 0
+        for query_id, sequence in iter_fasta_sequences(fasta_path, threads):
+            batch.append((query_id, sequence, kmer_size, sketch_size, seed))
+            batch_bases += len(sequence)
+            if batch_bases >= SKETCH_BATCH_BASES:
+                collect(pool.starmap(_sketch_record, batch))
+                batch, batch_bases = [], 0
+        if batch:
+            collect(pool.starmap(_sketch_record, batch))
+
+    sketches = MinHashSketches.from_lists(ids, lengths, hash_lists, kmer_size, sketch_size, SKETCH_HASH_TYPE)
+    logger.info(f"Sketched {len(sketches)} contigs (k={kmer_size}, s={sketch_size})")
+    return sketches
@@ -0,0 +1,287 @@
+"""
+File input utilities for FilterHaplotypes.
+Transparently opens plain, gzip, BGZF and Zstandard compressed inputs,
+decompressing BGZF blocks in parallel worker threads, and writes BGZF output
+compressed in parallel with its .gzi index.
+"""
+
+import gzip
+import io
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Fixed BGZF header fields: gzip magic, deflate, FEXTRA flag and the 'BC' subfield
+BGZF_HEADER_SIZE = 18
+BGZF_BLOCKS_PER_BATCH = 64
+# Uncompressed bytes per output block (as in htslib), so even incompressible data fits in 64 KiB
+BGZF_BLOCK_DATA_SIZE = 0xff00
+# Empty block terminating every BGZF file
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# Largest single copy_file_range/sendfile request and the read-write fallback buffer
+COPY_CHUNK_SIZE = 1 << 30
+COPY_BUFFER_SIZE = 1 << 23
+
+def detect_compression(path: Union[str, Path]) -> Optional[str]:
+    """
+    Detect the compression format of a file from its magic bytes.
+
+    :param path: Path to the file.
+    :return: 'bgzf', 'gzip', 'zstd' or None for uncompressed files.
+    """
+    with open(path, 'rb') as fh:
+        header = fh.read(BGZF_HEADER_SIZE)
+
+    if header[:4] == ZSTD_MAGIC:
+        return 'zstd'
+    if header[:2] == GZIP_MAGIC:
+        # BGZF: FEXTRA set with a 'BC' subfield of length 2 (SAM/BAM specification)
+        if len(header) == BGZF_HEADER_SIZE and header[3] & 4 and header[12:14] == b'BC' and header[14:16] == b'\x02\x00':
+            return 'bgzf'
+        return 'gzip'
+    return None
+
+def _inflate_bgzf_block(block: bytes) -> bytes:
+    """
+    Decompress a single BGZF block (zlib releases the GIL, so blocks inflate in parallel).
+    """
+    xlen = struct.unpack_from('<H', block, 10)[0]
+    payload = block[12 + xlen:-8]
+    data = zlib.decompress(payload, -15)
+    expected_size = struct.unpack_from('<I', block, len(block) - 4)[0]
+    if len(data) != expected_size:
+        raise ValueError(f"Corrupt BGZF block: expected {expected_size} bytes, got {len(data)}")
+    return data
+
+def _iter_bgzf_blocks(fh: IO[bytes]) -> Iterator[bytes]:
+    """
+    Yield raw (compressed) BGZF blocks from a binary file handle.
+    """
+    while True:
+        header = fh.read(BGZF_HEADER_SIZE)
+        if not header:
+            return
+        if len(header) < BGZF_HEADER_SIZE or header[:2] != GZIP_MAGIC or header[12:14] != b'BC':
+            raise ValueError("Invalid BGZF block header")
+        block_size = struct.unpack_from('<H', header, 16)[0] + 1
+        rest = fh.read(block_size - BGZF_HEADER_SIZE)
+        if len(rest) != block_size - BGZF_HEADER_SIZE:
+            raise ValueError("Truncated BGZF block")
+        yield header + rest
+
+def _deflate_bgzf_block(data: bytes, level: int = 6) -> bytes:
+    """
+    Compress data into a single BGZF block (zlib releases the GIL, so blocks deflate in parallel).
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    # BSIZE is the total block size minus one: 18 header bytes + payload + 8 trailer bytes
+    header = GZIP_MAGIC + b'\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack('<H', len(payload) + 25)
+    return header + payload + struct.pack('<II', zlib.crc32(data), len(data))
+
+class BgzfReader(io.RawIOBase):
+    """
+    Read-only binary stream over a BGZF file that inflates batches of blocks in a thread pool.
+    """
+
+    def __init__(self, path: Union[str, Path], threads: int = 1):
+        super().__init__()
+        self._fh = open(path, 'rb')
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads)) if threads > 1 else None
+        self._pending = iter(())
+        self._buffer = memoryview(b'')
+        self._blocks = _iter_bgzf_blocks(self._fh)
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_batch(self) -> bool:
+        batch = []
+        for block in self._blocks:
+            batch.append(block)
+            if len(batch) >= BGZF_BLOCKS_PER_BATCH:
+                break
+        if not batch:
+            return False
+        if self._executor is not None:
+            self._pending = iter(list(self._executor.map(_inflate_bgzf_block, batch)))
+        else:
+            self._pending = map(_inflate_bgzf_block, batch)
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            data = next(self._pending, None)
+            if data is None:
+                if not self._next_batch():
+                    return 0
+                continue
+            self._buffer = memoryview(data)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._fh.close()
+        super().close()
+
+class BgzfWriter(io.RawIOBase):
+    """
+    Write-only binary stream producing a BGZF file; batches of blocks are deflated in a thread pool.
+    The start of every block is recorded for the .gzi index.
+    """
+
+    def __init__(self, path: Union[str, Path], threads: int = 1, level: int = 6):
+        super().__init__()
+        self._fh = open(path, 'wb')
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads)) if threads > 1 else None
+        self._level = level
+        self._buffer = bytearray()
+        self._compressed_offset = 0
+        self._uncompressed_offset = 0
+        # (compressed, uncompressed) offsets of the start of every data block
+        self.block_offsets: List[Tuple[int, int]] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= BGZF_BLOCK_DATA_SIZE * BGZF_BLOCKS_PER_BATCH:
+            self._write_blocks(final=False)
+        return len(data)
+
+    def _write_blocks(self, final: bool):
+        num_blocks = len(self._buffer) // BGZF_BLOCK_DATA_SIZE
+        if final and len(self._buffer) % BGZF_BLOCK_DATA_SIZE:
+            num_blocks += 1
+        chunks = [
+            bytes(self._buffer[i * BGZF_BLOCK_DATA_SIZE:(i + 1) * BGZF_BLOCK_DATA_SIZE])
+            for i in range(num_blocks)
+        ]
+        del self._buffer[:num_blocks * BGZF_BLOCK_DATA_SIZE]
+        levels = [self._level] * len(chunks)
+        if self._executor is not None:
+            blocks = self._executor.map(_deflate_bgzf_block, chunks, levels)
+        else:
+            blocks = map(_deflate_bgzf_block, chunks, levels)
+        for chunk, block in zip(chunks, blocks):
+            self.block_offsets.append((self._compressed_offset, self._uncompressed_offset))
+            self._fh.write(block)
+            self._compressed_offset += len(block)
+            self._uncompressed_offset += len(chunk)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._write_blocks(final=True)
+                self._fh.write(BGZF_EOF)
+            finally:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                self._fh.close()
+        super().close()
+
+    def write_gzi(self, path: Union[str, Path]):
+        """
+        Write the .gzi index (as 'bgzip -i'): the entry count, then the compressed and
+        uncompressed offsets of every block after the first, all little-endian uint64.
+        """
+        entries = self.block_offsets[1:]
+        with open(path, 'wb') as fh:
+            fh.write(struct.pack('<Q', len(entries)))
+            for compressed, uncompressed in entries:
+                fh.write(struct.pack('<QQ', compressed, uncompressed))
+
+def open_input(path: Union[str, Path], mode: str = 'rt', threads: int = 1, encoding: str = 'utf-8') -> IO:
+    """
+    Open a possibly compressed input file (plain, gzip, BGZF or Zstandard) for reading.
+    The format is detected from the file content, not the extension.
+
+    :param path: Path to the input file.
+    :param mode: 'rt' for a text stream or 'rb' for a binary stream.
+    :param threads: Number of threads used to decompress BGZF blocks.
+    :param encoding: Text encoding used in 'rt' mode.
+    :return: A readable file object.
+    """
+    if mode not in ('rt', 'rb'):
+        raise ValueError(f"Unsupported mode '{mode}'; use 'rt' or 'rb'")
+
+    compression = detect_compression(path)
+    if compression == 'bgzf':
+        raw = io.BufferedReader(BgzfReader(path, threads), buffer_size=1 << 20)
+    elif compression == 'gzip':
+        raw = gzip.open(path, 'rb')
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(f"Reading Zstandard-compressed {path} requires the 'zstandard' package (pip install zstandard)") from e
+        raw = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), buffer_size=1 << 20)
+    else:
+        raw = open(path, 'rb', buffering=1 << 20)
+
+    if mode == 'rb':
+        return raw
+    return io.TextIOWrapper(raw, encoding=encoding)
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """
+    Copy up to count bytes from src_fd at offset to the current position of dst_fd,
+    preferring in-kernel copies (copy_file_range, then sendfile) over read/write.
+
+    :return: Number of bytes copied (0 at the end of the source).
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count, offset)
+        except OSError:
+            pass
+    if hasattr(os, 'sendfile'):
+        try:
+            return os.sendfile(dst_fd, src_fd, offset, count)
+        except OSError:
+            pass
+    data = memoryview(os.pread(src_fd, min(count, COPY_BUFFER_SIZE), offset))
+    copied = len(data)
+    while data:
+        data = data[os.write(dst_fd, data):]
+    return copied
+
+def copy_byte_ranges(src_path: Union[str, Path], dst: IO[bytes], ranges: Iterable[Tuple[int, int]]) -> int:
+    """
+    Append byte ranges of an uncompressed file to an open binary file without passing
+    the data through Python where the platform allows it.
+
+    :param src_path: Path to the source file.
+    :param dst: Destination opened for binary writing (flushed before copying).
+    :param ranges: (start, end) byte ranges, copied in the given order.
+    :return: Number of bytes copied.
+    """
+    dst.flush()
+    dst_fd = dst.fileno()
+    total = 0
+    with open(src_path, 'rb') as src:
+        src_fd = src.fileno()
+        for start, end in ranges:
+            offset = start
+            while offset < end:
+                copied = _copy_range(src_fd, dst_fd, offset, min(end - offset, COPY_CHUNK_SIZE))
+                if copied == 0:
+                    raise ValueError(f"{src_path} ended at byte {offset}, before the end of range {start}-{end}")
+                offset += copied
+            total += end - start
+    # Keep the file object's position in step with the descriptor
+    dst.seek(0, io.SEEK_END)
+    return total
@@ -3,16 +3,20 @@ Report generation module for FilterHaplotypes.
 Generates the final TSV summary, filtered FASTA, and interactive HTML dashboard.
 """
 
-from Bio import SeqIO
+import logging
 import plotly.graph_objects as go
 import multiprocessing
 from jinja2 import Environment, FileSystemLoader
 from pathlib import Path
-from typing import List, Dict, Any, Set
-from src.filter_haplotypes.core.models import ContigSummary, Status
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple, Union
+from src.filter_haplotypes.core.models import ContigStore, ContigSummary, Status
 from src.filter_haplotypes.utils.stats import calculate_assembly_stats, calculate_l_curve
+from src.filter_haplotypes.utils.file_io import open_input, copy_byte_ranges, BgzfWriter, COPY_BUFFER_SIZE
+from src.filter_haplotypes.parsers.fasta_parser import FastaIndex, FastaIndexer, FastaReader, iter_retained_records
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 def process_contig_metrics(c: ContigSummary) -> Dict[str, Any]:
     """
     Calculate individual metrics for a contig in parallel.
@@ -40,8 +44,17 @@ def process_contig_metrics(c: ContigSummary) -> Dict[str, Any]:
         'Unique_retain': c.retained_reason['Unique']
     }
 
+def process_contig_chunk(contigs: ContigStore) -> List[Dict[str, Any]]:
+    """
+    Calculate the metrics of a chunk of contigs.
+
+    :param contigs: ContigStore subset.
+    :return: List of metric dictionaries, in store order.
+    """
+    return [process_contig_metrics(c) for c in contigs]
+
 def generate_report(
-    summary_list: List[ContigSummary],
+    summary_list: Union[ContigStore, List[ContigSummary]],
     overlap_distances: List[float],
     distance_threshold: float,
     stats_initial: Dict[str, Any],
@@ -49,12 +62,13 @@ def generate_report(
     busco_filtered: Dict[str, Any],
     output_dir: Path,
     threads: int = 1,
-    run_parameters: Dict[str, Any] = None
+    run_parameters: Dict[str, Any] = None,
+    busco_phases: List[Tuple[str, Dict[str, int]]] = None
 ):
     """
     Phase 7 Step 10: Generate all output files and the interactive HTML report.
     
-    :param summary_list: Final list of ContigSummary objects.
+    :param summary_list: Final ContigStore (or list of ContigSummary objects).
     :param overlap_distances: List of Mash distances used for thresholding.
     :param distance_threshold: Final Mash distance threshold.
     :param stats_initial: Initial assembly stats.
@@ -63,12 +77,16 @@ def generate_report(
     :param output_dir: Directory to save outputs.
     :param threads: Number of threads for parallel metric calculation.
     :param run_parameters: Dictionary of configurable parameters used for the run.
+    :param busco_phases: BUSCO completeness snapshots (phase, counts) taken during filtering.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # 1. Calculate individual contig metrics in parallel (Phase 7 Requirement)
+    if not isinstance(summary_list, ContigStore):
+        summary_list = ContigStore.from_summaries(summary_list)
+
+    # 1. Calculate individual contig metrics in parallel (Phase 7 Requirement), one store chunk per task
     with multiprocessing.Pool(processes=threads) as pool:
-        summary_data = pool.map(process_contig_metrics, summary_list)
+        summary_data = [metrics for chunk in pool.map(process_contig_chunk, summary_list.chunks(4 * threads)) for metrics in chunk]
     
     df_summary = pd.DataFrame(summary_data)
     df_summary.to_csv(output_dir / 'summary_report.tsv', sep='\t', index=False, encoding='utf-8')
@@ -159,28 +177,114 @@ def generate_report(
         l_curve_json=l_curve_json,
         gc_plot_json=gc_plot_json,
         distance_threshold=distance_threshold,
-        run_parameters=run_parameters if run_parameters else {}
+        run_parameters=run_parameters if run_parameters else {},
+        busco_phases=busco_phases if busco_phases else []
     )
     
     with open(output_dir / 'report.html', 'w', encoding='utf-8') as f:
         f.write(html_content)
 
+def _retained_ranges(reader: FastaReader, retained_ids: Set[str]) -> List[Tuple[int, int]]:
+    """
+    Byte ranges of the retained records in file order, with adjacent records merged.
+    """
+    ranges: List[Tuple[int, int]] = []
+    for i, name in enumerate(reader.index.names):
+        if name not in retained_ids:
+            continue
+        start, end = reader.record_range(i)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+def _iter_retained_bytes(
+    input_fasta: Path,
+    retained_ids: Set[str],
+    threads: int,
+    fasta_index: Optional[FastaIndex]
+) -> Iterator[bytes]:
+    """
+    Stream the raw bytes of the retained records, by byte range when an index is available.
+    """
+    if fasta_index is not None:
+        with FastaReader(input_fasta, fasta_index) as reader:
+            for start, end in _retained_ranges(reader, retained_ids):
+                for offset in range(start, end, COPY_BUFFER_SIZE):
+                    yield reader.read_range(offset, min(offset + COPY_BUFFER_SIZE, end))
+    else:
+        with open_input(input_fasta, 'rb', threads) as handle:
+            yield from iter_retained_records(handle, retained_ids)
+
+def _write_bgzf_fasta(
+    input_fasta: Path,
+    output_fasta: Path,
+    retained_ids: Set[str],
+    threads: int,
+    fasta_index: Optional[FastaIndex]
+):
+    """
+    Write the retained records as BGZF (blocks deflated in parallel) along with the
+    '.fai' and '.gzi' indexes expected by samtools faidx, in a single pass.
+    """
+    indexer = FastaIndexer()
+    last_byte = b'\n'
+    with BgzfWriter(output_fasta, threads) as writer:
+        for piece in _iter_retained_bytes(input_fasta, retained_ids, threads, fasta_index):
+            writer.write(piece)
+            indexer.update(piece)
+            last_byte = piece[-1:]
+        if last_byte != b'\n':
+            writer.write(b'\n')
+            indexer.update(b'\n')
+    writer.write_gzi(f"{output_fasta}.gzi")
+
+    output_index = indexer.finish()
+    if output_index is not None:
+        output_index.save(f"{output_fasta}.fai")
+    else:
+        logger.warning(f"{output_fasta}.fai not written: retained records have irregular line lengths")
+
 def write_filtered_fasta(
     input_fasta: Path,
     output_fasta: Path,
-    retained_ids: Set[str]
+    retained_ids: Set[str],
+    threads: int = 1,
+    fasta_index: Optional[FastaIndex] = None,
+    bgzip: bool = False
 ):
     """
-    Write sequences of retained contigs to a new FASTA file.
+    Copy the records of retained contigs verbatim (headers and line layout) to a new FASTA file.
+    With an index, the byte ranges of the retained records are copied without parsing;
+    otherwise the input is streamed once. Memory use does not grow with the assembly size.
     
-    :param input_fasta: Path to the original FASTA.
+    :param input_fasta: Path to the original FASTA (optionally gzip, BGZF or Zstandard compressed).
     :param output_fasta: Path to the output FASTA.
     :param retained_ids: Set of query_ids to retain.
+    :param threads: Number of threads for BGZF decompression (and compression).
+    :param fasta_index: FastaIndex of an uncompressed input (from scan_fasta).
+    :param bgzip: Write BGZF-compressed output with '.fai' and '.gzi' indexes next to it.
     """
-    retained_records = []
-    for record in SeqIO.parse(input_fasta, "fasta"):
-        if record.id in retained_ids:
-            retained_records.append(record)
-            
-    with open(output_fasta, "w", encoding='utf-8') as f:
-        SeqIO.write(retained_records, f, "fasta")
+    if bgzip:
+        _write_bgzf_fasta(input_fasta, output_fasta, retained_ids, threads, fasta_index)
+        return
+
+    last_byte = b'\n'
+    with open(output_fasta, "wb") as f:
+        if fasta_index is not None:
+            with FastaReader(input_fasta, fasta_index) as reader:
+                ranges = _retained_ranges(reader, retained_ids)
+            copy_byte_ranges(input_fasta, f, ranges)
+            if ranges:
+                with open(input_fasta, 'rb') as src:
+                    src.seek(ranges[-1][1] - 1)
+                    last_byte = src.read(1)
+        else:
+            with open_input(input_fasta, 'rb', threads) as handle:
+                for piece in iter_retained_records(handle, retained_ids):
+                    f.write(piece)
+                    last_byte = piece[-1:]
+        # The last record of the input may lack a trailing newline
+        if last_byte != b'\n':
+            f.write(b'\n')
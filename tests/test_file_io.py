@@ -0,0 +1,132 @@
+import gzip
+import struct
+import zlib
+
+import pytest
+
+from src.filter_haplotypes.utils import file_io
+from src.filter_haplotypes.utils.file_io import detect_compression, open_input, copy_byte_ranges
+from src.filter_haplotypes.parsers.paf_parser import parse_paf
+from src.filter_haplotypes.parsers.fasta_parser import scan_fasta, FastaIndex
+from src.filter_haplotypes.visualization.report_generator import write_filtered_fasta
+
+def write_bgzf(path, data: bytes, block_size: int = 100):
+    # Minimal BGZF writer: independent deflate blocks with a 'BC' extra subfield and an EOF block
+    with open(path, 'wb') as fh:
+        for i in range(0, len(data) + 1, block_size):
+            chunk = data[i:i + block_size]
+            if not chunk and i > 0:
+                break
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            payload = compressor.compress(chunk) + compressor.flush()
+            bsize = 18 + len(payload) + 8 - 1
+            fh.write(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' + struct.pack('<H', bsize))
+            fh.write(payload)
+            fh.write(struct.pack('<II', zlib.crc32(chunk), len(chunk)))
+        fh.write(bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000'))
+
+PAF_TEXT = "".join(
+    f"q{i}\t1000\t0\t500\t+\tt1\t5000\t{i * 10}\t{i * 10 + 500}\t450\t500\t60\ttp:A:P\tAS:i:{i}\n"
+    for i in range(50)
+)
+
+def test_detect_and_open_compressed_inputs(tmp_path):
+    plain = tmp_path / "plain.paf"
+    plain.write_text(PAF_TEXT)
+    gz = tmp_path / "plain.paf.gz"
+    gz.write_bytes(gzip.compress(PAF_TEXT.encode()))
+    bgzf = tmp_path / "blocks.paf.gz"
+    write_bgzf(bgzf, PAF_TEXT.encode())
+
+    assert detect_compression(plain) is None
+    assert detect_compression(gz) == 'gzip'
+    assert detect_compression(bgzf) == 'bgzf'
+
+    for path in (plain, gz, bgzf):
+        for threads in (1, 4):
+            with open_input(path, 'rt', threads) as handle:
+                assert handle.read() == PAF_TEXT
+
+def test_parse_paf_bgzf_matches_plain(tmp_path):
+    plain = tmp_path / "plain.paf"
+    plain.write_text(PAF_TEXT)
+    bgzf = tmp_path / "blocks.paf.gz"
+    write_bgzf(bgzf, PAF_TEXT.encode(), block_size=333)
+
+    expected = parse_paf(str(plain), min_mq=10)
+    result = parse_paf(str(bgzf), min_mq=10, chunksize=7, threads=3)
+    assert result.astype(str).equals(expected.astype(str))
+
+def test_open_zstd_input(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "plain.paf.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(PAF_TEXT.encode()))
+
+    assert detect_compression(path) == 'zstd'
+    with open_input(path, 'rt') as handle:
+        assert handle.read() == PAF_TEXT
+
+def test_copy_byte_ranges(tmp_path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(bytes(range(256)) * 10)
+    dst = tmp_path / "dst.bin"
+    with open(dst, 'wb') as fh:
+        fh.write(b'head')
+        assert copy_byte_ranges(src, fh, [(10, 20), (300, 302)]) == 12
+        fh.write(b'tail')
+    assert dst.read_bytes() == b'head' + bytes(range(10, 20)) + bytes([300 % 256, 301 % 256]) + b'tail'
+
+def test_write_filtered_fasta_copies_records(tmp_path):
+    records = [b">a one\nACGT\nAC\n", b">b\nGGGG\nGG\n", b">c\nTTTT\n", b">d two\nCCCC\nC"]
+    expected = records[0] + records[1] + records[3] + b"\n"
+    retained = {'a', 'b', 'd'}
+
+    regular = tmp_path / "regular.fasta"
+    regular.write_bytes(b"".join(records))
+    # Lines of varying width: no index, the input is streamed instead
+    irregular = tmp_path / "irregular.fasta"
+    irregular.write_bytes(b"".join(records[:2]) + b">c\nTT\nTTT\n" + records[3])
+    compressed = tmp_path / "regular.fasta.bgz"
+    write_bgzf(compressed, b"".join(records), block_size=7)
+
+    for path in (regular, irregular, compressed):
+        _, index = scan_fasta(str(path))
+        assert (index is not None) == (path == regular)
+        output = tmp_path / f"{path.name}.out"
+        write_filtered_fasta(path, output, retained, fasta_index=index)
+        assert output.read_bytes() == expected
+
+def test_write_filtered_fasta_bgzip(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_io, "BGZF_BLOCK_DATA_SIZE", 16)
+    records = [b">a one\nACGTACGT\nACGTAC\n", b">b\nGGGGGGGG\nGG\n", b">c\nTTTTTTTT\n", b">d two\nCCCCCCCC\nC"]
+    fasta_path = tmp_path / "contigs.fasta"
+    fasta_path.write_bytes(b"".join(records))
+    expected = records[0] + records[1] + records[3] + b"\n"
+
+    _, index = scan_fasta(str(fasta_path))
+    output = tmp_path / "filtered.fasta.gz"
+    write_filtered_fasta(fasta_path, output, {'a', 'b', 'd'}, threads=2, fasta_index=index, bgzip=True)
+
+    assert detect_compression(output) == 'bgzf'
+    assert gzip.decompress(output.read_bytes()) == expected
+    with open_input(output, 'rb') as fh:
+        assert fh.read() == expected
+
+    # The .fai describes the uncompressed output
+    fai = FastaIndex.load(f"{output}.fai")
+    assert fai.names == ['a', 'b', 'd']
+    assert fai.lengths.tolist() == [14, 10, 9]
+    assert fai.offsets.tolist() == [7, 26, 45]
+    assert fai.line_bases.tolist() == [8, 8, 8]
+    assert fai.line_widths.tolist() == [9, 9, 9]
+
+    # Every .gzi entry points at a block starting at the given uncompressed offset
+    gzi = (tmp_path / "filtered.fasta.gz.gzi").read_bytes()
+    num_entries = struct.unpack_from('<Q', gzi)[0]
+    assert num_entries == (len(expected) - 1) // 16
+    data = output.read_bytes()
+    for i in range(num_entries):
+        compressed, uncompressed = struct.unpack_from('<QQ', gzi, 8 + 16 * i)
+        assert uncompressed == 16 * (i + 1)
+        block_size = struct.unpack_from('<H', data, compressed + 16)[0] + 1
+        assert gzip.decompress(data[compressed:compressed + block_size]) == expected[uncompressed:uncompressed + 16]
@@ -1,14 +1,55 @@
 import pytest
 import pandas as pd
-from src.filter_haplotypes.core.models import ContigSummary, Status
+import pickle
+from src.filter_haplotypes.core.models import ContigStore, ContigSummary, Status, BuscoCarrierIndex
 from src.filter_haplotypes.core.filtering import (
+    calculate_initial_redundancy,
     tile_and_score_contig,
+    tile_and_score_alignments,
     estimate_distance_threshold,
     run_tournament_on_target,
     screen_unaligned_contig,
     count_unique_single_copy_orthologs,
-    get_adjusted_score
+    get_adjusted_score,
+    get_overlapping_pairs,
+    get_overlapping_pairs_with_lengths,
+    build_competition_graph
 )
+from src.filter_haplotypes.parsers.mash_parser import build_mash_lookup
+
+def test_calculate_initial_redundancy():
+    summaries = [
+        ContigSummary(query_id='Q1', query_length=1000, status=Status.ALIGNED_RETAINED),
+        ContigSummary(query_id='Q2', query_length=1000, status=Status.ALIGNED_RETAINED),
+        ContigSummary(query_id='Q3', query_length=1000, status=Status.ALIGNED_DISCARDED),
+    ]
+    # Q1: [100, 300) and [200, 400) overlap by 100, [150, 250) adds a third layer that is
+    # still counted once; [400, 500) only touches. Q3 is not retained and is skipped.
+    df = pd.DataFrame({
+        'query_id': ['Q1', 'Q2', 'Q1', 'Q3', 'Q1', 'Q1'],
+        'target_start': [100, 0, 200, 0, 150, 400],
+        'target_end': [300, 100, 400, 100, 250, 500]
+    })
+    df['query_id'] = df['query_id'].astype('category')
+
+    calculate_initial_redundancy(summaries, df.iloc[:0].copy())
+    assert [s.initial_overlapping_bases for s in summaries] == [0, 0, 0]
+
+    calculate_initial_redundancy(summaries, pd.concat([df, df.iloc[[3]]]))
+
+    assert summaries[0].initial_overlapping_bases == 150
+    assert summaries[1].initial_overlapping_bases == 0
+    assert summaries[2].initial_overlapping_bases == 0
+
+    # Coordinates beyond 2^32 (int64 PAF columns) stay within their own contig
+    big = 5_000_000_000
+    df = pd.DataFrame({
+        'query_id': pd.Categorical(['Q1', 'Q1', 'Q2', 'Q2']),
+        'target_start': [big, big + 100, 0, 50],
+        'target_end': [big + 200, big + 300, 100, 200]
+    })
+    calculate_initial_redundancy(summaries, df)
+    assert [s.initial_overlapping_bases for s in summaries[:2]] == [100, 50]
 
 def test_tile_and_score_contig():
     # Create a mock query group
@@ -39,6 +80,48 @@ def test_tile_and_score_contig():
     assert score == (300 + 250) / 1000
     assert tiled_out == 1
 
+def test_tile_and_score_contig_overlap_tolerance():
+    # Overlaps of exactly the tolerance are allowed, one more base is not; intervals no longer
+    # than the tolerance never conflict, even when nested in an accepted one
+    data = {
+        'query_id': ['Q1'] * 5,
+        'query_len': [1000] * 5,
+        'target_start': [100, 190, 289, 150, 100],
+        'target_end': [200, 300, 400, 160, 400],
+        'AS': [500, 400, 300, 200, 100],
+        'aln_len': [100, 110, 111, 10, 300]
+    }
+    df = pd.DataFrame(data)
+
+    q_id, intervals, score, max_as, tiled_out = tile_and_score_contig(df, overlap_tolerance=10)
+
+    assert intervals == [(100, 200), (190, 300), (150, 160)]
+    assert score == (500 + 400 + 200) / 1000
+    assert max_as == 500
+    assert tiled_out == 2
+
+def test_tile_and_score_alignments():
+    # Q1 as in test_tile_and_score_contig; Q2 has an AS tie broken by alignment length and an
+    # overlap of exactly the tolerance, which is allowed
+    data = {
+        'query_id': ['Q2', 'Q1', 'Q1', 'Q2', 'Q1', 'Q2', 'Q2'],
+        'query_len': [500, 1000, 1000, 500, 1000, 500, 500],
+        'target_start': [0, 100, 500, 90, 150, 50, 300],
+        'target_end': [100, 300, 700, 200, 350, 150, 305],
+        'AS': [100, 200, 300, 100, 250, 100, 5],
+        'aln_len': [100, 200, 200, 110, 200, 100, 5]
+    }
+    df = pd.DataFrame(data)
+    df['query_id'] = df['query_id'].astype('category')
+
+    results = {r[0]: r for r in tile_and_score_alignments(df, overlap_tolerance=10)}
+
+    assert set(results) == {'Q1', 'Q2'}
+    assert results['Q1'] == ('Q1', [(500, 700), (150, 350)], (300 + 250) / 1000, 300, 1)
+    assert results['Q2'] == ('Q2', [(90, 200), (0, 100), (300, 305)], 205 / 500, 100, 1)
+    for query_id, group in df.groupby('query_id', observed=True):
+        assert results[query_id] == tile_and_score_contig(group, overlap_tolerance=10)
+
 def test_estimate_distance_threshold():
     # Case < 1000 pairs
     dist, method = estimate_distance_threshold([0.01] * 500)
@@ -54,6 +137,42 @@ def test_estimate_distance_threshold():
     # but it should return something in [0, 0.2] or fallback
     assert 0 <= dist <= 0.2
 
+def test_get_overlapping_pairs_sweep():
+    c1 = ContigSummary(query_id='C1', query_length=1000, target_id='T1',
+                       intervals=[(0, 100), (500, 600)], status=Status.ALIGNED_RETAINED)
+    c2 = ContigSummary(query_id='C2', query_length=1000, target_id='T1',
+                       intervals=[(90, 200)], status=Status.ALIGNED_RETAINED)
+    c3 = ContigSummary(query_id='C3', query_length=1000, target_id='T1',
+                       intervals=[(150, 550)], status=Status.ALIGNED_RETAINED)
+    c4 = ContigSummary(query_id='C4', query_length=1000, target_id='T2',
+                       intervals=[(0, 1000)], status=Status.ALIGNED_RETAINED)
+    c5 = ContigSummary(query_id='C5', query_length=1000, target_id='T1',
+                       intervals=[(0, 1000)], status=Status.ALIGNED_DISCARDED)
+
+    pairs = get_overlapping_pairs_with_lengths([c1, c2, c3, c4, c5], min_overlap=1)
+    # C1-C2 overlap by 10 bp, C1-C3 by 50 bp (second interval), C2-C3 by 50 bp
+    assert pairs == [('C1', 'C2', 10), ('C1', 'C3', 50), ('C2', 'C3', 50)]
+
+    # Pairs below the minimum overlap are not reported
+    assert get_overlapping_pairs([c1, c2, c3, c4, c5], min_overlap=20) == [('C1', 'C3'), ('C2', 'C3')]
+
+def test_build_competition_graph():
+    c1 = ContigSummary(query_id='C1', query_length=1000, target_id='T1', intervals=[(100, 500)])
+    c2 = ContigSummary(query_id='C2', query_length=400, target_id='T1', intervals=[(200, 600)])
+    c3 = ContigSummary(query_id='C3', query_length=1000, target_id='T1', intervals=[(700, 900)])
+    mash_lookup = {'C1': {'C2': 0.01}, 'C2': {'C1': 0.01}}
+
+    graph = build_competition_graph([c1, c2, c3], mash_lookup, min_overlap=1, min_size_safeguard=0.5)
+
+    assert list(graph[0]) == [1]
+    assert list(graph[1]) == [0]
+    assert graph[2] == {}
+    assert graph[0][1].distance == 0.01
+    assert graph[0][1].size_ratio == 0.4
+    # C2 is too small to disqualify C1, but C1 can disqualify C2
+    assert graph[0][1].size_protected is True
+    assert graph[1][0].size_protected is False
+
 def test_run_tournament_on_target():
     c1 = ContigSummary(query_id='C1', query_length=1000, target_id='T1', 
                        intervals=[(100, 500)], sum_normalized_score=0.8, status=Status.ALIGNED_RETAINED)
@@ -86,6 +205,27 @@ def test_screen_unaligned_contig():
     assert res.disqualifier == 'R1'
     assert res.discarded_reason['Mash_Redundancy'] is True
 
+def test_distance_equal_to_threshold():
+    # A float32 distance equal to the threshold is not below it, in Phase 5 and Phase 6 alike
+    mash_lookup = build_mash_lookup(pd.DataFrame({
+        'id1': ['C1', 'U1'], 'id2': ['C2', 'C2'], 'distance': [0.03, 0.03],
+        'p_value': [0.0] * 2, 'hashes': ['900/1000'] * 2,
+    }))
+    c1 = ContigSummary(query_id='C1', query_length=1000, target_id='T1',
+                       intervals=[(100, 500)], sum_normalized_score=0.8, status=Status.ALIGNED_RETAINED)
+    c2 = ContigSummary(query_id='C2', query_length=1000, target_id='T1',
+                       intervals=[(200, 600)], sum_normalized_score=0.9, status=Status.ALIGNED_RETAINED)
+    run_tournament_on_target([c1, c2], mash_lookup, 0.03)
+    assert c1.status == Status.ALIGNED_RETAINED and c1.retained_reason['Mash'] is False
+
+    u = ContigSummary(query_id='U1', query_length=1000, status=Status.UNALIGNED_RETAINED)
+    assert screen_unaligned_contig(u, [c2], mash_lookup, 0.03).status == Status.UNALIGNED_RETAINED
+
+    # Just above the stored distance, both phases treat the pair as similar
+    run_tournament_on_target([c1, c2], mash_lookup, 0.0301)
+    assert c1.status == Status.ALIGNED_DISCARDED and c1.disqualifier == 'C2'
+    assert screen_unaligned_contig(u, [c2], mash_lookup, 0.0301).status == Status.UNALIGNED_DISCARDED
+
 def test_count_unique_single_copy_orthologs():
     # Test basic counting of unique orthologs
     c1 = ContigSummary(query_id='C1', query_length=1000, status=Status.ALIGNED_RETAINED,
@@ -117,6 +257,73 @@ def test_count_unique_single_copy_orthologs():
     count = count_unique_single_copy_orthologs(c_empty, all_contigs, {'C_empty'})
     assert count == 0
 
+def test_contig_store():
+    store = ContigStore(['C1', 'C2', 'C3'], [1000, 2000, 3000], [40.0, 41.0, 42.0], {'C2': {'BUSCO1'}})
+    c1, c2, c3 = store
+    assert (c2.query_id, c2.query_length, c2.gc_content, c2.busco_genes) == ('C2', 2000, 41.0, {'BUSCO1'})
+    assert c1.busco_genes == set() and c1.status == Status.UNALIGNED_RETAINED
+
+    # Views write through to the columns; reasons are bit-flags behind a dict-like view
+    c1.status = Status.ALIGNED_RETAINED
+    c1.discarded_reason['GC'] = True
+    c3.retained_reason = {'Score': True, 'Unique': True}
+    assert store.status_mask(Status.ALIGNED_RETAINED).tolist() == [True, False, False]
+    assert c1.discarded_reason['GC'] is True and c1.discarded_reason['Round1'] is False
+    assert dict(c3.retained_reason) == {'Score': True, 'Mash': False, 'Size': False, 'OrphanRecovery': False, 'Unique': True}
+
+    # Intervals live in one offsets-indexed array
+    store.set_intervals([2, 0], [[(5, 10), (20, 30)], [(1, 2)]])
+    c2.intervals = [(7, 8)]
+    assert [c.intervals for c in store] == [((1, 2),), ((7, 8),), ((5, 10), (20, 30))]
+    assert store.interval_offsets.tolist() == [0, 1, 2, 4]
+
+    # Subsets round-trip through a worker (pickling) and are merged back by query_id
+    subset = pickle.loads(pickle.dumps(store.take([2, 1])))
+    assert [c.query_id for c in subset] == ['C3', 'C2']
+    assert subset[0].intervals == ((5, 10), (20, 30)) and subset[1].busco_genes == {'BUSCO1'}
+    subset[1].status = Status.UNALIGNED_DISCARDED
+    subset[1].disqualifier = 'C3'
+    rows = store.update_from(subset, ('status', 'disqualifier'))
+    assert rows.tolist() == [2, 1]
+    assert (c2.status, c2.disqualifier) == (Status.UNALIGNED_DISCARDED, 'C3')
+
+    # A pickled view becomes a standalone summary
+    copy = pickle.loads(pickle.dumps(c3))
+    assert copy.query_id == 'C3' and copy.intervals == c3.intervals and copy.retained_reason == c3.retained_reason
+    assert copy == c3 and copy != c2
+    copy.status = Status.ALIGNED_DISCARDED
+    assert c3.status == Status.UNALIGNED_RETAINED and copy != c3
+
+def test_busco_carrier_index():
+    c1 = ContigSummary(query_id='C1', query_length=1000, status=Status.ALIGNED_RETAINED,
+                       busco_genes={'BUSCO1', 'BUSCO2', 'BUSCO3'})
+    c2 = ContigSummary(query_id='C2', query_length=1000, status=Status.ALIGNED_RETAINED,
+                       busco_genes={'BUSCO2', 'BUSCO4'})
+    c3 = ContigSummary(query_id='C3', query_length=1000, status=Status.ALIGNED_DISCARDED,
+                       busco_genes={'BUSCO1'})
+    all_contigs = [c1, c2, c3]
+    index = BuscoCarrierIndex(all_contigs)
+
+    assert index.counts == {'BUSCO1': 1, 'BUSCO2': 2, 'BUSCO3': 1, 'BUSCO4': 1}
+    # Same answers as the full scan
+    for contig in all_contigs:
+        for exclude_ids in ({contig.query_id}, {'C1', 'C2'}):
+            assert index.count_unique(contig, exclude_ids) == count_unique_single_copy_orthologs(contig, all_contigs, exclude_ids)
+
+    # Status changes keep the counts in sync
+    index.set_status(c3, Status.ALIGNED_RETAINED)
+    assert c3.status == Status.ALIGNED_RETAINED
+    assert index.count_unique(c1, {'C1'}) == 1
+    index.set_status(c2, Status.ALIGNED_DISCARDED)
+    assert index.counts['BUSCO2'] == 1
+    assert get_adjusted_score(c1, 0.1, busco_index=index) == get_adjusted_score(c1, 0.1, all_contigs=all_contigs)
+
+    # Copies track status changes independently of the original
+    task_index = index.copy()
+    task_index.set_status(c1, Status.ALIGNED_DISCARDED)
+    assert 'C1' not in task_index.carriers and task_index.counts['BUSCO1'] == 1
+    assert 'C1' in index.carriers and index.counts['BUSCO1'] == 2
+
 def test_busco_ortholog_rule_prevents_disqualification():
     # C has more unique orthologs than O, so O cannot disqualify C
     # even though O has better score
@@ -1,9 +1,20 @@
+import json
 import pytest
+import numpy as np
+import pandas as pd
 from pathlib import Path
-from src.filter_haplotypes.parsers.fasta_parser import parse_fasta
-from src.filter_haplotypes.parsers.paf_parser import parse_paf, get_primary_targets
-from src.filter_haplotypes.parsers.mash_parser import parse_mash, build_mash_lookup
-from src.filter_haplotypes.parsers.busco_parser import parse_busco
+import gzip
+from src.filter_haplotypes.parsers import fasta_parser
+from src.filter_haplotypes.parsers.fasta_parser import parse_fasta, scan_fasta, FastaIndex, FastaReader
+from src.filter_haplotypes.parsers.paf_parser import parse_paf, get_primary_targets, primary_target_map, extract_tags
+from src.filter_haplotypes.parsers.mash_parser import parse_mash, build_mash_lookup, get_mash_distance, get_close_neighbors, MashDistanceMatrix, stream_mash_lookup
+from src.filter_haplotypes.parsers import sketch_parser
+from src.filter_haplotypes.parsers.sketch_parser import (
+    MinHashSketches, parse_mash_sketch, sketch_distances, compute_sketch_distances, find_candidate_pairs,
+    sketch_distance_lookup
+)
+from src.filter_haplotypes.parsers.sketcher import BASE_CODES, canonical_kmers, sketch_fasta
+from src.filter_haplotypes.parsers.busco_parser import parse_busco, BuscoTable, BuscoCompleteness
 
 DATA_DIR = Path("data")
 
@@ -20,6 +31,67 @@ def test_parse_fasta():
     assert 0 <= gc <= 100
     assert length > 0
 
+def test_parse_fasta_streaming(tmp_path, monkeypatch):
+    text = (
+        ">a first contig\nACGTNNacgtSW\nUU RYK\n"
+        ">empty\n\n"
+        ">crlf\r\nGGGG\r\nCC\r\n"
+        ">n_only\nNNNN\n"
+        ">last\nAT"
+    )
+    expected = {
+        'a': (5 / 12 * 100, 17),
+        'empty': (0.0, 0),
+        'crlf': (100.0, 6),
+        'n_only': (0.0, 4),
+        'last': (0.0, 2),
+    }
+    fasta_path = tmp_path / "contigs.fasta"
+    fasta_path.write_text(text)
+    gz_path = tmp_path / "contigs.fasta.gz"
+    gz_path.write_bytes(gzip.compress(text.encode()))
+
+    # Tiny blocks force headers and sequence lines to straddle block boundaries
+    monkeypatch.setattr(fasta_parser, "FASTA_BLOCK_SIZE", 5)
+    for path, threads in [(fasta_path, 1), (fasta_path, 3), (gz_path, 1)]:
+        results = parse_fasta(str(path), threads=threads)
+        assert list(results) == list(expected)
+        for query_id, (gc, length) in expected.items():
+            assert results[query_id][0] == pytest.approx(gc)
+            assert results[query_id][1] == length
+
+def test_scan_fasta_index(tmp_path, monkeypatch):
+    fasta_path = tmp_path / "contigs.fasta"
+    fasta_path.write_bytes(b">a x\nACGTA\nCGTAC\nGG\n>b\nAAAAA\nCC\n>c\r\nACG\r\nTT\r\n>d\nAC")
+    monkeypatch.setattr(fasta_parser, "FASTA_BLOCK_SIZE", 4)
+
+    gc_data, index = scan_fasta(str(fasta_path), threads=2)
+    assert gc_data['a'] == (pytest.approx(7 / 12 * 100), 12)
+    assert index.names == ['a', 'b', 'c', 'd']
+    assert index.lengths.tolist() == [12, 7, 5, 2]
+    assert index.offsets.tolist() == [5, 23, 36, 48]
+    assert index.line_bases.tolist() == [5, 5, 3, 2]
+    assert index.line_widths.tolist() == [6, 6, 5, 3]
+
+    with FastaReader(fasta_path, index) as reader:
+        assert reader.fetch('a') == b"ACGTACGTACGG"
+        assert reader.fetch('a', 4, 11) == b"ACGTACG"
+        assert reader.fetch('c', 2) == b"GTT"
+        assert reader.title(0) == b"a x"
+        assert reader.title(2) == b"c"
+
+    # An existing up-to-date .fai is reused as is
+    index.save(f"{fasta_path}.fai")
+    reloaded = FastaIndex.load(f"{fasta_path}.fai")
+    assert reloaded.names == index.names
+    assert reloaded.offsets.tolist() == index.offsets.tolist()
+    assert scan_fasta(str(fasta_path))[1].line_widths.tolist() == index.line_widths.tolist()
+
+    # Lines of varying width cannot be addressed by faidx
+    irregular_path = tmp_path / "irregular.fasta"
+    irregular_path.write_text(">a\nACGT\nACGTA\nAC\n")
+    assert scan_fasta(str(irregular_path))[1] is None
+
 def test_parse_paf():
     paf_path = DATA_DIR / "example_alignments.paf"
     if not paf_path.exists():
@@ -30,6 +102,74 @@ def test_parse_paf():
     assert 'AS' in df.columns
     assert (df['mq'] >= 10).all()
 
+def test_parse_paf_chunked(tmp_path):
+    paf_path = tmp_path / "chunked.paf"
+    paf_path.write_text(
+        "q1\t1000\t0\t500\t+\tt1\t5000\t100\t600\t450\t500\t60\ttp:A:P\tAS:i:400\n"
+        "q1\t1000\t500\t1000\t-\tt2\t5000\t100\t600\t450\t500\t5\tAS:i:300\n"
+        "q2\t800\t0\t800\t+\tt1\t5000\t1000\t1800\t700\t800\t30\ttp:A:P\tNM:i:2\tAS:i:700\n"
+    )
+
+    df = parse_paf(str(paf_path), min_mq=10, chunksize=1)
+    assert list(df['query_id']) == ['q1', 'q2']
+    assert list(df['AS']) == [400, 700]
+    assert df.index.tolist() == [0, 1]
+    assert len(df.columns) == 13
+
+def test_parse_paf_numeric_ids(tmp_path):
+    # Numeric chromosome names in one chunk and other names in the next are read as strings
+    paf_path = tmp_path / "numeric_ids.paf"
+    paf_path.write_text(
+        "1\t1000\t0\t500\t+\t1\t5000\t100\t600\t450\t500\t60\tAS:i:400\n"
+        "q2\t800\t0\t800\t+\tX\t5000\t1000\t1800\t700\t800\t30\tAS:i:700\n"
+        "3\t800\t0\t800\t-\t10\t5000\t1000\t1800\t700\t800\t30\tAS:i:500\n"
+    )
+
+    for chunksize in (1, 2):
+        df = parse_paf(str(paf_path), min_mq=10, chunksize=chunksize)
+        assert list(df['query_id']) == ['1', 'q2', '3']
+        assert list(df['target_id']) == ['1', 'X', '10']
+        assert list(df['target_id'].cat.categories) == ['1', '10', 'X']
+
+def test_parse_paf_many_tags(tmp_path):
+    # PAF lines may carry any number of optional tags (54 fields here); lines of a chunk
+    # need not have the same width
+    paf_path = tmp_path / "many_tags.paf"
+    extra_tags = "\t".join(f"X{i}:i:{i}" for i in range(40))
+    paf_path.write_text(
+        f"q1\t1000\t0\t500\t+\tt1\t5000\t100\t600\t450\t500\t60\ttp:A:P\tAS:i:400\t{extra_tags}\n"
+        "q2\t800\t0\t800\t+\tt1\t5000\t1000\t1800\t700\t800\t30\tAS:i:700\n"
+        f"q3\t800\t0\t800\t+\tt1\t5000\t1000\t1800\t700\t800\t30\t{extra_tags}\tAS:i:900\n"
+    )
+
+    for chunksize in (1, 3):
+        df = parse_paf(str(paf_path), min_mq=10, chunksize=chunksize)
+        assert list(df['query_id']) == ['q1', 'q2', 'q3']
+        assert list(df['mq']) == [60, 30, 30]
+        assert list(df['AS']) == [400, 700, 900]
+        assert len(df.columns) == 13
+
+def test_parse_paf_compact_dtypes(tmp_path):
+    paf_path = tmp_path / "compact.paf"
+    paf_path.write_text(
+        "q2\t800\t0\t800\t+\tt2\t5000\t1000\t1800\t700\t800\t30\tAS:i:700\n"
+        "q1\t1000\t0\t500\t-\tt1\t5000\t100\t600\t450\t500\t60\tAS:i:400\n"
+        "q1\t1000\t500\t1000\t+\tt1\t5000\t700\t1200\t450\t500\t60\tAS:i:300\n"
+    )
+
+    df = parse_paf(str(paf_path), min_mq=10, chunksize=2)
+    assert isinstance(df['query_id'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['target_id'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['strand'].dtype, pd.CategoricalDtype)
+    # Categories are merged across chunks and kept in alphabetical order
+    assert list(df['query_id'].cat.categories) == ['q1', 'q2']
+    assert df['mq'].dtype == np.uint8
+    assert df['target_start'].dtype == np.int32
+    assert df['AS'].dtype == np.int32
+
+    primary_df = get_primary_targets(df)
+    assert sorted(primary_df['query_id'].astype(str)) == ['q1', 'q1', 'q2']
+
 def test_get_primary_targets():
     paf_path = DATA_DIR / "example_alignments.paf"
     if not paf_path.exists():
@@ -41,6 +181,22 @@ def test_get_primary_targets():
     # Each query_id should only have one target_id
     assert primary_df.groupby('query_id')['target_id'].nunique().max() == 1
 
+def test_get_primary_targets_tie_breaking():
+    df = pd.DataFrame({
+        'query_id': ['Q1', 'Q1', 'Q1', 'Q1', 'Q2', 'Q2', 'Q2', 'Q2'],
+        'target_id': ['T2', 'T2', 'T1', 'T1', 'T3', 'T1', 'T2', 'T2'],
+        'AS': [100, 300, 100, 300, 50, 90, 90, 10],
+        'aln_len': [500, 500, 500, 500, 100, 100, 200, 100],
+    })
+    primary_df = get_primary_targets(df)
+
+    # Q1: identical p90 AS and aln_len on T1 and T2 -> alphabetical T1
+    # Q2: p90 AS of T1 (90) beats T2 (82) and T3 (50)
+    assert primary_df['target_id'].tolist() == ['T1', 'T1', 'T1']
+    assert primary_df['query_id'].tolist() == ['Q1', 'Q1', 'Q2']
+    assert primary_df['AS'].tolist() == [100, 300, 90]
+    assert primary_target_map(primary_df) == {'Q1': 'T1', 'Q2': 'T1'}
+
 def test_parse_mash():
     mash_path = DATA_DIR / "example_mash.dist"
     if not mash_path.exists():
@@ -53,6 +209,185 @@ def test_parse_mash():
     lookup = build_mash_lookup(df)
     assert len(lookup) > 0
 
+def test_mash_distance_matrix(tmp_path):
+    df = pd.DataFrame({
+        'id1': ['a', 'a', 'b', 'c', 'b', 'd'],
+        'id2': ['b', 'c', 'c', 'a', 'a', 'd'],
+        'distance': [0.01, 0.02, 0.03, 0.04, 0.05, 0.0],
+        'p_value': [0.0] * 6,
+        'hashes': ['900/1000'] * 6,
+    })
+    # Reference nested dictionary: later records override earlier ones for the same pair
+    lookup = {}
+    for row in df.itertuples(index=False):
+        lookup.setdefault(row.id1, {})[row.id2] = row.distance
+        lookup.setdefault(row.id2, {})[row.id1] = row.distance
+    matrix = build_mash_lookup(df)
+    matrix.save(tmp_path / "mash")
+    loaded = MashDistanceMatrix.load(tmp_path / "mash")
+
+    for structure in (matrix, loaded):
+        for id1 in ['a', 'b', 'c', 'd', 'missing']:
+            for id2 in ['a', 'b', 'c', 'd', 'missing']:
+                expected = lookup.get(id1, {}).get(id2) if id1 != id2 else 0.0
+                assert get_mash_distance(structure, id1, id2) == pytest.approx(expected)
+    assert isinstance(loaded.distances, np.memmap)
+    assert matrix.distances.dtype == np.float32
+    assert matrix.indices.dtype == np.int32
+
+    assert get_close_neighbors(matrix, 'a', 0.045) == {'c'}
+    assert get_close_neighbors(matrix, 'a', 0.06) == {'b', 'c'}
+    assert get_close_neighbors(matrix, 'd', 1.0) == set()
+    assert get_close_neighbors(matrix, 'missing', 1.0) == set()
+    assert matrix.neighbors_within('b', 0.04) == {'c': pytest.approx(0.03)}
+
+def test_stream_mash_lookup(tmp_path):
+    mash_path = tmp_path / "pairs.dist"
+    mash_path.write_text(
+        "a\tb\t0.01\t0\t900/1000\n"
+        "a\ta\t0\t0\t1000/1000\n"
+        "a\tc\t0.20\t0\t100/1000\n"
+        "c\td\t0.30\t0\t50/1000\n"
+        "b\ta\t0.08\t0\t800/1000\n"
+        "b\tc\t0.02\t0.5\t10/1000\n"
+        "c\ta\t0.20\t0\t100/1000\n"
+    )
+
+    assert len(parse_mash(str(mash_path))) == 6
+
+    lookup = stream_mash_lookup(str(mash_path), chunksize=2)
+    assert len(lookup.indices) == 2 * 3
+    assert get_mash_distance(lookup, 'a', 'b') == pytest.approx(0.08)
+    assert get_mash_distance(lookup, 'd', 'c') == pytest.approx(0.30)
+    assert get_mash_distance(lookup, 'b', 'c') is None
+
+    lookup = stream_mash_lookup(str(mash_path), max_distance=0.05, keep_pairs=[('c', 'a')], chunksize=2)
+    # The later (b, a) record overrides (a, b) although it is above the threshold
+    assert get_mash_distance(lookup, 'a', 'b') == pytest.approx(0.08)
+    assert get_mash_distance(lookup, 'a', 'c') == pytest.approx(0.20)
+    assert get_mash_distance(lookup, 'c', 'd') is None
+
+    lookup = stream_mash_lookup(str(mash_path), keep_pairs=[('d', 'c')])
+    assert len(lookup.indices) == 2
+    assert get_mash_distance(lookup, 'c', 'd') == pytest.approx(0.30)
+
+def mash_pair_reference(hashes1, hashes2, kmer_size, sketch_size):
+    """
+    Mash's merge loop over two sorted sketches (CommandDistance::compareSketches).
+    """
+    i = j = common = denom = 0
+    while denom < sketch_size and i < len(hashes1) and j < len(hashes2):
+        if hashes1[i] < hashes2[j]:
+            i += 1
+        elif hashes1[i] > hashes2[j]:
+            j += 1
+        else:
+            i += 1
+            j += 1
+            common += 1
+        denom += 1
+    if denom < sketch_size:
+        denom += min(sketch_size - denom, len(hashes1) - i)
+        denom += min(sketch_size - denom, len(hashes2) - j)
+    if common == 0:
+        return 1.0
+    jaccard = common / denom
+    return -np.log(2 * jaccard / (1 + jaccard)) / kmer_size
+
+def test_sketch_distances(monkeypatch):
+    rng = np.random.default_rng(3)
+    pool = np.unique(rng.integers(1, 2**62, 500))
+    hash_lists = [rng.choice(pool[:300 + 40 * (i % 5)], rng.integers(0, 40), replace=False) for i in range(20)]
+    sketches = MinHashSketches.from_lists([f"c{i}" for i in range(20)], [50000] * 20, hash_lists, kmer_size=21, sketch_size=25)
+
+    idx1, idx2 = np.triu_indices(20, 1)
+    distances, p_values = sketch_distances(sketches, idx1, idx2)
+    for d, a, b in zip(distances, idx1, idx2):
+        expected = mash_pair_reference(
+            sketches.hashes[sketches.offsets[a]:sketches.offsets[a + 1]],
+            sketches.hashes[sketches.offsets[b]:sketches.offsets[b + 1]], 21, 25
+        )
+        assert d == pytest.approx(expected)
+    assert ((p_values >= 0) & (p_values <= 1)).all()
+    assert (p_values[distances == 1.0] == 1.0).all()
+
+    # Batches are sized from the sketch size (here 2 pairs of 2 x 25 hashes each)
+    monkeypatch.setattr(sketch_parser, 'SKETCH_BATCH_HASHES', 100)
+    batched_distances, batched_p_values = compute_sketch_distances(sketches, idx1, idx2)
+    assert np.array_equal(batched_distances, distances) and np.array_equal(batched_p_values, p_values)
+
+def test_parse_mash_sketch_json(tmp_path):
+    sketch_path = tmp_path / "contigs.json"
+    sketch_path.write_text(json.dumps({
+        "kmer": 21, "alphabet": "ACGT", "sketchSize": 4, "hashType": "MurmurHash3_x64_128", "hashBits": 64,
+        "sketches": [
+            {"name": "a", "length": 100000, "hashes": [1, 2, 3, 4]},
+            {"name": "b", "length": 100000, "hashes": [4, 3, 2, 1]},
+            {"name": "c", "length": 100000, "hashes": [2, 5, 6, 7]},
+            {"name": "d", "length": 100000, "hashes": [8, 9, 10, 18446744073709551615]},
+        ]
+    }))
+    sketches = parse_mash_sketch(str(sketch_path))
+    assert sketches.ids.tolist() == ['a', 'b', 'c', 'd']
+    assert sketches.hashes[sketches.offsets[1]:sketches.offsets[2]].tolist() == [1, 2, 3, 4]
+    assert sketches.hashes.dtype == np.uint64
+
+    idx1, idx2 = find_candidate_pairs(sketches, ['c', 'd'], ['a', 'b', 'c', 'd'])
+    assert list(zip(idx1.tolist(), idx2.tolist())) == [(0, 2), (1, 2)]
+
+    lookup = sketch_distance_lookup(sketches, [('a', 'b'), ('a', 'd')], (idx1, idx2), max_distance=0.04)
+    assert get_mash_distance(lookup, 'a', 'b') == 0.0
+    assert get_mash_distance(lookup, 'a', 'd') is None  # P-value 1
+    assert get_mash_distance(lookup, 'b', 'c') is None  # Above max_distance
+
+def test_canonical_kmers():
+    sequence = "ACGTTGCAnNACGGTAcgta"
+    complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
+    encoding = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+    for k in (1, 3, 4, 7):
+        expected = []
+        for start in range(len(sequence) - k + 1):
+            kmer = sequence[start:start + k].upper()
+            if any(base not in encoding for base in kmer):
+                continue
+            forward = sum(encoding[b] << 2 * (k - 1 - i) for i, b in enumerate(kmer))
+            reverse = sum(encoding[complement[b]] << 2 * i for i, b in enumerate(kmer))
+            expected.append(min(forward, reverse))
+        codes = BASE_CODES[np.frombuffer(sequence.encode(), dtype=np.uint8)]
+        assert canonical_kmers(codes, k).tolist() == expected
+
+def test_sketch_fasta(tmp_path):
+    rng = np.random.default_rng(5)
+    bases = np.array(list("ACGT"))
+    seq_a = "".join(rng.choice(bases, 20000))
+    # Reverse complement shares every canonical k-mer; a 1% mutated copy shares most
+    seq_rc = seq_a[::-1].translate(str.maketrans("ACGT", "TGCA"))
+    mutated = np.array(list(seq_a))
+    positions = rng.choice(len(mutated), 200, replace=False)
+    mutated[positions] = rng.choice(bases, 200)
+    seq_b = "".join(mutated)
+
+    fasta_path = tmp_path / "contigs.fasta"
+    fasta_path.write_text(f">a first\n{seq_a[:10000]}\n{seq_a[10000:]}\n>rc\n{seq_rc}\n>b\n{seq_b}\n>short\nACGT\n")
+
+    sketches = sketch_fasta(str(fasta_path), kmer_size=21, sketch_size=500, threads=2)
+    assert sketches.ids.tolist() == ['a', 'rc', 'b', 'short']
+    assert sketches.lengths.tolist() == [20000, 20000, 20000, 4]
+    assert sketches.sizes.tolist() == [500, 500, 500, 0]
+
+    distances, p_values = sketch_distances(sketches, np.array([0, 0, 0]), np.array([1, 2, 3]))
+    assert distances[0] == 0.0
+    # 200 substitutions (some silent) at k=21 give a Mash distance close to 0.01
+    assert 0.005 < distances[1] < 0.015
+    assert distances[2] == 1.0 and p_values[2] == 1.0
+
+    sketch_path = tmp_path / "contigs.npz"
+    sketches.save(sketch_path)
+    loaded = parse_mash_sketch(str(sketch_path))
+    assert loaded.ids.tolist() == sketches.ids.tolist()
+    assert np.array_equal(loaded.hashes, sketches.hashes)
+    assert (loaded.kmer_size, loaded.sketch_size, loaded.hash_type) == (21, 500, "splitmix64")
+
 def test_parse_busco():
     busco_path = DATA_DIR / "example_BUSCO_full_table.tsv"
     if not busco_path.exists():
@@ -63,3 +398,58 @@ def test_parse_busco():
     for q_id, genes in busco_map.items():
         assert isinstance(genes, set)
         assert len(genes) > 0
+
+def test_busco_table(tmp_path):
+    busco_path = tmp_path / "full_table.tsv"
+    # Missing rows have only two fields; the first data row decides nothing
+    busco_path.write_text(
+        "# BUSCO version is: 5.4.3\n"
+        "# Busco id\tStatus\tSequence\tGene Start\tGene End\tStrand\tScore\tLength\n"
+        "B1\tMissing\n"
+        "B2\tComplete\tctg1\t1\t100\t+\t50.0\t300\n"
+        "B3\tDuplicated\tctg1\t1\t100\t+\t50.0\t300\n"
+        "B3\tDuplicated\tctg2\t1\t100\t+\t50.0\t300\tOG1\thttps://example.org\tdesc\n"
+        "B4\tFragmented\tctg3\t1\t20\t+\t5.0\t20\n"
+        "B5\tComplete\t7\t1\t100\t+\t50.0\t300\n"
+    )
+    table = BuscoTable.load(str(busco_path))
+    assert len(table) == 6
+    assert table.gene_map() == {'ctg1': {'B2', 'B3'}, 'ctg2': {'B3'}, '7': {'B5'}}
+    assert table.counts({'ctg1', 'ctg2', 'ctg3', '7'}) == {'complete_single': 2, 'duplicated': 1, 'missing': 2}
+    assert table.counts(['ctg1', '7']) == {'complete_single': 3, 'duplicated': 0, 'missing': 2}
+    assert table.counts(set()) == {'complete_single': 0, 'duplicated': 0, 'missing': 5}
+
+    # The live tracker agrees with a full recount after every status change
+    tracker = BuscoCompleteness(table, ['ctg1', 'ctg2', 'ctg3', '7'])
+    assert tracker.record("Initial") == table.counts({'ctg1', 'ctg2', 'ctg3', '7'})
+    retained = {'ctg1', 'ctg2', 'ctg3', '7'}
+    for query_id, keep in [('ctg2', False), ('ctg2', False), ('7', False), ('ctg1', False), ('ctg2', True), ('unknown', False)]:
+        tracker.set_retained(query_id, keep)
+        retained = retained | {query_id} if keep else retained - {query_id}
+        assert tracker.counts() == table.counts(retained)
+    assert tracker.record("Final") == {'complete_single': 1, 'duplicated': 0, 'missing': 4}
+    assert [phase for phase, _ in tracker.phases] == ["Initial", "Final"]
+
+    empty = BuscoTable.load(str(tmp_path / "missing.tsv"))
+    assert empty.gene_map() == {}
+    assert empty.counts({'ctg1'}) == {'complete_single': 0, 'duplicated': 0, 'missing': 0}
+
+def test_extract_tags():
+    tag_df = pd.DataFrame({
+        12: ['tp:A:P', 'AS:i:12', None],
+        13: ['AS:i:40', 'tp:A:S', 'NM:i:3'],
+        14: ['cg:Z:10M2I5M', 'dv:f:0.0123', 'AS:i:bad'],
+    })
+    values, found = extract_tags(tag_df, ('AS', 'tp', 'NM', 'dv', 'cg'))
+
+    assert values['AS'].dtype == np.int64
+    assert values['AS'].tolist() == [40, 12, 0]
+    assert found['AS'].tolist() == [True, True, False]
+    assert values['tp'].tolist() == ['P', 'S', '']
+    assert values['NM'].tolist() == [0, 0, 3]
+    assert values['dv'][1] == pytest.approx(0.0123)
+    assert np.isnan(values['dv'][0])
+    assert values['cg'].tolist() == [7, 0, 0]
+
+    with pytest.raises(ValueError):
+        extract_tags(tag_df, ('XX',))